@@ -0,0 +1,107 @@
+import asyncio
+import os
+import time
+from typing import Dict, Iterable, Optional, Set
+
+from data import aload_data, USER_AUDIENCE_FIELDS
+
+USERS_FILE = "users"
+
+# Склад команд і ліг змінюється рідко; повна перебудова раз на кілька хвилин
+# підхоплює правки, зроблені в обхід бота (скрипти, ручні зміни в базі).
+AUDIENCE_REBUILD_SECONDS = int(os.getenv("AUDIENCE_REBUILD_SECONDS", "300"))
+
+TEAMS = ("Male", "Female")
+# Game types and /send_message league choices -> user flag
+LEAGUE_FLAGS = {
+    "stolichka": "stolichna",
+    "universiad": "universiada",
+    "universiada": "universiada",
+}
+
+
+class AudienceIndex:
+    """User-id sets per team and league, so broadcasts resolve their recipients
+    with set operations instead of filtering every user document."""
+
+    def __init__(self):
+        self.all: Set[str] = set()
+        self.members: Dict[str, Set[str]] = {}
+        self.unreachable: Set[str] = set()
+        self.built_at: Optional[float] = None
+        # Bumped on every single-user change, so a rebuild can tell it raced one
+        self.generation = 0
+        self._lock = asyncio.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.all = set()
+        self.members = {key: set() for key in TEAMS + tuple(set(LEAGUE_FLAGS.values()))}
+        self.unreachable = set()
+
+    def update_user(self, user_id: str, profile: Optional[Dict]) -> None:
+        """Re-index one user after their profile changed; None removes them."""
+        user_id = str(user_id)
+        self.generation += 1
+        self.all.discard(user_id)
+        self.unreachable.discard(user_id)
+        for ids in self.members.values():
+            ids.discard(user_id)
+        if profile is None:
+            return
+
+        self.all.add(user_id)
+        if profile.get("team") in TEAMS:
+            self.members[profile["team"]].add(user_id)
+        for flag in set(LEAGUE_FLAGS.values()):
+            if profile.get(flag, False):
+                self.members[flag].add(user_id)
+        if profile.get("unreachable"):
+            self.unreachable.add(user_id)
+
+    def set_unreachable(self, user_id: str, unreachable: bool) -> None:
+        self.generation += 1
+        if unreachable:
+            self.unreachable.add(str(user_id))
+        else:
+            self.unreachable.discard(str(user_id))
+
+    def rebuild(self, users: Dict[str, Dict]) -> None:
+        self._reset()
+        for user_id, profile in users.items():
+            self.update_user(user_id, profile)
+        self.built_at = time.monotonic()
+
+    def is_stale(self) -> bool:
+        return self.built_at is None or time.monotonic() - self.built_at > AUDIENCE_REBUILD_SECONDS
+
+    async def refresh(self, force: bool = False) -> None:
+        async with self._lock:
+            if not (force or self.is_stale()):
+                return
+            for _ in range(3):
+                generation = self.generation
+                users = await aload_data(USERS_FILE, {}, fields=USER_AUDIENCE_FIELDS)
+                if generation == self.generation:
+                    break
+            self.rebuild(users)
+
+    def select(self, team: Optional[str] = "Both", league: Optional[str] = None,
+               include_unreachable: bool = False) -> Set[str]:
+        """team is Male / Female / Both; league is a game type or a /send_message
+        league choice, anything else (friendly, "none", None) means no restriction."""
+        ids = set(self.all) if team in (None, "Both") else set(self.members.get(team, ()))
+        flag = LEAGUE_FLAGS.get(league)
+        if flag:
+            ids &= self.members[flag]
+        if not include_unreachable:
+            ids -= self.unreachable
+        return ids
+
+    async def resolve(self, team: Optional[str] = "Both", league: Optional[str] = None,
+                      exclude: Iterable[str] = ()) -> Set[str]:
+        await self.refresh()
+        return self.select(team, league) - {str(user_id) for user_id in exclude}
+
+
+audience_index = AudienceIndex()
@@ -0,0 +1,154 @@
+import asyncio
+import datetime
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+
+import data
+from voting import unified_vote_command, handle_unified_vote_selection, handle_vote
+
+# Скільки звернень до сховища робить кожен обробник і наскільки вони блокують
+# event loop. USERS одночасних користувачів проходять /vote -> вибір тренування
+# -> "✅ Так", кожне звернення до сховища триває ROUND_TRIP_MS (time.sleep, як
+# блокуючий pymongo), а сторожовий таймер вимірює найбільшу затримку циклу.
+# Для порівняння той самий прогін виконується з викликами сховища прямо в
+# циклі, як до run_db. Код виходу 1, якщо хоч одне звернення пішло з циклу.
+USERS = 50
+ROUND_TRIP_MS = float(os.getenv("ROUND_TRIP_MS", "20"))
+TICK_MS = 1
+
+
+class LatencyStorage:
+    """Counts storage calls and the ones made on the event loop thread."""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.calls = 0
+        self.on_loop = 0
+        self.loop_thread = None
+
+    def __getattr__(self, name):
+        method = getattr(self.inner, name)
+
+        def timed(*args, **kwargs):
+            self.calls += 1
+            if threading.current_thread() is self.loop_thread:
+                self.on_loop += 1
+            time.sleep(ROUND_TRIP_MS / 1000)
+            return method(*args, **kwargs)
+
+        return timed
+
+
+class FakeMessage:
+    def __init__(self, user_id):
+        self.from_user = SimpleNamespace(id=user_id)
+
+    async def reply_text(self, *args, **kwargs):
+        pass
+
+
+class FakeQuery(FakeMessage):
+    def __init__(self, user_id, query_data):
+        super().__init__(user_id)
+        self.data = query_data
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+    async def edit_message_text(self, *args, **kwargs):
+        pass
+
+
+def seed():
+    date = (datetime.date.today() + datetime.timedelta(days=2)).strftime("%d.%m.%Y")
+    data.storage.inner.write("users", {str(uid): {"name": f"Player {uid}", "team": "Male"}
+                                       for uid in range(1, USERS + 1)})
+    data.storage.inner.write("one_time_trainings", {"1": {
+        "type": "one-time", "date": date, "team": "Both", "voting_opened": True, "status": "not charged",
+        "start_hour": 19, "start_min": 0, "end_hour": 21, "end_min": 0
+    }})
+    return f"{date}_19:00"
+
+
+def handler_steps(user_id, training_id):
+    return [
+        ("/vote", unified_vote_command, SimpleNamespace(message=FakeMessage(user_id))),
+        ("unified_vote", handle_unified_vote_selection,
+         SimpleNamespace(callback_query=FakeQuery(user_id, "unified_vote_0"))),
+        ("vote_yes", handle_vote, SimpleNamespace(callback_query=FakeQuery(user_id, f"vote_yes_{training_id}"))),
+    ]
+
+
+async def round_trip(user_id, training_id):
+    context = SimpleNamespace(user_data={}, bot=None)
+    for _, handler, update in handler_steps(user_id, training_id):
+        await handler(update, context)
+
+
+async def count_round_trips(training_id):
+    # По одному користувачу з холодним і з теплим кешем
+    for label, user_id in (("cold cache", 1), ("warm cache", 2)):
+        context = SimpleNamespace(user_data={}, bot=None)
+        trips = []
+        for name, handler, update in handler_steps(user_id, training_id):
+            before = data.storage.calls
+            await handler(update, context)
+            trips.append(f"{name} {data.storage.calls - before}")
+        print(f"round trips per handler, {label}: " + ", ".join(trips))
+
+
+async def watchdog(stop: asyncio.Event, stalls: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK_MS / 1000)
+        stalls.append((time.perf_counter() - started) * 1000 - TICK_MS)
+
+
+async def measure(label, training_id):
+    data.storage.inner.write("votes", {}, [training_id])
+    data.storage.on_loop = 0
+    data.cache.invalidate()
+
+    stop, stalls = asyncio.Event(), []
+    guard = asyncio.create_task(watchdog(stop, stalls))
+    started = time.perf_counter()
+    await asyncio.gather(*[round_trip(user_id, training_id) for user_id in range(1, USERS + 1)])
+    elapsed = (time.perf_counter() - started) * 1000
+    stop.set()
+    await guard
+
+    print(f"{label}: {elapsed:.0f} ms for {USERS} users, worst loop stall {max(stalls):.1f} ms, "
+          f"{data.storage.on_loop} storage calls on the loop")
+    return data.storage.on_loop
+
+
+async def main():
+    data.storage = LatencyStorage(data.storage)
+    data.storage.loop_thread = threading.current_thread()
+    training_id = seed()
+
+    data.cache.invalidate()
+    await count_round_trips(training_id)
+    on_loop = await measure("run_db", training_id)
+
+    run_db = data.run_db
+
+    async def inline(func, *args, **kwargs):
+        return func(*args, **kwargs)
+
+    data.run_db = inline
+    await measure("on the loop (before run_db)", training_id)
+    data.run_db = run_db
+
+    print("✅ Жодного звернення до сховища з event loop" if not on_loop
+          else f"❌ {on_loop} звернень до сховища блокують event loop")
+    return not on_loop
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,92 @@
+import os
+import sys
+import time
+from collections import Counter
+
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+
+import data
+
+# Порівнює save_data, що пише лише змінені документи, зі старим шляхом
+# delete_many + insert_one на кожен документ для 100, 1k і 10k документів.
+# Кожне звернення до сховища коштує ROUND_TRIP_MS, як мережевий запит до Mongo.
+# Запускається офлайн на STORAGE_BACKEND=memory; код виходу 1, якщо зміна
+# одного документа коштує більше одного запису.
+SIZES = [100, 1000, 10000]
+ROUND_TRIP_MS = float(os.getenv("ROUND_TRIP_MS", "0.5"))
+COLLECTION = "bench_save_data"
+
+
+class LatencyStorage:
+    """Counts storage calls and charges ROUND_TRIP_MS for each of them."""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.calls = Counter()
+
+    def __getattr__(self, name):
+        method = getattr(self.inner, name)
+
+        def timed(*args, **kwargs):
+            self.calls[name] += 1
+            time.sleep(ROUND_TRIP_MS / 1000)
+            return method(*args, **kwargs)
+
+        return timed
+
+    @property
+    def round_trips(self):
+        return sum(self.calls.values())
+
+
+def legacy_save(docs):
+    # Те, що робив save_data до диф-запису: delete_many({}) і insert_one на кожен документ
+    existing = [doc["_id"] for doc in data.storage.find(COLLECTION, {}, {"_id": 1})]
+    data.storage.write(COLLECTION, {}, existing)
+    for key, doc in docs.items():
+        data.storage.write(COLLECTION, {key: dict(doc)})
+
+
+def measure(label, save):
+    before = data.storage.round_trips
+    started = time.perf_counter()
+    save()
+    elapsed = (time.perf_counter() - started) * 1000
+    trips = data.storage.round_trips - before
+    print(f"  {label:<28} {trips:>6} round trips {elapsed:>9.1f} ms")
+    return trips
+
+
+def bench(size):
+    docs = {str(i): {"name": f"Player {i}", "team": "Male"} for i in range(size)}
+    data.storage.inner.write(COLLECTION, docs)
+    print(f"{size} documents:")
+
+    measure("legacy, one changed", lambda: legacy_save({**docs, "0": {"name": "Renamed", "team": "Male"}}))
+
+    loaded = data.load_data(COLLECTION, {})
+    loaded["0"]["name"] = "Renamed again"
+    one_changed = measure("diff, one changed", lambda: data.save_data(loaded, COLLECTION))
+
+    loaded = data.load_data(COLLECTION, {})
+    for doc in loaded.values():
+        doc["team"] = "Female"
+    measure("diff, all changed", lambda: data.save_data(loaded, COLLECTION))
+
+    loaded = data.load_data(COLLECTION, {})
+    unchanged = measure("diff, nothing changed", lambda: data.save_data(loaded, COLLECTION))
+
+    data.storage.inner.write(COLLECTION, {}, list(docs))
+    return one_changed == 1 and unchanged <= 1
+
+
+def main():
+    data.storage = LatencyStorage(data.storage)
+    data.cache.ttls = {}
+    ok = all([bench(size) for size in SIZES])
+    print("✅ Зміна одного документа - один запис" if ok else "❌ save_data пише більше, ніж змінилося")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
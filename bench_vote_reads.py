@@ -0,0 +1,102 @@
+import asyncio
+import datetime
+import os
+from collections import Counter
+from types import SimpleNamespace
+
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+
+import data
+from voting import unified_vote_command, handle_unified_vote_selection, handle_vote
+
+# Рахує звернення до сховища за один цикл /vote -> вибір тренування -> "✅ Так"
+# без кешу і з кешем. Запускається офлайн на STORAGE_BACKEND=memory.
+USERS = 30
+READ_METHODS = {"find", "find_one", "count"}
+
+
+class CountingStorage:
+    def __init__(self, inner):
+        self.inner = inner
+        self.calls = Counter()
+
+    def __getattr__(self, name):
+        method = getattr(self.inner, name)
+
+        def counted(*args, **kwargs):
+            self.calls[name] += 1
+            return method(*args, **kwargs)
+
+        return counted
+
+    @property
+    def reads(self):
+        return sum(n for name, n in self.calls.items() if name in READ_METHODS)
+
+
+class FakeMessage:
+    def __init__(self, user_id):
+        self.from_user = SimpleNamespace(id=user_id)
+
+    async def reply_text(self, *args, **kwargs):
+        pass
+
+
+class FakeQuery(FakeMessage):
+    def __init__(self, user_id, query_data):
+        super().__init__(user_id)
+        self.data = query_data
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+    async def edit_message_text(self, *args, **kwargs):
+        pass
+
+
+def seed():
+    date = (datetime.date.today() + datetime.timedelta(days=2)).strftime("%d.%m.%Y")
+    data.save_data({str(uid): {"name": f"Player {uid}", "team": "Male"} for uid in range(1, USERS + 1)}, "users")
+    data.save_data({"1": {
+        "type": "one-time", "date": date, "team": "Both", "voting_opened": True, "status": "not charged",
+        "start_hour": 19, "start_min": 0, "end_hour": 21, "end_min": 0
+    }}, "one_time_trainings")
+    return f"{date}_19:00"
+
+
+async def round_trip(user_id, training_id):
+    context = SimpleNamespace(user_data={}, bot=None)
+    await unified_vote_command(SimpleNamespace(message=FakeMessage(user_id)), context)
+    await handle_unified_vote_selection(SimpleNamespace(callback_query=FakeQuery(user_id, "unified_vote_0")), context)
+    await handle_vote(SimpleNamespace(callback_query=FakeQuery(user_id, f"vote_yes_{training_id}")), context)
+
+
+async def measure(label, training_id):
+    counting = data.storage
+    per_trip = []
+    for user_id in range(1, USERS + 1):
+        before = counting.reads
+        await round_trip(user_id, training_id)
+        per_trip.append(counting.reads - before)
+
+    print(f"{label}: first round trip {per_trip[0]} reads, "
+          f"average {sum(per_trip) / len(per_trip):.1f} reads over {len(per_trip)} round trips")
+
+
+async def main():
+    data.storage = CountingStorage(data.storage)
+    training_id = seed()
+    ttls = dict(data.cache.ttls)
+
+    data.cache.ttls = {}
+    await measure("without cache", training_id)
+
+    data.storage.inner.write("votes", {}, [training_id])
+    data.cache.ttls = ttls
+    data.cache.invalidate()
+    await measure("with cache", training_id)
+    print(f"cache: {data.cache.stats()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
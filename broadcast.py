@@ -0,0 +1,125 @@
+import asyncio
+import datetime
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+from telegram.error import BadRequest, Forbidden, RetryAfter
+
+from audience import audience_index
+from data import afind_and_update
+
+# Telegram allows about 30 messages per second overall and one per second per chat
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "8"))
+PER_CHAT_INTERVAL = 1.0
+MAX_RETRIES = 3
+USERS_FILE = "users"
+# BadRequest texts that mean the chat itself is gone
+UNREACHABLE_CHAT_ERRORS = ("chat not found", "user not found", "peer_id_invalid")
+
+
+@dataclass
+class DeliveryReport:
+    sent: List[str] = field(default_factory=list)
+    # Не доставлені остаточно (dead letter): chat_id -> остання помилка
+    failed: Dict[str, str] = field(default_factory=dict)
+    unreachable: List[str] = field(default_factory=list)
+    # Відкладені на повторну спробу з backoff
+    deferred: int = 0
+    # Забрані іншим воркером
+    skipped: int = 0
+    retries: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def total(self) -> int:
+        return len(self.sent) + len(self.failed) + self.deferred
+
+    def __str__(self):
+        return (f"sent {len(self.sent)}/{self.total}, failed {len(self.failed)}, "
+                f"unreachable {len(self.unreachable)}, deferred {self.deferred}, "
+                f"retries {self.retries}, {self.elapsed:.1f}s")
+
+
+class RateLimiter:
+    """Hands out send slots so the bot stays under the global and per-chat limits
+    however many broadcasts run at once."""
+
+    def __init__(self, rate: float, per_chat_interval: float):
+        self.interval = 1.0 / rate
+        self.per_chat_interval = per_chat_interval
+        self._next_slot = 0.0
+        self._chat_next_slot: Dict[str, float] = {}
+        self._lock = asyncio.Lock()
+
+    async def wait(self, chat_id: str) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot, self._chat_next_slot.get(chat_id, 0.0))
+            self._next_slot = slot + self.interval
+            self._chat_next_slot[chat_id] = slot + self.per_chat_interval
+            if len(self._chat_next_slot) > 10000:
+                self._chat_next_slot = {cid: t for cid, t in self._chat_next_slot.items() if t > now}
+        await asyncio.sleep(slot - now)
+
+    def pause(self, seconds: float) -> None:
+        # RetryAfter is a bot-wide flood wait, so every sender backs off
+        self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+
+limiter = RateLimiter(BROADCAST_RATE, PER_CHAT_INTERVAL)
+
+
+def is_unreachable(error: Exception) -> bool:
+    """True when the user blocked the bot, deleted the account or never had a chat with it."""
+    if isinstance(error, Forbidden):
+        return True
+    return isinstance(error, BadRequest) and any(text in str(error).lower() for text in UNREACHABLE_CHAT_ERRORS)
+
+
+async def mark_unreachable(chat_id, error: Exception) -> None:
+    # unreachable_since записується лише при першому збої
+    await afind_and_update(
+        USERS_FILE,
+        {"_id": str(chat_id), "unreachable": {"$ne": True}},
+        {"$set": {"unreachable": True, "unreachable_since": datetime.datetime.utcnow(),
+                  "unreachable_reason": str(error)}}
+    )
+    audience_index.set_unreachable(chat_id, True)
+
+
+async def mark_reachable(chat_id) -> None:
+    # Пишемо лише тоді, коли користувача справді було позначено недосяжним
+    doc = await afind_and_update(
+        USERS_FILE,
+        {"_id": str(chat_id), "unreachable": True},
+        {"$unset": {"unreachable": "", "unreachable_since": "", "unreachable_reason": ""}}
+    )
+    if doc is not None or str(chat_id) in audience_index.unreachable:
+        audience_index.set_unreachable(chat_id, False)
+
+
+def _retry_after_seconds(error: RetryAfter) -> float:
+    if isinstance(error.retry_after, datetime.timedelta):
+        return error.retry_after.total_seconds()
+    return float(error.retry_after)
+
+
+async def send_with_retry(bot, chat_id, kwargs: Dict[str, Any]) -> int:
+    """Send one message within the rate limits, retrying flood waits.
+    Returns how many retries it took; the last error is raised."""
+    retries = 0
+    while True:
+        await limiter.wait(str(chat_id))
+        try:
+            await bot.send_message(chat_id=int(chat_id), **kwargs)
+            return retries
+        except RetryAfter as e:
+            delay = _retry_after_seconds(e)
+            limiter.pause(delay)
+            if retries == MAX_RETRIES:
+                raise
+            retries += 1
+            await asyncio.sleep(delay)
@@ -0,0 +1,97 @@
+import base64
+import datetime
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import ContextTypes, CallbackQueryHandler
+
+from data import aload_document, aupdate_document, ensure_index
+
+# Кнопки з довгими id (голосування, ігри, оплати) несуть у callback_data лише
+# короткий токен "t:<11 символів>", а дію та її параметри зберігаємо в колекції
+# callbacks. Однакові параметри дають той самий токен, тож розсилка однієї
+# клавіатури всім гравцям створює один запис. Записи живуть CALLBACK_TTL_DAYS
+# від останнього використання в клавіатурі.
+CALLBACKS_FILE = "callbacks"
+TOKEN_PREFIX = "t:"
+TOKEN_PATTERN = r"^t:"
+CALLBACK_TTL_DAYS = int(os.getenv("CALLBACK_TTL_DAYS", "60"))
+CALLBACK_CACHE_SIZE = 5000
+# Повторно записуємо токен, що вже є в пам'яті, не частіше ніж раз на добу
+CALLBACK_REFRESH_SECONDS = 86400
+
+CallbackHandler = Callable[[Update, ContextTypes.DEFAULT_TYPE, Dict[str, Any]], Awaitable[None]]
+
+_handlers: Dict[str, CallbackHandler] = {}
+# token -> (action, payload, expires_at of the stored record, UTC)
+_cache: "OrderedDict[str, Tuple[str, Dict[str, Any], datetime.datetime]]" = OrderedDict()
+
+
+def ensure_callback_indexes():
+    ensure_index(CALLBACKS_FILE, [("expires_at", 1)], expireAfterSeconds=0)
+
+
+def _token(action: str, payload: Dict[str, Any]) -> str:
+    raw = json.dumps([action, payload], sort_keys=True, ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(hashlib.sha1(raw).digest())[:11].decode()
+
+
+def _remember(token: str, action: str, payload: Dict[str, Any], expires_at: datetime.datetime) -> None:
+    _cache[token] = (action, payload, expires_at)
+    _cache.move_to_end(token)
+    while len(_cache) > CALLBACK_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+
+async def callback_data(action: str, **payload: Any) -> str:
+    """Register action + payload and return the callback_data for its button."""
+    token = _token(action, payload)
+    cached = _cache.get(token)
+    expires_at = datetime.datetime.utcnow() + datetime.timedelta(days=CALLBACK_TTL_DAYS)
+    if cached is None or expires_at - cached[2] > datetime.timedelta(seconds=CALLBACK_REFRESH_SECONDS):
+        await aupdate_document(CALLBACKS_FILE, token, {
+            "$set": {"expires_at": expires_at},
+            "$setOnInsert": {"action": action, "payload": payload},
+        }, upsert=True)
+        _remember(token, action, payload, expires_at)
+    return TOKEN_PREFIX + token
+
+
+async def resolve_callback(data: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """(action, payload) for callback_data made by callback_data(), None if unknown or expired."""
+    token = data[len(TOKEN_PREFIX):]
+    now = datetime.datetime.utcnow()
+    cached = _cache.get(token)
+    if cached is not None and cached[2] > now:
+        return cached[0], cached[1]
+    # Запис у пам'яті застарів - можливо, інший процес уже продовжив його в базі
+    _cache.pop(token, None)
+
+    doc = await aload_document(CALLBACKS_FILE, token)
+    # TTL-індекс видаляє записи із запізненням, тож строк перевіряємо й тут
+    if not doc or doc["expires_at"] <= now:
+        return None
+    _remember(token, doc["action"], doc["payload"], doc["expires_at"])
+    return doc["action"], doc["payload"]
+
+
+def register_callback(action: str, handler: CallbackHandler) -> None:
+    _handlers[action] = handler
+
+
+async def route_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    resolved = await resolve_callback(query.data)
+    handler = _handlers.get(resolved[0]) if resolved else None
+    if handler is None:
+        await query.answer("⚠️ Ця кнопка застаріла.", show_alert=True)
+        return
+    await handler(update, context, resolved[1])
+
+
+def setup_callback_router(app):
+    app.add_handler(CallbackQueryHandler(route_callback, pattern=TOKEN_PATTERN))
@@ -0,0 +1,36 @@
+import sys
+
+from data import db
+from vote_store import COUNT_FIELDS, count_votes
+
+# Звіряє лічильники yes_count / no_count голосувань за тренування з самими
+# голосами й виправляє розбіжності. Без --fix лише звітує.
+TRAINING_VOTES_COLLECTION = "votes"
+
+
+def check_vote_counts(fix=False):
+    collection = db[TRAINING_VOTES_COLLECTION]
+    checked = mismatched = 0
+
+    for doc in collection.find({}):
+        checked += 1
+        expected = count_votes(doc.get("votes", {}))
+        stored = {field: doc.get(field) for field in COUNT_FIELDS}
+        if stored == expected:
+            continue
+
+        mismatched += 1
+        print(f"⚠️ {doc['_id']}: збережено {stored}, за голосами {expected}")
+        if fix:
+            # Лише якщо голоси не змінилися, поки ми рахували
+            result = collection.update_one({"_id": doc["_id"], "votes": doc.get("votes", {})},
+                                           {"$set": expected})
+            if not result.modified_count:
+                print(f"   {doc['_id']}: голоси змінилися під час перевірки, запустіть ще раз")
+
+    print(f"Перевірено {checked} голосувань, розбіжностей: {mismatched}")
+    return mismatched
+
+
+if __name__ == "__main__":
+    check_vote_counts(fix="--fix" in sys.argv[1:])
@@ -0,0 +1,17 @@
+import datetime
+import os
+
+import pytz
+
+# Усі дати тренувань, ігор і ключі розсилок рахуються за київським часом,
+# незалежно від часового поясу сервера (на хостингу це зазвичай UTC).
+TIMEZONE = os.getenv("BOT_TIMEZONE", "Europe/Kyiv")
+
+
+def local_now() -> datetime.datetime:
+    """Current wall-clock time in TIMEZONE, naive like the dates stored in the bot."""
+    return datetime.datetime.now(pytz.timezone(TIMEZONE)).replace(tzinfo=None)
+
+
+def local_today() -> datetime.date:
+    return local_now().date()
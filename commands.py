@@ -2,8 +2,11 @@ import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, CallbackQueryHandler, CommandHandler, MessageHandler, filters, \
     ConversationHandler
-from data import load_data, log_command_usage, save_data
+from data import aload_data, aload_document, asave_data, log_command_usage
+from audience import audience_index
+from payments_repository import get_unpaid
 from validation import ADMIN_IDS
+from outbox import enqueue, enqueue_many
 import asyncio
 
 SEND_MESSAGE_STATE = {}
@@ -12,6 +15,7 @@ GAME_RESULTS_TEAM, GAME_RESULTS_SEASON, GAME_RESULTS_TYPE = range(500, 503)
 import os
 from telegram import Update
 from telegram.ext import ContextTypes
+from clock import local_now
 
 CLOWN_VOICE_PATH = os.path.join(os.path.dirname(__file__), "clown.ogg")
 
@@ -86,7 +90,8 @@ async def handle_send_message_input(update: Update, context: ContextTypes.DEFAUL
         league_filter = state["league"]
 
         message_text = update.message.text
-        users = load_data("users")
+        # "none" → no league restriction
+        users = await audience_index.resolve(team_filter, league_filter)
 
         if "🤡" in message_text:
             await context.bot.send_chat_action(user_id, action='record_voice')
@@ -114,28 +119,9 @@ async def handle_send_message_input(update: Update, context: ContextTypes.DEFAUL
 
         full_message = f"{message_text}{footer}"
 
-        count = 0
+        queued = await enqueue(f"send_message:{update.update_id}", users, text=full_message)
 
-        for uid, info in users.items():
-
-            # TEAM filter
-            if team_filter != "Both" and info.get("team") != team_filter:
-                continue
-
-            # LEAGUE filter
-            if league_filter == "stolichka" and not info.get("stolichna", False):
-                continue
-            if league_filter == "universiada" and not info.get("universiada", False):
-                continue
-            # "none" → no league restriction
-
-            try:
-                await context.bot.send_message(chat_id=int(uid), text=full_message)
-                count += 1
-            except Exception as e:
-                print(f"❌ Не вдалося надіслати повідомлення {uid}: {e}")
-
-        await update.message.reply_text(f"✅ Повідомлення надіслано {count} користувачам.")
+        await update.message.reply_text(f"✅ Повідомлення поставлено в чергу для {queued} користувачів.")
 
 
 async def notify_debtors(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -145,15 +131,13 @@ async def notify_debtors(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("⛔ У вас немає прав для надсилання повідомлень боржникам.")
         return
 
-    payments = load_data("payments", {})
-
+    await audience_index.refresh()
     debts_by_user = {}
-    for p in payments.values():
-        if not p.get("paid", False):
-            uid = p["user_id"]
-            debts_by_user.setdefault(uid, []).append(p)
+    for p in await get_unpaid():
+        if p["user_id"] not in audience_index.unreachable:
+            debts_by_user.setdefault(p["user_id"], []).append(p)
 
-    notified_count = 0
+    messages = []
 
     for uid, debts in debts_by_user.items():
         lines = []
@@ -166,13 +150,14 @@ async def notify_debtors(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 "\n\nБудь ласка, використай команду /pay_debt щоб підтвердити оплату або оплатити."
         )
 
-        try:
-            await context.bot.send_message(chat_id=int(uid), text=message)
-            notified_count += 1
-        except Exception as e:
-            print(f"❌ Не вдалося надіслати повідомлення до {uid}: {e}")
+        messages.append((uid, {"text": message}))
+
+    queued = await enqueue_many(f"debtors:{update.update_id}", messages)
+    await update.message.reply_text(f"✅ Сповіщення поставлено в чергу для {queued} боржників.")
+
 
-    await update.message.reply_text(f"✅ Сповіщення надіслано {notified_count} боржникам.")
+def team_query(team_filter):
+    return {} if team_filter == "Both" else {"team": team_filter}
 
 
 async def mvp_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -197,7 +182,7 @@ async def handle_mvp_stats_selection(update: Update, context: ContextTypes.DEFAU
     await query.answer()
 
     team_filter = query.data.replace("mvp_stats_", "")
-    users = load_data("users", {})
+    users = await aload_data("users", {}, fields=["name", "team", "mvp"])
 
     mvp_data = []
     for user_data in users.values():
@@ -273,7 +258,8 @@ async def handle_attendance_stats_selection(update: Update, context: ContextType
     await query.answer()
 
     team_filter = query.data.replace("attendance_stats_", "")
-    users = load_data("users", {})
+    users = await aload_data("users", {}, query=team_query(team_filter),
+                             fields=["name", "team", "training_attendance", "game_attendance"])
 
     attendance_data = []
     for user_data in users.values():
@@ -327,7 +313,8 @@ async def handle_training_stats_selection(update: Update, context: ContextTypes.
     await query.answer()
 
     team_filter = query.data.replace("training_stats_", "")
-    users = load_data("users", {})
+    users = await aload_data("users", {}, query=team_query(team_filter),
+                             fields=["name", "team", "training_attendance"])
 
     training_data = []
     for user_data in users.values():
@@ -395,7 +382,8 @@ async def handle_game_stats_selection(update: Update, context: ContextTypes.DEFA
     await query.answer()
 
     team_filter = query.data.replace("game_stats_", "")
-    users = load_data("users", {})
+    users = await aload_data("users", {}, query=team_query(team_filter),
+                             fields=["name", "team", "game_attendance"])
 
     game_data = []
     for user_data in users.values():
@@ -443,13 +431,12 @@ async def handle_game_stats_selection(update: Update, context: ContextTypes.DEFA
 async def my_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.message.from_user.id)
     log_command_usage(user_id, "/my_stats")
-    users = load_data("users", {})
+    user_data = await aload_document("users", user_id)
 
-    if user_id not in users:
+    if user_data is None:
         await update.message.reply_text("Будь ласка, завершіть реєстрацію спочатку.")
         return
 
-    user_data = users[user_id]
     name = user_data.get("name", "Невідомий")
     team = user_data.get("team", "Невідомо")
     mvp = user_data.get("mvp", 0)
@@ -478,7 +465,7 @@ async def my_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message += f"🎖️ MVP нагороди: {mvp}\n"
 
     if mvp > 0:
-        games = load_data("games", {})
+        games = await aload_data("games", {})
         mvp_games = []
 
         for game in games.values():
@@ -530,7 +517,7 @@ def get_available_seasons_from_ids(games_data, team_filter):
 
 
 async def show_tournament_selection(query, context, team_name):
-    games = load_data("games", {})
+    games = await aload_data("games", {})
     selected_team = context.user_data.get("selected_team")
     selected_season = context.user_data.get("selected_season")
 
@@ -572,7 +559,7 @@ async def show_tournament_selection(query, context, team_name):
         only_type = next(iter(available_types))
         type_filter = only_type
 
-        now = datetime.datetime.now()
+        now = local_now()
         completed_games = []
         for game_id, game in filtered_games.items():
             if game.get("type") != type_filter:
@@ -708,7 +695,7 @@ async def handle_game_results_team_selection(update: Update, context: ContextTyp
     team_filter = query.data.replace("game_results_team_", "")
     context.user_data["selected_team"] = team_filter
 
-    games = load_data("games", {})
+    games = await aload_data("games", {})
     available_seasons = get_available_seasons_from_ids(games, team_filter)
 
     team_name = "чоловічої" if team_filter == "Male" else "жіночої"
@@ -757,8 +744,8 @@ async def handle_game_results_type_selection(update: Update, context: ContextTyp
     season_filter = context.user_data.get("selected_season")
     type_filter = query.data.replace("game_results_type_", "")
 
-    games = load_data("games", {})
-    now = datetime.datetime.now()
+    games = await aload_data("games", {})
+    now = local_now()
 
     completed_games = []
     for game_id, game in games.items():
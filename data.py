@@ -1,9 +1,16 @@
-from pymongo import MongoClient
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
+import asyncio
+import copy
+import functools
 import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from storage import create_storage, matches, project, sort_documents
+from clock import local_now
 import logging
-import datetime
 
 load_dotenv()
 
@@ -17,54 +24,383 @@ logging.basicConfig(
     ]
 )
 
-mongo_uri = os.getenv("MONGO_URI")
-client = MongoClient(mongo_uri)
-db = client['TelegramBot']
+# STORAGE_BACKEND=mongo (default) | memory | sqlite
+storage = create_storage()
+# Raw Mongo database for the maintenance scripts; None on the offline backends
+db = getattr(storage, "db", None)
 
+# pymongo is blocking; handlers reach the database through this bounded pool
+# so a slow query never stalls the event loop.
+_db_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("DB_WORKERS", "8")),
+    thread_name_prefix="db"
+)
+
+
+# Seconds a whole collection stays cached in this process; collections that are
+# not listed (votes, payments, ...) are always read from storage.
+# Override with CACHE_TTLS="users=120,games=0".
+CACHE_TTLS = {
+    "users": 60,
+    "one_time_trainings": 30,
+    "constant_trainings": 30,
+    "games": 30,
+    "general": 30,
+}
+
+
+class CollectionCache:
+    """Process-local write-through cache of whole collections."""
+
+    def __init__(self, ttls: Dict[str, float]):
+        self.ttls = dict(ttls)
+        self.hits = Counter()
+        self.misses = Counter()
+        self._entries: Dict[str, tuple] = {}
+        # bumped on every write so a read that raced with it is not cached
+        self._generations = Counter()
+        self._lock = threading.Lock()
+
+    def enabled(self, collection_name: str) -> bool:
+        return self.ttls.get(collection_name, 0) > 0
+
+    def get(self, collection_name: str) -> Optional[Dict[str, Dict]]:
+        if not self.enabled(collection_name):
+            return None
+        with self._lock:
+            entry = self._entries.get(collection_name)
+            if entry and time.monotonic() - entry[0] < self.ttls[collection_name]:
+                self.hits[collection_name] += 1
+                return entry[1]
+            self.misses[collection_name] += 1
+            return None
+
+    def generation(self, collection_name: str) -> int:
+        with self._lock:
+            return self._generations[collection_name]
+
+    def put(self, collection_name: str, docs: Dict[str, Dict], generation: int) -> None:
+        if self.enabled(collection_name):
+            with self._lock:
+                if self._generations[collection_name] == generation:
+                    self._entries[collection_name] = (time.monotonic(), docs)
+
+    def apply(self, collection_name: str, upserts: Dict[str, Dict], deletes) -> None:
+        with self._lock:
+            self._generations[collection_name] += 1
+            entry = self._entries.get(collection_name)
+            if not entry:
+                return
+            docs = entry[1]
+            for key, document in upserts.items():
+                docs[key] = copy.deepcopy(document)
+            for key in deletes:
+                docs.pop(key, None)
+
+    def invalidate(self, collection_name: Optional[str] = None) -> None:
+        with self._lock:
+            if collection_name is None:
+                self._generations.update(self._entries.keys())
+                self._entries.clear()
+            else:
+                self._generations[collection_name] += 1
+                self._entries.pop(collection_name, None)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {name: {"hits": self.hits[name], "misses": self.misses[name]}
+                    for name in set(self.hits) | set(self.misses)}
+
+
+def _cache_ttls() -> Dict[str, float]:
+    ttls = dict(CACHE_TTLS)
+    for item in os.getenv("CACHE_TTLS", "").split(","):
+        if "=" in item:
+            name, seconds = item.split("=", 1)
+            ttls[name.strip()] = float(seconds)
+    return ttls
+
+
+cache = CollectionCache(_cache_ttls())
+
+# Fields the broadcasts need to decide who receives a message; users flagged
+# unreachable are left out until they send /start again (see audience.py)
+USER_AUDIENCE_FIELDS = ["team", "stolichna", "universiada", "unreachable"]
+
+
+def _cached_collection(collection_name: str) -> Dict[str, Dict]:
+    """The cached documents of a cached collection, loading them on a miss.
+    Callers must copy what they hand out."""
+    docs = cache.get(collection_name)
+    if docs is None:
+        generation = cache.generation(collection_name)
+        docs = {str(doc.pop('_id')): doc for doc in storage.find(collection_name)}
+        cache.put(collection_name, docs, generation)
+    return docs
+
+
+def _find_documents(collection_name: str, query: Optional[Dict] = None, fields: Optional[List[str]] = None,
+                    sort: Optional[List] = None, limit: Optional[int] = None) -> Dict[str, Dict]:
+    projection = {field: 1 for field in fields} if fields else None
+    if not cache.enabled(collection_name):
+        return {str(doc.pop('_id')): doc
+                for doc in storage.find(collection_name, query, projection, sort=sort, limit=limit)}
+
+    docs = _cached_collection(collection_name)
+    matched = [{**doc, '_id': key} for key, doc in docs.items() if not query or matches({**doc, '_id': key}, query)]
+    found = {}
+    for doc in sort_documents(matched, sort, limit):
+        key = doc['_id']
+        doc = project(doc, projection)
+        doc.pop('_id', None)
+        found[key] = copy.deepcopy(doc)
+    return found
+
+
+class LoadedData(dict):
+    """Collection contents returned by load_data, remembering what was loaded so
+    save_data can write back only the documents that changed."""
 
-def load_data(collection_name: str, default: Optional[Any] = None) -> Dict:
+    def __init__(self, data: Dict, snapshot: Dict[str, Dict], fields: Optional[List[str]] = None):
+        super().__init__(data)
+        self.snapshot = snapshot
+        self.fields = fields
+
+
+def _to_document(value: Any) -> Dict:
+    return copy.deepcopy(value) if isinstance(value, dict) else {'value': value}
+
+
+def load_data(collection_name: str, default: Optional[Any] = None, query: Optional[Dict] = None,
+              fields: Optional[List[str]] = None, sort: Optional[List] = None,
+              limit: Optional[int] = None) -> Dict:
+    """Load a collection as {_id: document}. query filters documents; fields
+    limits them to the listed fields, and such partial results can't be saved.
+    sort and limit are applied by the storage, as in pymongo's find()."""
     try:
-        collection = db[collection_name]
-        data = {}
-        for doc in collection.find():
-            doc_id = str(doc.pop('_id'))
-            data[doc_id] = doc
+        data = _find_documents(collection_name, query, fields, sort, limit)
 
-        return data if data else (default if default is not None else {})
+        if not data:
+            data = copy.deepcopy(default) if default is not None else {}
+            return LoadedData(data, {}, fields)
+        return LoadedData(data, copy.deepcopy(data), fields)
     except Exception as e:
-        print(f"Error loading data from MongoDB: {e}")
+        print(f"Error loading data from the database: {e}")
         return default if default is not None else {}
 
 
 def save_data(data: Dict, collection_name: str) -> None:
+    if getattr(data, "fields", None):
+        print(f"❌ Refusing to save partial documents of {collection_name} loaded with fields={data.fields}")
+        return
     try:
-        collection = db[collection_name]
-
-        collection.delete_many({})
+        snapshot = getattr(data, "snapshot", None)
+        if snapshot is None:
+            # Not produced by load_data - diff against the ids that are stored
+            snapshot = {str(doc['_id']): None for doc in storage.find(collection_name, {}, {'_id': 1})}
 
+        upserts = {}
         for key, value in data.items():
-            document = value.copy() if isinstance(value, dict) else {'value': value}
-            document['_id'] = key
+            document = _to_document(value)
+            if snapshot.get(key) != document:
+                upserts[key] = document
+
+        deletes = snapshot.keys() - data.keys()
+        storage.write(collection_name, upserts, deletes)
+        cache.apply(collection_name, upserts, deletes)
 
-            collection.insert_one(document)
+        if isinstance(data, LoadedData):
+            data.snapshot = {key: _to_document(value) for key, value in data.items()}
     except Exception as e:
-        print(f"Error saving data to MongoDB: {e}")
+        print(f"Error saving data to the database: {e}")
 
-def log_command_usage(user_id: str, command_name: str):
-    commands = load_data("commands", {})
+def load_document(collection_name: str, doc_id: str, default: Optional[Any] = None) -> Optional[Dict]:
+    try:
+        if cache.enabled(collection_name):
+            return copy.deepcopy(_cached_collection(collection_name).get(doc_id, default))
+
+        doc = storage.find_one(collection_name, {'_id': doc_id})
+        if doc is None:
+            return copy.deepcopy(default)
+        doc.pop('_id')
+        return doc
+    except Exception as e:
+        print(f"Error loading document from the database: {e}")
+        return copy.deepcopy(default)
 
-    cmd = commands.get(command_name, {
-        "amount": 0,
-        "last_time": None,
-        "last_user_id": None
-    })
 
-    cmd["amount"] += 1
-    cmd["last_time"] = datetime.datetime.now().isoformat(timespec="seconds")
-    cmd["last_user_id"] = user_id
+def update_document(collection_name: str, doc_id: str, update: Dict, upsert: bool = False) -> None:
+    try:
+        storage.update_one(collection_name, {'_id': doc_id}, update, upsert=upsert)
+        cache.invalidate(collection_name)
+    except Exception as e:
+        print(f"Error updating document in the database: {e}")
 
-    commands[command_name] = cmd
-    save_data(commands, "commands")
+
+def find_and_update(collection_name: str, query: Dict, update: Dict, upsert: bool = False) -> Optional[Dict]:
+    """Apply update to the first document matching query and return it as it is
+    after the update, or None when nothing matched."""
+    try:
+        doc = storage.find_one_and_update(collection_name, query, update, upsert=upsert)
+        # Nothing matched means nothing was written
+        if doc is not None:
+            cache.invalidate(collection_name)
+        return doc
+    except Exception as e:
+        print(f"Error updating document in the database: {e}")
+        return None
+
+
+def save_documents(collection_name: str, documents: Dict[str, Dict]) -> None:
+    try:
+        storage.write(collection_name, documents)
+        cache.apply(collection_name, documents, ())
+    except Exception as e:
+        print(f"Error saving documents to the database: {e}")
+
+
+def upsert_documents(collection_name: str, updates: List) -> None:
+    """Apply each (query, update) pair as an upsert in one round trip."""
+    try:
+        storage.upsert_many(collection_name, updates)
+        cache.invalidate(collection_name)
+    except Exception as e:
+        print(f"Error saving documents to the database: {e}")
+
+
+def count_documents(collection_name: str, query: Dict) -> int:
+    try:
+        return storage.count(collection_name, query)
+    except Exception as e:
+        print(f"Error counting documents in the database: {e}")
+        return 0
+
+
+def ensure_index(collection_name: str, keys, **kwargs) -> None:
+    try:
+        storage.create_index(collection_name, keys, **kwargs)
+    except Exception as e:
+        print(f"Error creating index on {collection_name}: {e}")
+
+
+def delete_document(collection_name: str, doc_id: str) -> None:
+    try:
+        storage.delete_one(collection_name, {'_id': doc_id})
+        cache.apply(collection_name, {}, [doc_id])
+    except Exception as e:
+        print(f"Error deleting document from the database: {e}")
+
+
+COMMANDS_FILE = "commands"
+COMMANDS_HOURLY_FILE = "commands_hourly"
+
+# Лічильники команд накопичуються в пам'яті й періодично скидаються в базу
+_command_usage = {}
+_command_usage_lock = threading.Lock()
+
+
+def log_command_usage(user_id: str, command_name: str):
+    now = local_now()
+    hour = now.strftime("%Y-%m-%dT%H")
+
+    with _command_usage_lock:
+        cmd = _command_usage.setdefault(command_name, {"amount": 0, "hours": {}})
+        cmd["amount"] += 1
+        cmd["last_time"] = now.isoformat(timespec="seconds")
+        cmd["last_user_id"] = user_id
+        cmd["hours"][hour] = cmd["hours"].get(hour, 0) + 1
 
     # 🔹 логінг замість print
-    logger.info(f"Command {command_name} used by {user_id} (total {cmd['amount']})")
\ No newline at end of file
+    logger.info(f"Command {command_name} used by {user_id}")
+
+
+def _merge_command_usage(pending: Dict[str, Dict]) -> None:
+    with _command_usage_lock:
+        for command_name, usage in pending.items():
+            cmd = _command_usage.get(command_name)
+            if cmd is None:
+                _command_usage[command_name] = usage
+                continue
+            cmd["amount"] += usage["amount"]
+            for hour, amount in usage["hours"].items():
+                cmd["hours"][hour] = cmd["hours"].get(hour, 0) + amount
+
+
+def flush_command_usage() -> None:
+    with _command_usage_lock:
+        pending = dict(_command_usage)
+        _command_usage.clear()
+
+    if not pending:
+        return
+
+    totals = []
+    hourly = []
+    for command_name, usage in pending.items():
+        totals.append((
+            {'_id': command_name},
+            {'$inc': {'amount': usage["amount"]},
+             '$set': {'last_time': usage["last_time"], 'last_user_id': usage["last_user_id"]}}
+        ))
+        for hour, amount in usage["hours"].items():
+            hourly.append((
+                {'_id': f"{hour}_{command_name}"},
+                {'$inc': {'amount': amount}, '$setOnInsert': {'command': command_name, 'hour': hour}}
+            ))
+
+    try:
+        storage.upsert_many(COMMANDS_FILE, totals)
+    except Exception as e:
+        print(f"Error flushing command usage to the database: {e}")
+        _merge_command_usage(pending)
+        return
+
+    try:
+        storage.upsert_many(COMMANDS_HOURLY_FILE, hourly)
+    except Exception as e:
+        print(f"Error flushing hourly command usage to the database: {e}")
+        # Підсумки вже записані, тож повертаємо лише погодинні лічильники
+        _merge_command_usage({command_name: {**usage, "amount": 0} for command_name, usage in pending.items()})
+
+
+async def run_db(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, functools.partial(func, *args, **kwargs))
+
+
+async def aload_data(collection_name: str, default: Optional[Any] = None, query: Optional[Dict] = None,
+                     fields: Optional[List[str]] = None, sort: Optional[List] = None,
+                     limit: Optional[int] = None) -> Dict:
+    return await run_db(load_data, collection_name, default, query, fields, sort, limit)
+
+
+async def asave_data(data: Dict, collection_name: str) -> None:
+    await run_db(save_data, data, collection_name)
+
+
+async def aload_document(collection_name: str, doc_id: str, default: Optional[Any] = None) -> Optional[Dict]:
+    return await run_db(load_document, collection_name, doc_id, default)
+
+
+async def aupdate_document(collection_name: str, doc_id: str, update: Dict, upsert: bool = False) -> None:
+    await run_db(update_document, collection_name, doc_id, update, upsert)
+
+
+async def afind_and_update(collection_name: str, query: Dict, update: Dict, upsert: bool = False) -> Optional[Dict]:
+    return await run_db(find_and_update, collection_name, query, update, upsert)
+
+
+async def asave_documents(collection_name: str, documents: Dict[str, Dict]) -> None:
+    await run_db(save_documents, collection_name, documents)
+
+
+async def aupsert_documents(collection_name: str, updates: List) -> None:
+    await run_db(upsert_documents, collection_name, updates)
+
+
+async def acount_documents(collection_name: str, query: Dict) -> int:
+    return await run_db(count_documents, collection_name, query)
+
+
+async def adelete_document(collection_name: str, doc_id: str) -> None:
+    await run_db(delete_document, collection_name, doc_id)
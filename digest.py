@@ -0,0 +1,146 @@
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import Application, ContextTypes, CallbackQueryHandler
+
+from audience import audience_index
+from callbacks import callback_data, register_callback
+from games import record_game_vote
+from notifier import WEEKDAYS, VOTES_FILE, generate_training_id, trainings_due_for_reminder, games_due_for_reminder
+from outbox import enqueue_many
+from payments_repository import get_unpaid
+from vote_store import load_votes
+from voting import record_training_vote
+from clock import local_today
+
+GAME_VOTES_FILE = "game_votes"
+DIGEST_VOTE_PATTERN = r"^digest_(vote|game_vote)_(yes|no)_(.+)$"
+
+GAME_TYPE_NAMES = {
+    "friendly": "Товариська гра",
+    "stolichka": "Столична ліга",
+    "universiad": "Універсіада"
+}
+
+
+@dataclass
+class DigestItem:
+    text: str
+    buttons: Optional[List[InlineKeyboardButton]] = None
+
+
+async def _vote_callbacks(prefix: str, item_id: str) -> List[str]:
+    return [await callback_data("digest_vote", kind=prefix, id=item_id, vote=vote) for vote in ("yes", "no")]
+
+
+async def _vote_buttons(prefix: str, item_id: str, short: str) -> List[InlineKeyboardButton]:
+    yes, no = await _vote_callbacks(prefix, item_id)
+    return [
+        InlineKeyboardButton(f"✅ {short}", callback_data=yes),
+        InlineKeyboardButton(f"❌ {short}", callback_data=no)
+    ]
+
+
+async def _training_item(training: Dict, training_type: str, vote_id: str) -> DigestItem:
+    if training_type == "one-time":
+        date_str = training['date']
+        short = training['date'][:5]
+    else:
+        date_str = f"в {WEEKDAYS[training['weekday']]}"
+        short = WEEKDAYS[training['weekday']]
+    coach_str = " (З тренером)" if training.get("with_coach") else ""
+    time_str = f"{training['start_hour']:02d}:{training['start_min']:02d}-{training['end_hour']:02d}:{training['end_min']:02d}"
+
+    return DigestItem(
+        f"🏐 Тренування {date_str}{coach_str}, {time_str} - ще не проголосовано",
+        await _vote_buttons("vote", vote_id, f"Тренування {short}")
+    )
+
+
+async def _game_item(game: Dict, game_id: str, user_vote: Optional[Dict]) -> Optional[DigestItem]:
+    type_name = GAME_TYPE_NAMES.get(game.get('type'), game.get('type', 'Гра'))
+    text = (f"🏆 Завтра гра: {type_name} проти {game['opponent']}, {game['time']}, "
+            f"{game['location']} (прибуття до {game['arrival_time']})")
+
+    if user_vote is None:
+        return DigestItem(text + " - ще не проголосовано", await _vote_buttons("game_vote", game_id, "Гра"))
+    if user_vote.get("vote") == "yes":
+        return DigestItem(text + " - удачі!")
+    return None
+
+
+def _debt_item(debts: List[Dict]) -> DigestItem:
+    lines = [f"   • {d['training_datetime']}: {d['amount']} грн" for d in debts]
+    return DigestItem("💳 Неоплачено:\n" + "\n".join(lines) + "\n   Підтвердити оплату: /pay_debt")
+
+
+def render_digest(items: List[DigestItem]) -> Dict:
+    text = "📋 Нагадування на сьогодні:\n\n" + "\n\n".join(item.text for item in items)
+    rows = [item.buttons for item in items if item.buttons]
+    return {"text": text, "reply_markup": InlineKeyboardMarkup(rows) if rows else None}
+
+
+async def collect_digest_items() -> Dict[str, List[DigestItem]]:
+    items = defaultdict(list)
+
+    for training_id, training, training_type in await trainings_due_for_reminder():
+        vote_id = generate_training_id(training, training_type)
+        voted = (await load_votes(VOTES_FILE, vote_id)).keys()
+        for uid in await audience_index.resolve(training.get("team"), exclude=voted):
+            items[uid].append(await _training_item(training, training_type, vote_id))
+
+    for game_id, game in await games_due_for_reminder():
+        votes = await load_votes(GAME_VOTES_FILE, game_id)
+        for uid in await audience_index.resolve(game.get("team"), game.get("type")):
+            item = await _game_item(game, game_id, votes.get(uid))
+            if item:
+                items[uid].append(item)
+
+    debts_by_user = defaultdict(list)
+    for payment in await get_unpaid():
+        debts_by_user[payment["user_id"]].append(payment)
+    for uid, debts in debts_by_user.items():
+        if uid not in audience_index.unreachable:
+            items[uid].append(_debt_item(debts))
+
+    return items
+
+
+async def send_daily_digest(app: Application):
+    items = await collect_digest_items()
+    messages = [(uid, render_digest(user_items)) for uid, user_items in items.items()]
+    queued = await enqueue_many(f"digest:{local_today()}", messages)
+    print(f"📋 DIGEST: {sum(len(i) for i in items.values())} нагадувань у {queued} повідомленнях")
+
+
+async def handle_digest_vote(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Legacy digest_<kind>_<yes|no>_<id> buttons sent before callback tokens."""
+    prefix, vote, item_id = re.match(DIGEST_VOTE_PATTERN, update.callback_query.data).groups()
+    await handle_digest_vote_token(update, context, {"kind": prefix, "id": item_id, "vote": vote})
+
+
+async def handle_digest_vote_token(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    prefix, vote, item_id = payload["kind"], payload["vote"], payload["id"]
+    user_id = str(query.from_user.id)
+
+    if prefix == "game_vote":
+        reply = await record_game_vote(user_id, item_id, vote)
+    else:
+        reply = await record_training_vote(context, user_id, item_id, vote)
+    await query.answer(reply)
+
+    # Прибираємо з дайджесту лише кнопки цього пункту
+    item_buttons = {f"digest_{prefix}_yes_{item_id}", f"digest_{prefix}_no_{item_id}",
+                    *await _vote_callbacks(prefix, item_id)}
+    rows = [row for row in query.message.reply_markup.inline_keyboard
+            if not any(button.callback_data in item_buttons for button in row)]
+    await query.edit_message_reply_markup(InlineKeyboardMarkup(rows) if rows else None)
+
+
+def setup_digest_handlers(app):
+    register_callback("digest_vote", handle_digest_vote_token)
+    app.add_handler(CallbackQueryHandler(handle_digest_vote, pattern=DIGEST_VOTE_PATTERN))
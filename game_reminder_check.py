@@ -0,0 +1,58 @@
+import asyncio
+import os
+import sys
+
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+
+from audience import USERS_FILE
+from data import asave_data, aload_data, aupdate_document
+from notifier import remind_game_for
+from outbox import OUTBOX_FILE
+
+# Нагадування про гру, перенесену на іншу дату, має стати в чергу вдруге:
+# повідомлення першого нагадування ще лежать в outbox і не повинні
+# поглинути нове. Повторний виклик для тієї ж дати нічого не додає.
+GAME_ID = "reminder_check"
+PLAYERS = 5
+
+
+def _game(date):
+    return {"id": GAME_ID, "type": "friendly", "team": "Male", "date": date, "time": "19:00",
+            "opponent": "Суперник", "location": "Зал", "arrival_time": "18:30"}
+
+
+async def _queued():
+    outbox = await aload_data(OUTBOX_FILE, {})
+    return sorted(doc["key"] for doc in outbox.values() if doc["key"].startswith(f"game_reminder:{GAME_ID}:"))
+
+
+async def run_check() -> bool:
+    await asave_data({str(uid): {"name": f"Player {uid}", "team": "Male"} for uid in range(PLAYERS)}, USERS_FILE)
+    await asave_data({GAME_ID: _game("01.06.2030")}, "games")
+
+    await remind_game_for(None, GAME_ID)
+    first = await _queued()
+    await remind_game_for(None, GAME_ID)
+    repeated = await _queued()
+
+    await aupdate_document("games", GAME_ID, {"$set": {"date": "08.06.2030"}})
+    await remind_game_for(None, GAME_ID)
+    moved = await _queued()
+
+    print(f"перше нагадування: {len(first)}, повтор: {len(repeated)}, після перенесення: {len(moved)}")
+    problems = []
+    if len(first) != PLAYERS:
+        problems.append(f"перше нагадування поставлено {len(first)} гравцям замість {PLAYERS}")
+    if repeated != first:
+        problems.append("повторне нагадування на ту саму дату продубльовано")
+    if len(moved) != 2 * PLAYERS:
+        problems.append("нагадування про нову дату не поставлено в чергу")
+    for problem in problems:
+        print(f"❌ {problem}")
+    return not problems
+
+
+if __name__ == "__main__":
+    ok = asyncio.run(run_check())
+    print("✅ Перенесена гра отримує нове нагадування" if ok else "❌ Перевірка не пройдена")
+    sys.exit(0 if ok else 1)
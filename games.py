@@ -1,11 +1,19 @@
 import datetime
+import hashlib
 from enum import Enum
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, CallbackQueryHandler, MessageHandler, \
     filters
 
-from data import load_data, save_data,log_command_usage
+from data import aload_data, asave_data, log_command_usage
+from audience import audience_index
+from vote_store import load_votes, save_user_vote, delete_votes
+from payments_repository import is_fully_paid, mark_paid, payment_key, save_payments
 from validation import is_authorized
+from outbox import enqueue, enqueue_many
+from callbacks import callback_data, register_callback
+from jobs import schedule_game_jobs, cancel_game_jobs
+from clock import local_now
 
 GAME_TYPE, GAME_TEAM, GAME_DATE, GAME_TIME, GAME_OPPONENT, GAME_LOCATION, GAME_ARRIVAL = range(300, 307)
 EDIT_GAME_SELECT, EDIT_GAME_FIELD, EDIT_GAME_VALUE = range(320, 323)
@@ -170,7 +178,7 @@ def generate_unique_game_id(games_data: dict, user_data: dict) -> str:
     try:
         game_date = datetime.datetime.strptime(user_data['game_date'], "%d.%m.%Y")
     except:
-        game_date = datetime.datetime.now()
+        game_date = local_now()
 
     if game_date.month >= 9:
         season_start = game_date.year
@@ -201,7 +209,7 @@ async def game_arrival(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
 
     context.user_data['arrival_hour'], context.user_data['arrival_minute'] = time_tuple
 
-    games = load_data(GAMES_FILE, {})
+    games = await aload_data(GAMES_FILE, {})
     game_id = generate_unique_game_id(games, context.user_data)
     context.user_data['game_id'] = game_id
 
@@ -210,7 +218,7 @@ async def game_arrival(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
 
 
 async def save_game_and_notify(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    games = load_data(GAMES_FILE, {})
+    games = await aload_data(GAMES_FILE, {})
     game_id = context.user_data['game_id']
 
     game_data = {
@@ -234,7 +242,8 @@ async def save_game_and_notify(update: Update, context: ContextTypes.DEFAULT_TYP
     }
 
     games[game_id] = game_data
-    save_data(games, GAMES_FILE)
+    await asave_data(games, GAMES_FILE)
+    await schedule_game_jobs(game_id, game_data)
 
     type_name = game_manager.game_types[GameType(game_data['type'])]
     team_names = {"Male": "чоловічої команди", "Female": "жіночої команди", "Both": "обох команд"}
@@ -251,7 +260,7 @@ async def save_game_and_notify(update: Update, context: ContextTypes.DEFAULT_TYP
 
     try:
         game_datetime = datetime.datetime.strptime(f"{game_data['date']} {game_data['time']}", "%d.%m.%Y %H:%M")
-        now = datetime.datetime.now()
+        now = local_now()
 
         if game_datetime > now:
             await send_game_voting_to_team(context, game_data)
@@ -261,7 +270,7 @@ async def save_game_and_notify(update: Update, context: ContextTypes.DEFAULT_TYP
 
 
 async def send_game_voting_to_team(context: ContextTypes.DEFAULT_TYPE, game_data: dict):
-    users = load_data("users", {})
+    users = await audience_index.resolve(game_data["team"], game_data.get("type"))
     type_name = game_manager.game_types[GameType(game_data['type'])]
 
     message = f"Нова гра!\n\n"
@@ -274,45 +283,27 @@ async def send_game_voting_to_team(context: ContextTypes.DEFAULT_TYPE, game_data
 
     keyboard = InlineKeyboardMarkup([
         [
-            InlineKeyboardButton("Буду", callback_data=f"game_vote_yes_{game_data['id']}"),
-            InlineKeyboardButton("Не буду", callback_data=f"game_vote_no_{game_data['id']}")
+            InlineKeyboardButton("Буду", callback_data=await callback_data("game_vote", id=game_data['id'], vote="yes")),
+            InlineKeyboardButton("Не буду", callback_data=await callback_data("game_vote", id=game_data['id'], vote="no"))
         ]
     ])
 
-    for uid, user_info in users.items():
-        # existing team filter
-        if game_data["team"] not in [user_info.get("team"), "Both"]:
-            continue
-
-        # new Stolichna filter
-        if game_data.get("type") == "stolichka" and not user_info.get("stolichna", False):
-            continue
-        if game_data.get("type") == "universiad" and not user_info.get("universiada", False):
-            continue
-
-        try:
-            await context.bot.send_message(
-                chat_id=int(uid),
-                text=message,
-                reply_markup=keyboard
-            )
-        except Exception as e:
-            print(f"Помилка надсилання голосування до {uid}: {e}")
+    await enqueue(f"game_vote:{game_data['id']}", users, text=message, reply_markup=keyboard)
 
 
 async def next_game(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.message.from_user.id)
     log_command_usage(user_id, "/next_game")
-    users = load_data("users", {})
+    users = await aload_data("users", {})
 
     if user_id not in users or "team" not in users[user_id]:
         await update.message.reply_text("Будь ласка, завершіть реєстрацію.")
         return
 
     user_team = users[user_id]["team"]
-    games = load_data(GAMES_FILE, {})
+    games = await aload_data(GAMES_FILE, {})
 
-    now = datetime.datetime.now()
+    now = local_now()
     upcoming_games = []
 
     for game in games.values():
@@ -387,13 +378,13 @@ async def handle_list_games(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
 
     team_filter = query.data.replace("list_games_", "")
-    games = load_data(GAMES_FILE, {})
+    games = await aload_data(GAMES_FILE, {})
     if team_filter == "Both":
         filtered_games = list(games.values())
     else:
         filtered_games = [game for game in games.values() if game.get("team") in [team_filter, "Both"]]
 
-    now = datetime.datetime.now()
+    now = local_now()
     upcoming_games = []
 
     for game in filtered_games:
@@ -441,8 +432,8 @@ async def delete_game(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("⛔ У вас немає прав для видалення ігор.")
         return
 
-    games = load_data(GAMES_FILE, {})
-    now = datetime.datetime.now()
+    games = await aload_data(GAMES_FILE, {})
+    now = local_now()
 
     available_games = []
     for game_id, game in games.items():
@@ -529,20 +520,18 @@ async def handle_delete_game_confirmation(update: Update, context: ContextTypes.
         return
 
     game_id, game = options[idx]
-    games = load_data(GAMES_FILE, {})
+    games = await aload_data(GAMES_FILE, {})
 
     if game_id not in games:
         await query.edit_message_text("⚠️ Гру не знайдено.")
         return
 
     del games[game_id]
-    save_data(games, GAMES_FILE)
+    await asave_data(games, GAMES_FILE)
+    await cancel_game_jobs(game_id)
 
-    game_votes = load_data(GAME_VOTES_FILE, {"votes": {}})
-    if game_id in game_votes["votes"]:
-        del game_votes["votes"][game_id]
-        save_data(game_votes, GAME_VOTES_FILE)
-        print(f"✅ Видалено голосування за гру {game_id}")
+    await delete_votes(GAME_VOTES_FILE, game_id)
+    print(f"✅ Видалено голосування за гру {game_id}")
 
     type_names = {
         "friendly": "Товариська",
@@ -560,57 +549,57 @@ async def handle_delete_game_confirmation(update: Update, context: ContextTypes.
 
 
 async def handle_game_vote(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Legacy game_vote_<yes|no>_<game_id> buttons sent before callback tokens."""
+    data_parts = update.callback_query.data.split("_")
+    await handle_game_vote_token(update, context, {"vote": data_parts[2], "id": "_".join(data_parts[3:])})
+
+
+async def handle_game_vote_token(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
     query = update.callback_query
     await query.answer()
 
-    data_parts = query.data.split("_")
-    vote = data_parts[2]
-    game_id = "_".join(data_parts[3:])
+    message = await record_game_vote(str(query.from_user.id), payload["id"], payload["vote"])
+    await query.edit_message_text(message)
+
 
-    user_id = str(query.from_user.id)
-    users = load_data("users", {})
+async def record_game_vote(user_id: str, game_id: str, vote: str) -> str:
+    """Save a user's yes/no for a game and return the reply for them."""
+    users = await aload_data("users", {})
     user_info = users.get(user_id)
 
-    games = load_data("games", {})
+    games = await aload_data("games", {})
     game = games.get(game_id)
 
     # ✅ Stolichna filter
     if game and game.get("type") == "stolichka" and not user_info.get("stolichna", False):
-        await query.edit_message_text("⚠️ Це голосування доступне тільки для учасників Столичної ліги.")
-        return
+        return "⚠️ Це голосування доступне тільки для учасників Столичної ліги."
     if game and game.get("type") == "universiad" and not user_info.get("universiada", False):
-        await query.edit_message_text("⚠️ Це голосування доступне тільки для учасників")
-        return
+        return "⚠️ Це голосування доступне тільки для учасників"
 
     user_name = user_info.get("name", "Невідомий") if user_info else "Невідомий"
 
-    game_votes = load_data("game_votes", {"votes": {}})
-    if game_id not in game_votes["votes"]:
-        game_votes["votes"][game_id] = {}
-
-    game_votes["votes"][game_id][user_id] = {
+    await save_user_vote(GAME_VOTES_FILE, game_id, user_id, {
         "name": user_name,
         "vote": vote
-    }
-    save_data(game_votes, "game_votes")
+    })
 
     vote_text = "БУДУ" if vote == "yes" else "НЕ БУДУ"
-    await query.edit_message_text(f"✅ Ваш голос '{vote_text}' збережено!")
+    return f"✅ Ваш голос '{vote_text}' збережено!"
 
 
 async def week_games(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.message.from_user.id)
     log_command_usage(user_id, "/week_games")
-    users = load_data("users", {})
+    users = await aload_data("users", {})
 
     if user_id not in users or "team" not in users[user_id]:
         await update.message.reply_text("Будь ласка, завершіть реєстрацію.")
         return
 
     user_team = users[user_id]["team"]
-    games = load_data(GAMES_FILE, {})
+    games = await aload_data(GAMES_FILE, {})
 
-    now = datetime.datetime.now()
+    now = local_now()
     week_end = now + datetime.timedelta(days=7)
     week_games = []
 
@@ -661,7 +650,7 @@ async def close_game(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         await update.message.reply_text("⛔ У вас немає прав для закриття ігор.")
         return ConversationHandler.END
 
-    games = load_data(GAMES_FILE, {})
+    games = await aload_data(GAMES_FILE, {})
 
     uncompleted_games = []
     for game_id, game in games.items():
@@ -792,7 +781,7 @@ async def handle_close_game_results(update: Update, context: ContextTypes.DEFAUL
         }
 
         game = context.user_data["selected_game"]
-        users = load_data("users", {})
+        users = await aload_data("users", {})
 
         team_players = []
         for uid, user_data in users.items():
@@ -855,17 +844,17 @@ async def handle_close_game_mvp(update: Update, context: ContextTypes.DEFAULT_TY
             if uid == mvp_uid:
                 mvp_name = name
 
-                users = load_data("users", {})
+                users = await aload_data("users", {})
                 if uid in users:
                     users[uid]["mvp"] = users[uid].get("mvp", 0) + 1
-                    save_data(users, "users")
+                    await asave_data(users, "users")
                 break
 
-    games = load_data(GAMES_FILE, {})
+    games = await aload_data(GAMES_FILE, {})
     if game_id in games:
         games[game_id]["result"] = game_results
         games[game_id]["mvp"] = mvp_name
-        save_data(games, GAMES_FILE)
+        await asave_data(games, GAMES_FILE)
 
     context.user_data["final_mvp"] = mvp_name
 
@@ -905,8 +894,7 @@ async def handle_game_amount(update: Update, context: ContextTypes.DEFAULT_TYPE)
     context.user_data["game_cost"] = int(cost)
     game_id = context.user_data["selected_game_id"]
 
-    game_votes = load_data("game_votes", {"votes": {}})
-    voters = game_votes.get("votes", {}).get(game_id, {})
+    voters = await load_votes(GAME_VOTES_FILE, game_id)
     yes_voters = {uid: v for uid, v in voters.items() if v.get("vote") == "yes"}
 
     if not yes_voters:
@@ -982,7 +970,7 @@ async def handle_game_card_input(update: Update, context: ContextTypes.DEFAULT_T
     players = context.user_data["selected_players"]
 
     # 3) Load game info for messages
-    games = load_data("games", {})
+    games = await aload_data("games", {})
     game = games.get(game_id, {})
 
     # 4) Split cost
@@ -992,13 +980,12 @@ async def handle_game_card_input(update: Update, context: ContextTypes.DEFAULT_T
     per_person = round(cost / len(players))
 
     # 5) Save payments like trainings
-    payments = load_data("payments", {})
-    success_count = 0
+    payments = {}
+    messages = []
     training_id = f"game_{game_id}"  # unified id
 
     for uid in players:
-        payment_key = f"{training_id}_{uid}"  # EXACTLY like trainings
-        payments[payment_key] = {
+        payments[payment_key(training_id, uid)] = {  # EXACTLY like trainings
             "user_id": uid,
             "training_id": training_id,
             "amount": per_person,
@@ -1008,29 +995,26 @@ async def handle_game_card_input(update: Update, context: ContextTypes.DEFAULT_T
             "paid": False
         }
 
-        kb = [[InlineKeyboardButton("✅ Я оплатив(ла)", callback_data=f"paid_yes_{training_id}_{uid}")]]
-        try:
-            await context.bot.send_message(
-                chat_id=int(uid),
-                text=(f"💳 Ти грав у гру {game.get('date')} о {game.get('time')} проти {game.get('opponent')}.\n"
-                      f"Сума до сплати: {per_person} грн\n"
-                      f"Карта для оплати: `{card}`\n\n"
-                      f"Натисни кнопку нижче, коли оплатиш:"),
-                reply_markup=InlineKeyboardMarkup(kb),
-                parse_mode='Markdown'
-            )
-            success_count += 1
-        except Exception as e:
-            print(f"❌ Помилка надсилання для {uid}: {e}")
+        paid = await callback_data("paid", training_id=training_id, user_id=uid)
+        kb = [[InlineKeyboardButton("✅ Я оплатив(ла)", callback_data=paid)]]
+        messages.append((uid, {
+            "text": (f"💳 Ти грав у гру {game.get('date')} о {game.get('time')} проти {game.get('opponent')}.\n"
+                     f"Сума до сплати: {per_person} грн\n"
+                     f"Карта для оплати: `{card}`\n\n"
+                     f"Натисни кнопку нижче, коли оплатиш:"),
+            "reply_markup": InlineKeyboardMarkup(kb),
+            "parse_mode": 'Markdown'
+        }))
 
-    save_data(payments, "payments")
+    await save_payments(payments)
+    queued = await enqueue_many(f"payment:{training_id}", messages)
 
     await update.message.reply_text(
         f"✅ Платежі створено!\n"
         f"💰 Загальна сума: {cost} грн\n"
         f"👥 Учасників: {len(players)}\n"
         f"💵 По {per_person} грн з особи\n"
-        f"📤 Повідомлення надіслано {success_count} гравцям"
+        f"📤 Повідомлення поставлено в чергу для {queued} гравців"
     )
 
     # 6) Finish the same way; do NOT re-create payments here
@@ -1072,8 +1056,7 @@ async def finalize_game_closure(update, context, amount):
 
 
 async def process_game_payments(context, game_id, game, amount):
-    game_votes = load_data(GAME_VOTES_FILE, {"votes": {}})
-    votes = game_votes.get("votes", {}).get(game_id, {})
+    votes = await load_votes(GAME_VOTES_FILE, game_id)
 
     payers = [uid for uid, vote_info in votes.items() if vote_info.get("vote") == "yes"]
 
@@ -1081,7 +1064,8 @@ async def process_game_payments(context, game_id, game, amount):
         print(f"⚠️ Немає учасників для оплати гри {game_id}")
         return
 
-    payments = load_data("payments", {})
+    payments = {}
+    messages = []
 
     type_names = {
         "friendly": "Товариська гра",
@@ -1092,8 +1076,7 @@ async def process_game_payments(context, game_id, game, amount):
     amount_per_player = round(amount / len(payers))
 
     for uid in payers:
-        payment_key = f"game_{game_id}_{uid}"
-        payments[payment_key] = {
+        payments[payment_key(f"game_{game_id}", uid)] = {
             "user_id": uid,
             "training_id": f"game_{game_id}",
             "game_id": game_id,
@@ -1104,32 +1087,28 @@ async def process_game_payments(context, game_id, game, amount):
             "paid": False
         }
 
-        keyboard = [[InlineKeyboardButton("✅ Я оплатив(ла)",
-                                          callback_data=f"paid_yes_game_{game_id}_{uid}")]]
+        paid = await callback_data("paid", training_id=f"game_{game_id}", user_id=uid)
+        keyboard = [[InlineKeyboardButton("✅ Я оплатив(ла)", callback_data=paid)]]
 
-        try:
-            await context.bot.send_message(
-                chat_id=int(uid),
-                text=(f"💳 Ти брав(-ла) участь у грі:\n\n"
-                      f"🏆 {game_type}\n"
-                      f"📅 {game['date']} проти {game['opponent']}\n"
-                      f"💰 Сума до сплати: {amount_per_player} грн\n"
-                      f"💳 Карта для оплати: `{CARD_NUMBER}`\n\n"
-                      f"Натисни кнопку нижче, коли оплатиш:"),
-                reply_markup=InlineKeyboardMarkup(keyboard),
-                parse_mode='Markdown'
-            )
-        except Exception as e:
-            print(f"❌ Помилка надсилання платежу {uid}: {e}")
+        messages.append((uid, {
+            "text": (f"💳 Ти брав(-ла) участь у грі:\n\n"
+                     f"🏆 {game_type}\n"
+                     f"📅 {game['date']} проти {game['opponent']}\n"
+                     f"💰 Сума до сплати: {amount_per_player} грн\n"
+                     f"💳 Карта для оплати: `{CARD_NUMBER}`\n\n"
+                     f"Натисни кнопку нижче, коли оплатиш:"),
+            "reply_markup": InlineKeyboardMarkup(keyboard),
+            "parse_mode": 'Markdown'
+        }))
 
-    save_data(payments, "payments")
+    await save_payments(payments)
+    await enqueue_many(f"payment:game_{game_id}", messages)
 
 
 async def update_game_attendance_stats(game_id, game):
-    game_votes = load_data(GAME_VOTES_FILE, {"votes": {}})
-    votes = game_votes.get("votes", {}).get(game_id, {})
+    votes = await load_votes(GAME_VOTES_FILE, game_id)
 
-    users = load_data("users", {})
+    users = await aload_data("users", {})
     updated_count = 0
 
     for uid, vote_info in votes.items():
@@ -1153,7 +1132,7 @@ async def update_game_attendance_stats(game_id, game):
         game_attendance["total"] += 1
         updated_count += 1
 
-    save_data(users, "users")
+    await asave_data(users, "users")
 
 
 async def handle_game_payment_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1169,23 +1148,18 @@ async def handle_game_payment_confirmation(update: Update, context: ContextTypes
     user_id = query.data[game_prefix_end + 1:]
     game_id = query.data[len("paid_yes_game_"):-len(f"_{user_id}")]
 
-    payments = load_data("payments", {})
-    payment_key = f"game_{game_id}_{user_id}"
+    training_id = f"game_{game_id}"
 
-    if payment_key not in payments:
+    if not await mark_paid(payment_key(training_id, user_id)):
         await query.edit_message_text(
             "⚠️ Помилка: запис про платіж не знайдено.\n"
             "Можливо, використай команду /pay_debt для підтвердження."
         )
         return
 
-    payments[payment_key]["paid"] = True
-    save_data(payments, "payments")
-
     await query.edit_message_text("✅ Дякуємо! Оплату зареєстровано.")
 
-    training_id = f"game_{game_id}"
-    all_paid = all(p["paid"] for p in payments.values() if p.get("training_id") == training_id)
+    all_paid = await is_fully_paid(training_id)
 
     if all_paid:
         from validation import ADMIN_IDS
@@ -1206,7 +1180,7 @@ async def edit_game(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         await update.message.reply_text("⛔ У вас немає прав для редагування ігор.")
         return ConversationHandler.END
 
-    games = load_data(GAMES_FILE, {})
+    games = await aload_data(GAMES_FILE, {})
 
     if not games:
         await update.message.reply_text("Немає ігор для редагування.")
@@ -1297,14 +1271,15 @@ async def handle_edit_game_field(update: Update, context: ContextTypes.DEFAULT_T
             return EDIT_GAME_FIELD
 
         game_id = context.user_data["edit_game_id"]
-        games = load_data(GAMES_FILE, {})
+        games = await aload_data(GAMES_FILE, {})
 
         old_game = games[game_id].copy()
 
         for field, new_value in changes.items():
             games[game_id][field] = new_value
 
-        save_data(games, GAMES_FILE)
+        await asave_data(games, GAMES_FILE)
+        await schedule_game_jobs(game_id, games[game_id])
 
         await send_game_update_notification(context, old_game, games[game_id], changes)
 
@@ -1447,8 +1422,6 @@ async def handle_edit_game_value(update: Update, context: ContextTypes.DEFAULT_T
 
 
 async def send_game_update_notification(context: ContextTypes.DEFAULT_TYPE, old_game, new_game, changes):
-    users = load_data("users", {})
-
     type_names = {
         "friendly": "Товариська гра",
         "stolichka": "Столична ліга",
@@ -1479,24 +1452,10 @@ async def send_game_update_notification(context: ContextTypes.DEFAULT_TYPE, old_
 
         message += f"• {field_names.get(field, field)}: {old_value} → {new_value}\n"
 
-    count = 0
-    for uid, user_info in users.items():
-        # Stolichka filter
-        if new_game.get("type") == "stolichka" and not user_info.get("stolichna", False):
-            continue
-
-        # Universiada filter
-        if new_game.get("type") == "universiad" and not user_info.get("universiada", False):
-            continue
-
-        if new_game.get("team") in [user_info.get("team"), "Both"]:
-            try:
-                await context.bot.send_message(chat_id=int(uid), text=message)
-                count += 1
-            except Exception as e:
-                print(f"❌ Помилка надсилання сповіщення до {uid}: {e}")
-
-    print(f"✅ Сповіщення про зміни в грі надіслано {count} користувачам")
+    recipients = await audience_index.resolve(new_game.get("team"), new_game.get("type"))
+    edit_key = hashlib.sha1(message.encode()).hexdigest()[:12]
+    queued = await enqueue(f"game_edit:{new_game.get('id')}:{edit_key}", recipients, text=message)
+    print(f"✅ Сповіщення про зміни в грі поставлено в чергу для {queued} користувачів")
 
 
 def create_edit_game_handler():
@@ -1578,4 +1537,5 @@ def setup_game_handlers(app):
     app.add_handler(CallbackQueryHandler(handle_delete_game_selection, pattern=r"^delete_game_select_\d+$"))
     app.add_handler(
         CallbackQueryHandler(handle_delete_game_confirmation, pattern=r"^delete_game_(confirm_\d+|cancel)$"))
+    register_callback("game_vote", handle_game_vote_token)
     app.add_handler(CallbackQueryHandler(handle_game_vote, pattern=r"^game_vote_(yes|no)_"))
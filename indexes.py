@@ -0,0 +1,47 @@
+from data import ensure_index
+from payments_repository import ensure_payment_indexes
+from outbox import ensure_outbox_indexes
+from callbacks import ensure_callback_indexes
+
+# votes, game_votes, general_votes та commands читаються лише за _id,
+# тому окремих індексів не потребують.
+INDEXES = {
+    "users": [
+        [("team", 1)],
+    ],
+    "one_time_trainings": [
+        [("status", 1)],
+        [("voting_opened", 1)],
+    ],
+    "constant_trainings": [
+        [("status", 1)],
+        [("voting_opened", 1)],
+    ],
+    "games": [
+        [("team", 1)],
+        [("date", 1)],
+    ],
+    "general": [
+        [("is_active", 1)],
+    ],
+    "training_occurrences": [
+        [("day", 1)],
+    ],
+    "training_votes_archive": [
+        [("training_id", 1)],
+        [("date", 1)],
+    ],
+    "commands_hourly": [
+        [("command", 1), ("hour", 1)],
+    ],
+}
+
+
+def ensure_indexes():
+    ensure_payment_indexes()
+    ensure_outbox_indexes()
+    ensure_callback_indexes()
+    for collection_name, indexes in INDEXES.items():
+        for keys in indexes:
+            ensure_index(collection_name, keys)
+    print("✅ Indexes are in place")
@@ -0,0 +1,388 @@
+import asyncio
+import os
+import uuid
+from datetime import datetime, time, timedelta
+
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.jobstores.mongodb import MongoDBJobStore
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.date import DateTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+
+from clock import TIMEZONE, local_now
+from data import aload_data, aload_document, afind_and_update, aupdate_document, cache, run_db, storage, \
+    flush_command_usage
+from leader import LOCKS_FILE, Lease, while_leader
+from occurrences import occurrences_between, refresh_occurrences
+from notifier import DAILY_DIGEST, training_collection, open_voting_for, remind_voting_for, remind_game_for
+from training_archive import enhanced_reset_today_constant_trainings_status
+
+# Розклад живе в циклі подій бота і зберігається в Mongo (колекція scheduler_jobs):
+# після перезапуску пропущений запуск виконується один раз, якщо запізнення
+# не більше JOB_MISFIRE_GRACE_SECONDS, а дубль тієї ж роботи не створюється.
+JOBS_COLLECTION = "scheduler_jobs"
+JOB_MISFIRE_GRACE_SECONDS = int(os.getenv("JOB_MISFIRE_GRACE_SECONDS", "3600"))
+COMMAND_USAGE_FLUSH_SECONDS = int(os.getenv("COMMAND_USAGE_FLUSH_SECONDS", "60"))
+# Як часто лідер перевіряє позначку змін розкладу, залишену іншими репліками
+JOBS_DIRTY_POLL_SECONDS = int(os.getenv("JOBS_DIRTY_POLL_SECONDS", "30"))
+# Документ у locks: {"changes": {"training:<type>:<id>" | "game:<id>": stamp}}
+JOBS_DIRTY = "jobs_dirty"
+# Скільки прострочених відкриттів і нагадувань виконується одночасно після старту
+CATCHUP_CONCURRENCY = int(os.getenv("CATCHUP_CONCURRENCY", "4"))
+SCHEDULER_LEASE = "scheduler"
+
+VOTING_OPEN_HOUR = 18
+REMINDER_HOUR = 19
+TRAINING_REMINDER_DAYS = 2
+GAME_REMINDER_DAYS = 1
+
+# Jobs are persisted by reference, so they can't take the Application as an
+# argument; the running app is kept here instead.
+_app = None
+_scheduler = None
+_local_scheduler = None
+_leader_task = None
+
+
+async def run_open_voting(training_type, training_id):
+    await open_voting_for(_app, training_type, training_id)
+
+
+async def run_voting_reminder(training_type, training_id):
+    await remind_voting_for(_app, training_type, training_id)
+
+
+async def run_game_reminder(game_id):
+    await remind_game_for(_app, game_id)
+
+
+async def run_daily_digest():
+    # digest -> games -> jobs
+    from digest import send_daily_digest
+    await send_daily_digest(_app)
+
+
+async def run_reset_constant_trainings():
+    await enhanced_reset_today_constant_trainings_status()
+
+
+def _jobstore():
+    client = getattr(storage, "client", None)
+    if client is None:
+        # Offline backends (memory, sqlite) keep the schedule in memory only
+        return MemoryJobStore()
+    return MongoDBJobStore(database=storage.db.name, collection=JOBS_COLLECTION, client=client)
+
+
+def create_scheduler(jobstore) -> AsyncIOScheduler:
+    return AsyncIOScheduler(
+        jobstores={"default": jobstore},
+        job_defaults={
+            "coalesce": True,
+            "max_instances": 1,
+            "misfire_grace_time": JOB_MISFIRE_GRACE_SECONDS,
+        },
+        timezone=TIMEZONE,
+    )
+
+
+def local_jobs():
+    """job id -> (function, trigger) for jobs every replica runs on its own."""
+    return {
+        # Flush buffered command usage counters
+        "flush_command_usage": (flush_command_usage, IntervalTrigger(seconds=COMMAND_USAGE_FLUSH_SECONDS,
+                                                                      timezone=TIMEZONE)),
+    }
+
+
+def scheduled_jobs():
+    """job id -> (function, trigger) for the bot-wide recurring jobs (leader only)."""
+    def daily(hour):
+        return CronTrigger(hour=hour, minute=0, timezone=TIMEZONE)
+
+    jobs = {
+        # Roll the training calendar forward at midnight
+        "refresh_occurrences": (refresh_occurrences, daily(0)),
+        # Reset training statuses daily at 22:00
+        "reset_constant_trainings": (run_reset_constant_trainings, daily(22)),
+        # Safety net: full reconciliation once a day, changes arrive through JOBS_DIRTY
+        "sync_jobs": (sync_jobs, daily(3)),
+    }
+    if DAILY_DIGEST:
+        # One message per user with reminders, tomorrow's games and debts at 19:00
+        jobs["daily_digest"] = (run_daily_digest, daily(REMINDER_HOUR))
+    return jobs
+
+
+def _once(day, hour):
+    """DateTrigger for hour:00 on day, or None when that moment has passed."""
+    run_date = datetime.combine(day, time(hour))
+    if run_date <= local_now():
+        return None
+    return DateTrigger(run_date=run_date, timezone=TIMEZONE)
+
+
+def _weekly(weekday, hour):
+    return CronTrigger(day_of_week=weekday, hour=hour, minute=0, timezone=TIMEZONE)
+
+
+def training_job_ids(training_type, training_id):
+    return [f"training_open:{training_type}:{training_id}", f"training_reminder:{training_type}:{training_id}"]
+
+
+def game_job_ids(game_id):
+    return [f"game_reminder:{game_id}"]
+
+
+def training_jobs(training_type, training_id, training):
+    """job id -> (function, trigger, args): voting opens at 18:00 on the
+    start_voting day, the reminder goes out at 19:00 two days before."""
+    open_id, reminder_id = training_job_ids(training_type, training_id)
+    args = (training_type, training_id)
+    jobs = {}
+
+    if training_type == "one-time":
+        try:
+            training_date = datetime.strptime(training["date"], "%d.%m.%Y").date()
+            voting_date = datetime.strptime(training["start_voting"], "%d.%m.%Y").date()
+        except (KeyError, ValueError):
+            return jobs
+        if training_date < local_now().date():
+            return jobs
+        open_trigger = _once(voting_date, VOTING_OPEN_HOUR)
+        # Прострочене відкриття надолужує catch_up()
+        if open_trigger is not None and not training.get("voting_opened", False):
+            jobs[open_id] = (run_open_voting, open_trigger, args)
+        reminder = _once(training_date - timedelta(days=TRAINING_REMINDER_DAYS), REMINDER_HOUR)
+    else:
+        if "weekday" not in training or not isinstance(training.get("start_voting"), int):
+            return jobs
+        jobs[open_id] = (run_open_voting, _weekly(training["start_voting"], VOTING_OPEN_HOUR), args)
+        reminder = _weekly((training["weekday"] - TRAINING_REMINDER_DAYS) % 7, REMINDER_HOUR)
+
+    # З дайджестом нагадування приходять у ньому
+    if reminder is not None and not DAILY_DIGEST:
+        jobs[reminder_id] = (run_voting_reminder, reminder, args)
+    return jobs
+
+
+def game_jobs(game_id, game):
+    """job id -> (function, trigger, args): the reminder at 19:00 the day before."""
+    try:
+        game_date = datetime.strptime(game["date"], "%d.%m.%Y").date()
+    except (KeyError, ValueError):
+        return {}
+    reminder = _once(game_date - timedelta(days=GAME_REMINDER_DAYS), REMINDER_HOUR)
+    if reminder is None or DAILY_DIGEST:
+        return {}
+    return {game_job_ids(game_id)[0]: (run_game_reminder, reminder, (game_id,))}
+
+
+async def event_jobs():
+    jobs = {}
+    for training_type in ("one-time", "constant"):
+        trainings = await aload_data(training_collection(training_type), {})
+        for training_id, training in trainings.items():
+            jobs.update(training_jobs(training_type, training_id, training))
+    for game_id, game in (await aload_data("games", {})).items():
+        jobs.update(game_jobs(game_id, game))
+    return jobs
+
+
+def _reconcile(scheduler, jobs, job_ids=None):
+    """Bring the stored jobs in line with jobs; only the stored jobs among job_ids
+    (all of them when None) may be removed. Blocking job store calls - run it
+    through run_db."""
+    if job_ids is None:
+        stored = {job.id: job for job in scheduler.get_jobs()}
+    else:
+        stored = {job_id: scheduler.get_job(job_id) for job_id in job_ids}
+    for job_id, job in stored.items():
+        if job is not None and job_id not in jobs:
+            scheduler.remove_job(job_id)
+
+    for job_id, (func, trigger, *rest) in jobs.items():
+        args = rest[0] if rest else ()
+        job = stored.get(job_id)
+        # Збережену роботу з тим самим розкладом не чіпаємо: заміна перерахувала б
+        # next_run_time і пропущений під час простою запуск було б втрачено
+        if job is not None and str(job.trigger) == str(trigger) and tuple(job.args) == tuple(args):
+            continue
+        scheduler.add_job(func, trigger, args=args, id=job_id, replace_existing=True)
+
+
+async def _mark_dirty(key):
+    """Leave the change of key's jobs for the leader; the stamp lets it clear
+    exactly the mark it has handled."""
+    await aupdate_document(LOCKS_FILE, JOBS_DIRTY, {"$set": {f"changes.{key}": uuid.uuid4().hex}}, upsert=True)
+
+
+async def _replace_jobs(key, job_ids, jobs):
+    if _scheduler is None:
+        # Розклад веде інша репліка
+        await _mark_dirty(key)
+        return
+    await run_db(_reconcile, _scheduler, jobs, job_ids)
+
+
+async def schedule_training_jobs(training_type, training_id, training):
+    """Register (or move) the jobs of a created or edited training."""
+    await _replace_jobs(f"training:{training_type}:{training_id}", training_job_ids(training_type, training_id),
+                        training_jobs(training_type, training_id, training))
+
+
+async def cancel_training_jobs(training_type, training_id):
+    await _replace_jobs(f"training:{training_type}:{training_id}", training_job_ids(training_type, training_id), {})
+
+
+async def schedule_game_jobs(game_id, game):
+    await _replace_jobs(f"game:{game_id}", game_job_ids(game_id), game_jobs(game_id, game))
+
+
+async def cancel_game_jobs(game_id):
+    await _replace_jobs(f"game:{game_id}", game_job_ids(game_id), {})
+
+
+async def apply_job_changes():
+    """Reschedule the trainings and games other replicas marked in JOBS_DIRTY (leader only)."""
+    changes = (await aload_document(LOCKS_FILE, JOBS_DIRTY, {})).get("changes", {})
+    if not changes:
+        return
+    # Зміну зробила інша репліка, тож кеш цього процесу може її ще не бачити
+    for collection in ("one-time", "constant"):
+        cache.invalidate(training_collection(collection))
+    cache.invalidate("games")
+
+    for key, stamp in changes.items():
+        if key.startswith("training:"):
+            _, training_type, training_id = key.split(":", 2)
+            training = await aload_document(training_collection(training_type), training_id)
+            await _replace_jobs(key, training_job_ids(training_type, training_id),
+                                training_jobs(training_type, training_id, training) if training else {})
+        else:
+            game_id = key.split(":", 1)[1]
+            game = await aload_document("games", game_id)
+            await _replace_jobs(key, game_job_ids(game_id), game_jobs(game_id, game) if game else {})
+        # Нова позначка, поставлена тим часом, лишається до наступної перевірки
+        await afind_and_update(LOCKS_FILE, {"_id": JOBS_DIRTY, f"changes.{key}": stamp},
+                               {"$unset": {f"changes.{key}": ""}})
+
+
+async def sync_jobs():
+    """Reconcile the stored schedule with the bot-wide jobs and the jobs of
+    every stored training and game, reading the stored jobs once."""
+    jobs = scheduled_jobs()
+    jobs.update(await event_jobs())
+    await run_db(_reconcile, _scheduler, jobs)
+
+
+def _opening_time(training_type, training, starts_at: datetime) -> datetime:
+    """When voting for the training starting at starts_at opens."""
+    if training_type == "one-time":
+        voting_date = datetime.strptime(training["start_voting"], "%d.%m.%Y").date()
+        return datetime.combine(voting_date, time(VOTING_OPEN_HOUR))
+    # Останній день start_voting перед заняттям
+    days_back = (starts_at.weekday() - training["start_voting"]) % 7
+    opens_at = datetime.combine(starts_at.date() - timedelta(days=days_back), time(VOTING_OPEN_HOUR))
+    return opens_at if opens_at <= starts_at else opens_at - timedelta(days=7)
+
+
+async def overdue_work(now: datetime):
+    """(label, function, args) for openings and reminders whose time has passed
+    while the bot was down, for trainings and games that haven't started yet."""
+    trainings = {training_type: await aload_data(training_collection(training_type), {})
+                 for training_type in ("one-time", "constant")}
+    work = []
+    seen = set()
+
+    for occurrence in await occurrences_between(now.date(), None):
+        training_type, training_id = occurrence["training_type"], occurrence["training_id"]
+        training = trainings[training_type].get(training_id)
+        starts_at = datetime.strptime(occurrence["starts_at"], "%Y-%m-%d %H:%M")
+        if training is None or starts_at <= now or (training_type, training_id) in seen:
+            continue
+        seen.add((training_type, training_id))
+        args = (training_type, training_id)
+
+        try:
+            opens_at = _opening_time(training_type, training, starts_at)
+        except (KeyError, TypeError, ValueError):
+            continue
+        if opens_at <= now and not training.get("voting_opened", False):
+            work.append((f"відкриття голосування {occurrence['vote_id']}", run_open_voting, args))
+
+        reminds_at = datetime.combine(starts_at.date() - timedelta(days=TRAINING_REMINDER_DAYS), time(REMINDER_HOUR))
+        if (not DAILY_DIGEST and reminds_at <= now
+                and training.get("reminder_sent_for") != occurrence["day"]):
+            work.append((f"нагадування {occurrence['vote_id']}", run_voting_reminder, args))
+
+    for game_id, game in (await aload_data("games", {})).items():
+        try:
+            starts_at = datetime.strptime(f"{game['date']} {game['time']}", "%d.%m.%Y %H:%M")
+        except (KeyError, ValueError):
+            continue
+        reminds_at = datetime.combine(starts_at.date() - timedelta(days=GAME_REMINDER_DAYS), time(REMINDER_HOUR))
+        if (not DAILY_DIGEST and reminds_at <= now < starts_at
+                and game.get("reminder_sent_for") != game["date"]):
+            work.append((f"нагадування про гру {game_id}", run_game_reminder, (game_id,)))
+
+    return work
+
+
+async def catch_up():
+    """Run the overdue work found at startup, a few items at a time."""
+    work = await overdue_work(local_now())
+    semaphore = asyncio.Semaphore(CATCHUP_CONCURRENCY)
+
+    async def run(label, func, args):
+        async with semaphore:
+            try:
+                await func(*args)
+                print(f"⏰ CATCH-UP: {label}")
+            except Exception as e:
+                print(f"❌ CATCH-UP: {label}: {e}")
+
+    await asyncio.gather(*(run(*item) for item in work))
+
+
+async def run_scheduler():
+    """Run the shared schedule; only the replica holding the scheduler lease does."""
+    global _scheduler
+    scheduler = create_scheduler(_jobstore())
+    # Paused, so stored jobs are reconciled before any of them fires
+    scheduler.start(paused=True)
+    try:
+        _scheduler = scheduler
+        # Роботи тренувань та ігор, створених чи змінених, поки бот не працював
+        await sync_jobs()
+        await catch_up()
+        scheduler.resume()
+        while True:
+            await asyncio.sleep(JOBS_DIRTY_POLL_SECONDS)
+            try:
+                await apply_job_changes()
+            except Exception as e:
+                print(f"❌ SCHEDULER: не вдалося застосувати зміни розкладу: {e}")
+    finally:
+        _scheduler = None
+        scheduler.shutdown(wait=False)
+
+
+async def start_scheduler(app) -> None:
+    """Start scheduling on the running event loop (call from post_init)."""
+    global _app, _local_scheduler, _leader_task
+    _app = app
+    _local_scheduler = create_scheduler(MemoryJobStore())
+    for job_id, (func, trigger) in local_jobs().items():
+        _local_scheduler.add_job(func, trigger, id=job_id)
+    _local_scheduler.start()
+    _leader_task = asyncio.create_task(while_leader(Lease(SCHEDULER_LEASE), run_scheduler))
+
+
+async def stop_scheduler(app) -> None:
+    if _leader_task is not None:
+        _leader_task.cancel()
+        await asyncio.gather(_leader_task, return_exceptions=True)
+    if _local_scheduler is not None:
+        _local_scheduler.shutdown(wait=False)
@@ -0,0 +1,83 @@
+import asyncio
+import datetime
+import os
+import socket
+import uuid
+from typing import Awaitable, Callable
+
+from data import afind_and_update
+
+# Кілька реплік бота (кілька worker-ів у Procfile) працюють з однією базою.
+# Розклад і розсилку веде лише та репліка, що тримає оренду в колекції locks;
+# оренда продовжується кожну третину LEASE_SECONDS і переходить до іншої
+# репліки, коли власник зник. Годинники реплік мають бути синхронізовані.
+LOCKS_FILE = "locks"
+LEASE_SECONDS = int(os.getenv("LEASE_SECONDS", "30"))
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class Lease:
+    """A named lease in the locks collection, held by at most one instance at a time."""
+
+    def __init__(self, name: str, seconds: int = LEASE_SECONDS, holder: str = INSTANCE_ID):
+        self.name = name
+        self.seconds = seconds
+        self.holder = holder
+
+    async def acquire(self) -> bool:
+        """Take the lease if it is free or expired, or extend it if it is already ours."""
+        now = datetime.datetime.utcnow()
+        doc = await afind_and_update(
+            LOCKS_FILE,
+            {"_id": self.name, "$or": [{"holder": self.holder}, {"expires_at": {"$lt": now}}]},
+            {"$set": {"holder": self.holder, "expires_at": now + datetime.timedelta(seconds=self.seconds)}},
+            upsert=True
+        )
+        return doc is not None and doc.get("holder") == self.holder
+
+    async def release(self) -> None:
+        await afind_and_update(LOCKS_FILE, {"_id": self.name, "holder": self.holder},
+                               {"$set": {"expires_at": datetime.datetime.utcnow()}})
+
+
+async def _cancel(task: asyncio.Task) -> None:
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    except Exception as e:
+        print(f"❌ LEADER: помилка під час зупинки: {e}")
+
+
+async def while_leader(lease: Lease, work: Callable[[], Awaitable]) -> None:
+    """Compete for the lease until cancelled and run work() only while holding it.
+    work is cancelled as soon as a renewal fails or takes too long, which is
+    before the lease can expire and pass to another replica."""
+    renew_seconds = lease.seconds / 3
+    task = None
+    try:
+        while True:
+            if task is not None and task.done():
+                if not task.cancelled() and task.exception():
+                    print(f"❌ LEADER: {lease.name} завершився з помилкою: {task.exception()}")
+                task = None
+
+            try:
+                held = await asyncio.wait_for(lease.acquire(), timeout=renew_seconds)
+            except asyncio.TimeoutError:
+                held = False
+
+            if held and task is None:
+                print(f"👑 LEADER: {lease.holder} веде {lease.name}")
+                task = asyncio.create_task(work())
+            elif not held and task is not None:
+                print(f"⚠️ LEADER: {lease.holder} втратив {lease.name}")
+                await _cancel(task)
+                task = None
+
+            await asyncio.sleep(renew_seconds)
+    finally:
+        if task is not None:
+            await _cancel(task)
+            await lease.release()
@@ -0,0 +1,84 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+from data import aupdate_document, load_data, load_document, storage
+from leader import LOCKS_FILE, Lease, while_leader
+
+# Запускати проти локальної бази (MONGO_URI=mongodb://localhost:27017): кілька
+# процесів змагаються за одну оренду й виконують "роботу" раз на TICK_SECONDS,
+# посередині лідера вбивають. Кожен тік має бути виконаний рівно один раз.
+LEASE_NAME = "lease_check"
+TICKS_FILE = "lease_check_ticks"
+PROCESSES = 4
+LEASE_SECONDS = 3
+TICK_SECONDS = 0.5
+RUN_SECONDS = 20
+KILL_LEADER_AFTER = 8
+
+
+def _tick_loop():
+    async def work():
+        while True:
+            slot = int(time.time() / TICK_SECONDS)
+            await aupdate_document(TICKS_FILE, str(slot), {"$inc": {"runs": 1}, "$set": {"pid": os.getpid()}},
+                                   upsert=True)
+            await asyncio.sleep(TICK_SECONDS - time.time() % TICK_SECONDS)
+
+    async def main():
+        await while_leader(Lease(LEASE_NAME, LEASE_SECONDS), work)
+
+    asyncio.run(main())
+
+
+def _reset():
+    for doc_id in load_data(TICKS_FILE, {}):
+        storage.delete_one(TICKS_FILE, {"_id": doc_id})
+    storage.delete_one(LOCKS_FILE, {"_id": LEASE_NAME})
+
+
+def _leader_pid():
+    lock = load_document(LOCKS_FILE, LEASE_NAME)
+    return int(lock["holder"].split(":")[1]) if lock else None
+
+
+def run_check() -> bool:
+    _reset()
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_tick_loop, daemon=True) for _ in range(PROCESSES)]
+    for process in processes:
+        process.start()
+
+    time.sleep(KILL_LEADER_AFTER)
+    killed = _leader_pid()
+    if killed:
+        os.kill(killed, signal.SIGKILL)
+        print(f"💀 Зупинено лідера {killed}")
+    killed_at = time.time()
+
+    time.sleep(RUN_SECONDS - KILL_LEADER_AFTER)
+    for process in processes:
+        process.terminate()
+        process.join()
+
+    ticks = load_data(TICKS_FILE, {})
+    duplicates = {slot: tick["runs"] for slot, tick in ticks.items() if tick["runs"] != 1}
+    leaders = {tick["pid"] for tick in ticks.values()}
+    failed_over = any(int(slot) * TICK_SECONDS > killed_at + LEASE_SECONDS for slot in ticks)
+
+    print(f"Тіків: {len(ticks)}, лідерів: {len(leaders)}, дублікатів: {len(duplicates)}")
+    if duplicates:
+        print(f"❌ Тіки виконано більше одного разу: {duplicates}")
+    if not failed_over:
+        print("❌ Після зупинки лідера ніхто не перейняв оренду")
+    _reset()
+    return not duplicates and failed_over
+
+
+if __name__ == "__main__":
+    ok = run_check()
+    print("✅ Кожен тік виконано рівно один раз" if ok else "❌ Перевірка не пройдена")
+    sys.exit(0 if ok else 1)
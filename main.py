@@ -1,17 +1,21 @@
-import asyncio
 import os
 
-from apscheduler.schedulers.background import BackgroundScheduler
 from telegram import Update
 from telegram.ext import Application, ContextTypes, MessageHandler, filters
 
-from trainings import setup_training_handlers, reset_today_constant_trainings_status, delete_training
+from trainings import setup_training_handlers, delete_training
 from registration import setup_registration_handlers
 from games import setup_game_handlers
 from voting import setup_voting_handlers
 from payments import setup_payment_handlers
 from commands import setup_admin_handlers
-from notifier import check_voting_and_notify, start_voting, check_game_reminders
+from data import flush_command_usage
+from indexes import ensure_indexes
+from outbox import start_worker, stop_worker
+from digest import setup_digest_handlers
+from callbacks import setup_callback_router
+from jobs import start_scheduler, stop_scheduler
+from occurrences import refresh_occurrences
 from telegram.ext import Application, MessageHandler, filters
 
 
@@ -25,61 +29,42 @@ async def error(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     print(f"Update {update} caused error {context.error}")
 
 
-def setup_scheduler(app):
-    scheduler = BackgroundScheduler()
-    loop = asyncio.get_event_loop()
+async def post_init(app: Application) -> None:
+    await refresh_occurrences()
+    await start_scheduler(app)
+    await start_worker(app)
 
-    # Start voting daily at 18:00
-    scheduler.add_job(
-        lambda: loop.call_soon_threadsafe(
-            lambda: asyncio.create_task(start_voting(app))
-        ),
-        'cron', hour=15, minute=0
-    )
-
-    # Send voting reminders daily at 19:00
-    scheduler.add_job(
-        lambda: loop.call_soon_threadsafe(
-            lambda: asyncio.create_task(check_voting_and_notify(app))
-        ),
-        'cron', hour=16, minute=0
-    )
-
-    # Send game reminders daily at 19:00
-    scheduler.add_job(
-        lambda: loop.call_soon_threadsafe(
-            lambda: asyncio.create_task(check_game_reminders(app))
-        ),
-        'cron', hour=16, minute=0
-    )
 
-    # Reset training statuses daily at 22:00
-    scheduler.add_job(
-        lambda: loop.call_soon_threadsafe(
-            lambda: asyncio.create_task(reset_today_constant_trainings_status())
-        ),
-        'cron', hour=19, minute=0
-    )
-
-    scheduler.start()
-    return scheduler
+async def post_stop(app: Application) -> None:
+    await stop_scheduler(app)
+    await stop_worker(app)
 
 
 if __name__ == "__main__":
-    app = Application.builder().token(BOT_TOKEN).build()
+    ensure_indexes()
+
+    app = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .build()
+    )
 
     setup_registration_handlers(app)
     setup_training_handlers(app)
     setup_game_handlers(app)
     setup_voting_handlers(app)
     setup_payment_handlers(app)
+    setup_digest_handlers(app)
+    setup_callback_router(app)
     setup_admin_handlers(app)  # Must be last
 
-    scheduler = setup_scheduler(app)
-
     app.add_error_handler(error)
 
 
     app.run_polling(poll_interval=0.1)
 
+    flush_command_usage()
+
 
@@ -1,7 +1,14 @@
+import os
 from datetime import datetime, timedelta
-from data import load_data, save_data
+from data import aload_data, aload_document, aupdate_document
+from audience import audience_index
+from occurrences import occurrences_between, next_occurrence, with_trainings
+from vote_store import load_votes
+from outbox import enqueue, enqueue_many
+from callbacks import callback_data
 from telegram.ext import Application
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from clock import local_today
 
 REGISTRATION_FILE = "users"
 ONE_TIME_TRAININGS_FILE = "one_time_trainings"
@@ -10,6 +17,10 @@ VOTES_FILE = "votes"
 WEEKDAYS = ['понеділок', 'вівторок', 'середу', 'четвер', "п'ятницю", 'суботу', 'неділю']
 VOTES_LIMIT = 30
 
+# DAILY_DIGEST=1: замість окремих нагадувань про тренування, ігри та борги
+# кожен користувач отримує одне повідомлення з усім, що від нього чекають.
+DAILY_DIGEST = os.getenv("DAILY_DIGEST", "").lower() in ("1", "true", "yes")
+
 
 def generate_training_id(training, training_type):
     if training_type == "one-time":
@@ -18,71 +29,53 @@ def generate_training_id(training, training_type):
         return f"const_{training['weekday']}_{training['start_hour']:02d}:{training['start_min']:02d}"
 
 
-async def start_voting(app: Application):
-    users = load_data(REGISTRATION_FILE)
-    today = datetime.today().date()
-    weekday = today.weekday()
-
-    one_time_trainings = load_data(ONE_TIME_TRAININGS_FILE, {})
-    constant_trainings = load_data(CONSTANT_TRAININGS_FILE, {})
-
-    for training_id, training in one_time_trainings.items():
-        if (training.get("start_voting") == today.strftime("%d.%m.%Y") and
-                not training.get("voting_opened", False)):
-            await open_training_voting(app, training, training_id, users, "one-time")
-            training["status"]="not charged"
-            training["voting_opened"] = True
-            one_time_trainings[training_id] = training
-    save_data(one_time_trainings, ONE_TIME_TRAININGS_FILE)
-    for training_id, training in constant_trainings.items():
-        if (training.get("start_voting") == weekday and
-                not training.get("voting_opened", False)):
-            await open_training_voting(app, training, training_id, users, "constant")
-            training["status"] = "not charged"
-            training["voting_opened"] = True
-            constant_trainings[training_id] = training
-    save_data(constant_trainings, CONSTANT_TRAININGS_FILE)
+def training_collection(training_type):
+    return ONE_TIME_TRAININGS_FILE if training_type == "one-time" else CONSTANT_TRAININGS_FILE
 
 
-async def check_voting_and_notify(app: Application):
-    from datetime import datetime, timedelta
+async def open_voting_for(app: Application, training_type, training_id):
+    """Open voting for one training unless it was deleted or is already open."""
+    collection = training_collection(training_type)
+    training = await aload_document(collection, training_id)
+    if not training or training.get("voting_opened", False):
+        return
+    await open_training_voting(app, training, training_id, training_type)
+    await aupdate_document(collection, training_id, {"$set": {"status": "not charged", "voting_opened": True}})
 
-    users = load_data(REGISTRATION_FILE)
-    today = datetime.today().date()
 
-    one_time_trainings = load_data(ONE_TIME_TRAININGS_FILE, {})
-    constant_trainings = load_data(CONSTANT_TRAININGS_FILE, {})
-    votes_data = load_data(VOTES_FILE, {"votes": {}})
-
-    for training_id, training in one_time_trainings.items():
-        try:
-            training_date = datetime.strptime(training["date"], "%d.%m.%Y").date()
-        except Exception:
-            continue
+async def remind_voting_for(app: Application, training_type, training_id):
+    """Remind about the training's next date, once per date."""
+    collection = training_collection(training_type)
+    training = await aload_document(collection, training_id)
+    if not training:
+        return
+    vote_id = generate_training_id(training, training_type)
+    occurrence = await next_occurrence(vote_id)
+    if occurrence is None or training.get("reminder_sent_for") == occurrence["day"]:
+        return
+    votes_data = {vote_id: await load_votes(VOTES_FILE, vote_id)}
+    await send_voting_reminder(app, training, training_id, votes_data, training_type)
+    await aupdate_document(collection, training_id, {"$set": {"reminder_sent_for": occurrence["day"]}})
 
-        if (training_date - today).days == 2:
-            await send_voting_reminder(app, training, training_id, users, votes_data, "one-time")
 
-    for training_id, training in constant_trainings.items():
-        if "weekday" not in training:
-            continue
+async def remind_game_for(app: Application, game_id):
+    game = await aload_document("games", game_id)
+    # Дата в позначці: після перенесення гри нагадування прийде знову
+    if not game or game.get("reminder_sent_for") == game.get("date"):
+        return
+    game_votes = {game_id: await load_votes("game_votes", game_id)}
+    await send_game_reminder(app, game, game_id, game_votes)
+    await aupdate_document("games", game_id, {"$set": {"reminder_sent_for": game["date"]}})
 
-        training_weekday = training["weekday"]
-        training_time = datetime(
-            year=today.year, month=today.month, day=today.day,
-            hour=training["start_hour"], minute=training["start_min"]
-        )
-        # Find the date of the next occurrence of the training weekday
-        days_ahead = (training_weekday - today.weekday()) % 7
-        if days_ahead == 0:
-            days_ahead = 7
-        training_date = today + timedelta(days=days_ahead)
 
-        if (training_date - today).days == 2:
-            await send_voting_reminder(app, training, training_id, users, votes_data, "constant")
+async def trainings_due_for_reminder():
+    """(training_id, training, training_type) for trainings two days away."""
+    day = local_today() + timedelta(days=2)
+    return [(occurrence["training_id"], training, occurrence["training_type"])
+            for occurrence, training in await with_trainings(await occurrences_between(day, day))]
 
 
-async def open_training_voting(app, training, training_id, users, training_type):
+async def open_training_voting(app, training, training_id, training_type):
     vote_id = generate_training_id(training, training_type)
 
     if training_type == "one-time":
@@ -115,24 +108,16 @@ async def open_training_voting(app, training, training_id, users, training_type)
 
     keyboard = InlineKeyboardMarkup([
         [
-            InlineKeyboardButton("✅ Так", callback_data=f"vote_yes_{vote_id}"),
-            InlineKeyboardButton("❌ Ні", callback_data=f"vote_no_{vote_id}")
+            InlineKeyboardButton("✅ Так", callback_data=await callback_data("vote", id=vote_id, vote="yes")),
+            InlineKeyboardButton("❌ Ні", callback_data=await callback_data("vote", id=vote_id, vote="no"))
         ]
     ])
 
-    for uid, info in users.items():
-        if training.get("team") in [info.get("team"), "Both"]:
-            try:
-                await app.bot.send_message(
-                    chat_id=int(uid),
-                    text=message,
-                    reply_markup=keyboard
-                )
-            except Exception as e:
-                print(f"❌ {training_type.upper()}: Помилка надсилання до {uid}: {e}")
+    recipients = await audience_index.resolve(training.get("team"))
+    await enqueue(f"vote_open:{vote_id}:{local_today()}", recipients, text=message, reply_markup=keyboard)
 
 
-async def send_voting_reminder(app, training, training_id, users, votes_data, training_type):
+async def send_voting_reminder(app, training, training_id, votes_data, training_type):
     vote_id = generate_training_id(training, training_type)
 
     if training_type == "one-time":
@@ -143,7 +128,7 @@ async def send_voting_reminder(app, training, training_id, users, votes_data, tr
     start_time = f"{training['start_hour']:02d}:{training['start_min']:02d}"
     end_time = f"{training['end_hour']:02d}:{training['end_min']:02d}"
 
-    votes = votes_data.get("votes", {}).get(vote_id, {})
+    votes = votes_data.get(vote_id, {})
     voted_users = set(str(uid) for uid in votes.keys())
 
     # Coach info
@@ -169,44 +154,32 @@ async def send_voting_reminder(app, training, training_id, users, votes_data, tr
 
     keyboard = InlineKeyboardMarkup([
         [
-            InlineKeyboardButton("✅ Так", callback_data=f"vote_yes_{vote_id}"),
-            InlineKeyboardButton("❌ Ні", callback_data=f"vote_no_{vote_id}")
+            InlineKeyboardButton("✅ Так", callback_data=await callback_data("vote", id=vote_id, vote="yes")),
+            InlineKeyboardButton("❌ Ні", callback_data=await callback_data("vote", id=vote_id, vote="no"))
         ]
     ])
-    training_team = training.get("team")
-    for uid, info in users.items():
-        # Надсилаємо нагадування тільки тим, хто ще не проголосував
-        if (training_team in [info.get("team"), "Both"]) and (str(uid) not in voted_users):
-            try:
-                await app.bot.send_message(
-                    chat_id=int(uid),
-                    text=message,
-                    reply_markup=keyboard
-                )
-            except Exception as e:
-                print(f"❌ REMINDER: Помилка надсилання до {uid}: {e}")
-
-
-async def check_game_reminders(app: Application):
-    users = load_data(REGISTRATION_FILE)
-    games = load_data("games", {})
-    game_votes = load_data("game_votes", {"votes": {}})
-    today = datetime.today().date()
-    tomorrow = today + timedelta(days=1)
+    # Надсилаємо нагадування тільки тим, хто ще не проголосував
+    recipients = await audience_index.resolve(training.get("team"), exclude=voted_users)
+    await enqueue(f"vote_reminder:{vote_id}:{local_today()}", recipients, text=message, reply_markup=keyboard)
 
-    for game_id, game in games.items():
-        try:
-            game_date = datetime.strptime(game["date"], "%d.%m.%Y").date()
 
-            if game_date == tomorrow:
-                await send_game_reminder(app, game, game_id, users, game_votes)
+async def games_due_for_reminder():
+    """(game_id, game) for games that are tomorrow."""
+    games = await aload_data("games", {})
+    tomorrow = local_today() + timedelta(days=1)
+    due = []
 
+    for game_id, game in games.items():
+        try:
+            if datetime.strptime(game["date"], "%d.%m.%Y").date() == tomorrow:
+                due.append((game_id, game))
         except Exception as e:
             print(f"❌ Помилка обробки гри {game_id}: {e}")
-            continue
+
+    return due
 
 
-async def send_game_reminder(app, game, game_id, users, game_votes):
+async def send_game_reminder(app, game, game_id, game_votes):
     type_names = {
         "friendly": "Товариська гра",
         "stolichka": "Столична ліга",
@@ -214,7 +187,7 @@ async def send_game_reminder(app, game, game_id, users, game_votes):
     }
 
     type_name = type_names.get(game.get('type'), game.get('type', 'Гра'))
-    votes = game_votes.get("votes", {}).get(game_id, {})
+    votes = game_votes.get(game_id, {})
 
     base_message = (
         f"🏆 Нагадування про гру завтра!\n\n"
@@ -227,19 +200,13 @@ async def send_game_reminder(app, game, game_id, users, game_votes):
 
     keyboard = InlineKeyboardMarkup([
         [
-            InlineKeyboardButton("✅ Буду", callback_data=f"game_vote_yes_{game_id}"),
-            InlineKeyboardButton("❌ Не буду", callback_data=f"game_vote_no_{game_id}")
+            InlineKeyboardButton("✅ Буду", callback_data=await callback_data("game_vote", id=game_id, vote="yes")),
+            InlineKeyboardButton("❌ Не буду", callback_data=await callback_data("game_vote", id=game_id, vote="no"))
         ]
     ])
 
-    for uid, user_info in users.items():
-        # 🔹 Stolichna filter
-        if game.get("type") == "stolichka" and not user_info.get("stolichna", False):
-            continue
-
-        if game.get("team") not in [user_info.get("team"), "Both"]:
-            continue
-
+    messages = []
+    for uid in await audience_index.resolve(game.get("team"), game.get("type")):
         user_vote = votes.get(str(uid))
 
         if user_vote is None:
@@ -253,11 +220,7 @@ async def send_game_reminder(app, game, game_id, users, game_votes):
         else:
             continue
 
-        try:
-            await app.bot.send_message(
-                chat_id=int(uid),
-                text=message,
-                reply_markup=reply_markup
-            )
-        except Exception as e:
-            print(f"❌ GAME REMINDER: Помилка надсилання до {uid}: {e}")
+        messages.append((uid, {"text": message, "reply_markup": reply_markup}))
+
+    # Дата в ключі: після перенесення гри нагадування ставиться в чергу знову
+    await enqueue_many(f"game_reminder:{game_id}:{game['date']}", messages)
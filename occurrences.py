@@ -0,0 +1,128 @@
+import datetime
+import os
+from typing import Dict, List, Optional, Tuple
+
+from clock import local_today
+from data import aload_data, asave_data
+
+# Календар тренувань: кожне разове тренування стоїть у ньому на свою дату, хоч
+# би як далеко вона була, а тижневі розгорнуті в конкретні дати на ковзне вікно. Усе, що питає "коли наступне / вчорашнє /
+# через два дні тренування", робить один запит за діапазоном дат. Календар
+# тримає лише ідентифікатори й час, а саме тренування читається з його колекції.
+OCCURRENCES_FILE = "training_occurrences"
+ONE_TIME_TRAININGS_FILE = "one_time_trainings"
+CONSTANT_TRAININGS_FILE = "constant_trainings"
+TRAINING_FILES = {"one-time": ONE_TIME_TRAININGS_FILE, "constant": CONSTANT_TRAININGS_FILE}
+OCCURRENCE_WINDOW_DAYS = int(os.getenv("OCCURRENCE_WINDOW_DAYS", "28"))
+# Минулий тиждень лишається в календарі для архівації та нарахувань
+OCCURRENCE_HISTORY_DAYS = 7
+
+
+def _vote_id(training: Dict, training_type: str, day: datetime.date) -> str:
+    start = f"{training['start_hour']:02d}:{training['start_min']:02d}"
+    if training_type == "one-time":
+        return f"{day.strftime('%d.%m.%Y')}_{start}"
+    return f"const_{training['weekday']}_{start}"
+
+
+def _occurrence(training_type: str, training_id: str, training: Dict, day: datetime.date) -> Dict:
+    return {
+        "training_type": training_type,
+        "training_id": training_id,
+        "vote_id": _vote_id(training, training_type, day),
+        # ISO dates compare as strings, so range queries work on every backend
+        "day": day.isoformat(),
+        "starts_at": f"{day.isoformat()} {training['start_hour']:02d}:{training['start_min']:02d}",
+        "ends_at": f"{day.isoformat()} {training['end_hour']:02d}:{training['end_min']:02d}",
+    }
+
+
+def materialize(one_time_trainings: Dict[str, Dict], constant_trainings: Dict[str, Dict],
+                start: datetime.date, end: datetime.date) -> Dict[str, Dict]:
+    """occurrence id -> occurrence for every weekly training taking place in
+    [start, end] and every one-time training from start on, however far ahead."""
+    occurrences = {}
+
+    for training_id, training in one_time_trainings.items():
+        try:
+            day = datetime.datetime.strptime(training["date"], "%d.%m.%Y").date()
+            if start <= day:
+                occurrences[f"one-time:{training_id}:{day.isoformat()}"] = \
+                    _occurrence("one-time", training_id, training, day)
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"❌ Не вдалося розгорнути тренування {training_id}: {e}")
+
+    for training_id, training in constant_trainings.items():
+        weekday = training.get("weekday")
+        if weekday is None:
+            continue
+        day = start + datetime.timedelta(days=(weekday - start.weekday()) % 7)
+        while day <= end:
+            occurrences[f"constant:{training_id}:{day.isoformat()}"] = \
+                _occurrence("constant", training_id, training, day)
+            day += datetime.timedelta(days=7)
+
+    return occurrences
+
+
+async def refresh_occurrences(today: Optional[datetime.date] = None) -> None:
+    """Rebuild the calendar window; runs nightly and after a training is added or removed."""
+    today = today or local_today()
+    one_time_trainings = await aload_data(ONE_TIME_TRAININGS_FILE, {})
+    constant_trainings = await aload_data(CONSTANT_TRAININGS_FILE, {})
+    fresh = materialize(one_time_trainings, constant_trainings,
+                        today - datetime.timedelta(days=OCCURRENCE_HISTORY_DAYS),
+                        today + datetime.timedelta(days=OCCURRENCE_WINDOW_DAYS))
+
+    # Через знімок load_data записуються лише змінені та зниклі дати
+    stored = await aload_data(OCCURRENCES_FILE, {})
+    stored.clear()
+    stored.update(fresh)
+    await asave_data(stored, OCCURRENCES_FILE)
+
+
+async def occurrences_between(start: datetime.date, end: Optional[datetime.date],
+                              training_type: Optional[str] = None,
+                              vote_id: Optional[str] = None) -> List[Dict]:
+    """Occurrences in [start, end] ordered by start time, from start on when end
+    is None; training_type and vote_id narrow the result."""
+    query = {"day": {"$gte": start.isoformat()}}
+    if end is not None:
+        query["day"]["$lte"] = end.isoformat()
+    if training_type is not None:
+        query["training_type"] = training_type
+    if vote_id is not None:
+        query["vote_id"] = vote_id
+
+    found = await aload_data(OCCURRENCES_FILE, {}, query=query)
+    return sorted(found.values(), key=lambda occurrence: occurrence["starts_at"])
+
+
+async def next_occurrence(vote_id: str, today: Optional[datetime.date] = None) -> Optional[Dict]:
+    today = today or local_today()
+    upcoming = await occurrences_between(today, today + datetime.timedelta(days=7), vote_id=vote_id)
+    return upcoming[0] if upcoming else None
+
+
+async def with_trainings(occurrences: List[Dict], team: Optional[str] = None) -> List[Tuple[Dict, Dict]]:
+    """(occurrence, training) pairs with the training as it is stored now, reading
+    each training collection once; occurrences of deleted trainings are dropped.
+    team keeps trainings for that team and for both, by the training's current team."""
+    ids = {}
+    for occurrence in occurrences:
+        ids.setdefault(occurrence["training_type"], set()).add(occurrence["training_id"])
+    trainings = {training_type: await aload_data(TRAINING_FILES[training_type], {},
+                                                 query={"_id": {"$in": sorted(training_ids)}})
+                 for training_type, training_ids in ids.items()}
+    pairs = [(occurrence, trainings[occurrence["training_type"]][occurrence["training_id"]])
+             for occurrence in occurrences
+             if occurrence["training_id"] in trainings[occurrence["training_type"]]]
+    if team is None:
+        return pairs
+    # Команда читається з самого тренування: /unlock_training змінює її без перебудови календаря
+    return [(occurrence, training) for occurrence, training in pairs
+            if (training.get("team") or "Both") in (team, "Both")]
+
+
+def occurrence_date(occurrence: Dict) -> datetime.date:
+    return datetime.date.fromisoformat(occurrence["day"])
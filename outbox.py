@@ -0,0 +1,197 @@
+import asyncio
+import datetime
+import os
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from telegram import InlineKeyboardMarkup
+from telegram.error import BadRequest
+
+from broadcast import BROADCAST_CONCURRENCY, DeliveryReport, send_with_retry, is_unreachable, mark_unreachable
+from data import aload_data, afind_and_update, aupdate_document, aupsert_documents, ensure_index
+from leader import Lease, while_leader
+
+# Черга вихідних повідомлень: спершу записуємо в базу, потім воркер надсилає,
+# тож розсилка переживає перезапуск бота і тимчасові помилки Telegram.
+# _id = "<key>:<chat_id>", тому повторна постановка того самого ключа нічого не дублює.
+OUTBOX_FILE = "outbox"
+OUTBOX_LEASE = "outbox"
+
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+DEAD = "dead"
+
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_BASE_DELAY = 10
+OUTBOX_MAX_DELAY = 3600
+OUTBOX_BATCH = 200
+OUTBOX_POLL_SECONDS = 5
+# A message stuck in "sending" this long was claimed by a worker that died
+OUTBOX_SENDING_TIMEOUT = 300
+# Delivered messages are kept this long so the idempotency keys keep working
+OUTBOX_RETENTION_DAYS = 14
+
+_wakeup: Optional[asyncio.Event] = None
+_worker_task: Optional[asyncio.Task] = None
+
+
+def ensure_outbox_indexes():
+    ensure_index(OUTBOX_FILE, [("status", 1), ("next_attempt_at", 1), ("created_at", 1)])
+    ensure_index(OUTBOX_FILE, [("sent_at", 1)], expireAfterSeconds=OUTBOX_RETENTION_DAYS * 86400)
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.utcnow()
+
+
+def _serialize(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    kwargs = dict(kwargs)
+    if kwargs.get("reply_markup") is not None:
+        kwargs["reply_markup"] = kwargs["reply_markup"].to_dict()
+    else:
+        kwargs.pop("reply_markup", None)
+    return kwargs
+
+
+def _deserialize(kwargs: Dict[str, Any], bot) -> Dict[str, Any]:
+    kwargs = dict(kwargs)
+    if kwargs.get("reply_markup") is not None:
+        kwargs["reply_markup"] = InlineKeyboardMarkup.de_json(kwargs["reply_markup"], bot)
+    return kwargs
+
+
+def _is_permanent(error: Exception) -> bool:
+    # Заблокував бота / чат не існує / зламане повідомлення - повтор не допоможе
+    return is_unreachable(error) or isinstance(error, BadRequest)
+
+
+def _backoff(attempts: int) -> datetime.timedelta:
+    return datetime.timedelta(seconds=min(OUTBOX_MAX_DELAY, OUTBOX_BASE_DELAY * 2 ** (attempts - 1)))
+
+
+async def enqueue_many(key: str, messages: Iterable[Tuple[Any, Dict[str, Any]]]) -> int:
+    """Queue (chat_id, send_message kwargs) pairs under an idempotency key.
+    Returns how many messages were handed to the queue."""
+    now = _utcnow()
+    updates = []
+    for chat_id, kwargs in messages:
+        updates.append(({"_id": f"{key}:{chat_id}"}, {"$setOnInsert": {
+            "key": key,
+            "chat_id": str(chat_id),
+            "kwargs": _serialize(kwargs),
+            "status": PENDING,
+            "attempts": 0,
+            "created_at": now,
+            "next_attempt_at": now,
+        }}))
+
+    if updates:
+        await aupsert_documents(OUTBOX_FILE, updates)
+        if _wakeup is not None:
+            _wakeup.set()
+    return len(updates)
+
+
+async def enqueue(key: str, chat_ids: Iterable[Any], **kwargs) -> int:
+    """Queue the same message (send_message kwargs) for every chat."""
+    return await enqueue_many(key, ((chat_id, kwargs) for chat_id in chat_ids))
+
+
+async def _record_failure(message_id: str, message: Dict, error: Exception, report: DeliveryReport) -> None:
+    attempts = message.get("attempts", 0) + 1
+    if is_unreachable(error):
+        await mark_unreachable(message["chat_id"], error)
+        report.unreachable.append(message["chat_id"])
+    if _is_permanent(error) or attempts >= OUTBOX_MAX_ATTEMPTS:
+        report.failed[message["chat_id"]] = str(error)
+        print(f"❌ OUTBOX: {message_id} не доставлено після {attempts} спроб: {error}")
+        update = {"$set": {"status": DEAD, "attempts": attempts, "last_error": str(error), "failed_at": _utcnow()}}
+    else:
+        report.deferred += 1
+        update = {"$set": {"status": PENDING, "attempts": attempts, "last_error": str(error),
+                           "next_attempt_at": _utcnow() + _backoff(attempts)}}
+    await aupdate_document(OUTBOX_FILE, message_id, update)
+
+
+async def _deliver(bot, message_id: str, semaphore: asyncio.Semaphore, report: DeliveryReport) -> None:
+    async with semaphore:
+        # Забираємо повідомлення собі, щоб інший воркер не надіслав його вдруге
+        message = await afind_and_update(
+            OUTBOX_FILE,
+            {"_id": message_id, "status": PENDING},
+            {"$set": {"status": SENDING, "claimed_at": _utcnow()}}
+        )
+        if message is None:
+            report.skipped += 1
+            return
+
+        try:
+            report.retries += await send_with_retry(bot, message["chat_id"], _deserialize(message["kwargs"], bot))
+        except Exception as e:
+            await _record_failure(message_id, message, e, report)
+            return
+
+        await aupdate_document(OUTBOX_FILE, message_id, {"$set": {"status": SENT, "sent_at": _utcnow()}})
+        report.sent.append(message["chat_id"])
+
+
+async def requeue_stale() -> int:
+    stale = await aload_data(OUTBOX_FILE, {}, query={
+        "status": SENDING,
+        "claimed_at": {"$lt": _utcnow() - datetime.timedelta(seconds=OUTBOX_SENDING_TIMEOUT)}
+    })
+    for message_id in stale:
+        await afind_and_update(OUTBOX_FILE, {"_id": message_id, "status": SENDING},
+                               {"$set": {"status": PENDING, "next_attempt_at": _utcnow()}})
+    if stale:
+        print(f"⚠️ OUTBOX: повернуто в чергу {len(stale)} незавершених повідомлень")
+    return len(stale)
+
+
+async def drain(bot) -> DeliveryReport:
+    """Send every message that is due, up to OUTBOX_BATCH; returns the batch's delivery report."""
+    due = await aload_data(OUTBOX_FILE, {}, query={"status": PENDING, "next_attempt_at": {"$lte": _utcnow()}},
+                           sort=[("created_at", 1)], limit=OUTBOX_BATCH)
+    report = DeliveryReport()
+    started = time.monotonic()
+
+    semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+    await asyncio.gather(*(_deliver(bot, message_id, semaphore, report) for message_id in due))
+    report.elapsed = time.monotonic() - started
+    if report.total:
+        print(f"📤 OUTBOX: {report}")
+    return report
+
+
+async def run_worker(bot) -> None:
+    global _wakeup
+    _wakeup = asyncio.Event()
+    await requeue_stale()
+
+    while True:
+        try:
+            report = await drain(bot)
+            if report.total + report.skipped == OUTBOX_BATCH:
+                continue
+            await requeue_stale()
+        except Exception as e:
+            print(f"❌ OUTBOX: помилка воркера: {e}")
+
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=OUTBOX_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+
+
+async def start_worker(app) -> None:
+    global _worker_task
+    # Одна репліка розсилає, щоб разом не перевищити ліміт Telegram
+    _worker_task = asyncio.create_task(while_leader(Lease(OUTBOX_LEASE), lambda: run_worker(app.bot)))
+
+
+async def stop_worker(app) -> None:
+    if _worker_task is not None:
+        _worker_task.cancel()
+        await asyncio.gather(_worker_task, return_exceptions=True)
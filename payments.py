@@ -1,9 +1,16 @@
+import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, filters, CallbackQueryHandler, \
     CommandHandler
 from training_archive import archive_training_after_charge
-from data import load_data, save_data,log_command_usage
+from data import aload_data, asave_data, log_command_usage
+from vote_store import load_votes
+from payments_repository import get_unpaid_by_user, get_payments_by_training, get_outstanding_groups, \
+    is_fully_paid, mark_paid, payment_key, save_payments
 from validation import ADMIN_IDS, is_authorized
+from outbox import enqueue_many
+from callbacks import callback_data, register_callback
+from clock import local_today
 
 CHARGE_SELECT_TRAINING, CHARGE_ENTER_AMOUNT, CHARGE_ENTER_CARD = range(100, 103)
 CARD_NUMBER = "5457 0825 2151 6794"
@@ -16,8 +23,8 @@ async def charge_all(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         await update.message.reply_text("⛔ У вас немає прав для цієї команди.")
         return ConversationHandler.END
 
-    one_time_trainings = load_data("one_time_trainings", {})
-    constant_trainings = load_data("constant_trainings", {})
+    one_time_trainings = await aload_data("one_time_trainings", {})
+    constant_trainings = await aload_data("constant_trainings", {})
 
     options = []
     for tid, t in one_time_trainings.items():
@@ -115,7 +122,7 @@ async def handle_charge_card_input(update: Update, context: ContextTypes.DEFAULT
 
     # Load training
     trainings_file = "one_time_trainings" if ttype == "one_time" else "constant_trainings"
-    trainings = load_data(trainings_file, {})
+    trainings = await aload_data(trainings_file, {})
     training = trainings.get(tid)
     if not training:
         await update.message.reply_text("⚠️ Тренування не знайдено.")
@@ -130,12 +137,11 @@ async def handle_charge_card_input(update: Update, context: ContextTypes.DEFAULT
         training_datetime = label  # already like "Понеділок о 19:00"
 
     # Get voters
-    votes = load_data("votes", {"votes": {}}).get("votes", {})
-    if training_id not in votes or not votes[training_id]:
+    voters = await load_votes("votes", training_id)
+    if not voters:
         await update.message.reply_text("Ніхто не голосував за це тренування.")
         return ConversationHandler.END
 
-    voters = votes[training_id]
     yes_voters = [uid for uid, v in voters.items() if v.get("vote") == "yes"]
     if not yes_voters:
         await update.message.reply_text("Ніхто не проголосував 'так' за це тренування.")
@@ -143,13 +149,12 @@ async def handle_charge_card_input(update: Update, context: ContextTypes.DEFAULT
 
     per_person = round(amount / len(yes_voters))
 
-    payments = load_data("payments", {})
-    success_count = 0
+    payments = {}
+    messages = []
 
     # Create & send payments
     for uid in yes_voters:
-        payment_key = f"{training_id}_{uid}"
-        payments[payment_key] = {
+        payments[payment_key(training_id, uid)] = {
             "user_id": uid,
             "training_id": training_id,
             "amount": per_person,
@@ -159,31 +164,29 @@ async def handle_charge_card_input(update: Update, context: ContextTypes.DEFAULT
             "paid": False
         }
 
-        keyboard = [[InlineKeyboardButton("✅ Я оплатив(ла)", callback_data=f"paid_yes_{training_id}_{uid}")]]
-        try:
-            await context.bot.send_message(
-                chat_id=int(uid),
-                text=(f"💳 Ти відвідав(-ла) тренування {training_datetime}.\n"
-                      f"Сума до сплати: {per_person} грн\n"
-                      f"Карта для оплати: `{card}`\n\n"
-                      f"Натисни кнопку нижче, коли оплатиш:"),
-                reply_markup=InlineKeyboardMarkup(keyboard),
-                parse_mode='Markdown'
-            )
-            success_count += 1
-        except Exception as e:
-            print(f"❌ Помилка надсилання повідомлення для {uid}: {e}")
-
-    save_data(payments, "payments")
+        paid = await callback_data("paid", training_id=training_id, user_id=uid)
+        keyboard = [[InlineKeyboardButton("✅ Я оплатив(ла)", callback_data=paid)]]
+        messages.append((uid, {
+            "text": (f"💳 Ти відвідав(-ла) тренування {training_datetime}.\n"
+                     f"Сума до сплати: {per_person} грн\n"
+                     f"Карта для оплати: `{card}`\n\n"
+                     f"Натисни кнопку нижче, коли оплатиш:"),
+            "reply_markup": InlineKeyboardMarkup(keyboard),
+            "parse_mode": 'Markdown'
+        }))
+
+    await save_payments(payments)
+    # Постійні тренування мають той самий id щотижня, тому ключ містить дату
+    queued = await enqueue_many(f"payment:{training_id}:{local_today()}", messages)
 
     # Update training status and close voting flag
     trainings[tid]["status"] = "charged"
     trainings[tid]["voting_opened"] = False
-    save_data(trainings, trainings_file)
+    await asave_data(trainings, trainings_file)
 
     # Archive after charge (existing logic preserved)
     try:
-        archive_success = archive_training_after_charge(training_id, ttype)
+        archive_success = await archive_training_after_charge(training_id, ttype)
         if archive_success:
             print(f"✅ Training {training_id} archived successfully")
         else:
@@ -197,7 +200,7 @@ async def handle_charge_card_input(update: Update, context: ContextTypes.DEFAULT
         f"👥 Учасників: {len(yes_voters)}\n"
         f"💵 По {per_person} грн з особи\n"
         f"💳 Картка: {card}\n"
-        f"📤 Повідомлення надіслано {success_count} учасникам"
+        f"📤 Повідомлення поставлено в чергу для {queued} учасників"
     )
 
     return ConversationHandler.END
@@ -205,12 +208,12 @@ async def handle_charge_card_input(update: Update, context: ContextTypes.DEFAULT
 
 
 async def handle_payment_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Legacy paid_yes_<training_id>_<user_id> buttons sent before callback tokens."""
     query = update.callback_query
-    await query.answer()
-
     data = query.data or ""
     PREFIX = "paid_yes_"
     if not data.startswith(PREFIX):
+        await query.answer()
         await query.edit_message_text("⚠️ Некоректні дані підтвердження.")
         return
 
@@ -221,46 +224,48 @@ async def handle_payment_confirmation(update: Update, context: ContextTypes.DEFA
     payload = data[len(PREFIX):]
 
     if "_" not in payload:
+        await query.answer()
         await query.edit_message_text("⚠️ Некоректні дані підтвердження.")
         return
 
     # Always split from the right: everything before last "_" is training_id; last piece is user_id
     training_id, user_id = payload.rsplit("_", 1)
-    is_game = training_id.startswith("game_")
+    await handle_paid(update, context, {"training_id": training_id, "user_id": user_id})
 
-    payments = load_data("payments", {})
-    key = f"{training_id}_{user_id}"
 
-    rec = payments.get(key)
+async def handle_paid(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    query = update.callback_query
+    await query.answer()
+
+    training_id, user_id = payload["training_id"], payload["user_id"]
+    is_game = training_id.startswith("game_")
+
+    # Mark as paid
+    rec = await mark_paid(payment_key(training_id, user_id))
     if not rec:
         # Defensive fallback if someone saved numeric user ids in a different type
-        alt_key = f"{training_id}_{str(int(user_id))}" if user_id.isdigit() else None
-        rec = payments.get(alt_key) if alt_key else None
+        alt_key = payment_key(training_id, str(int(user_id))) if user_id.isdigit() else None
+        rec = await mark_paid(alt_key) if alt_key else None
         if not rec:
             await query.edit_message_text(
                 "⚠️ Помилка: запис про платіж не знайдено. Використай команду /pay_debt для підтвердження."
             )
             return
-        key = alt_key
-
-    # Mark as paid
-    rec["paid"] = True
-    save_data(payments, "payments")
 
     debt_type = "гру" if is_game else "тренування"
     await query.edit_message_text(f"✅ Дякуємо! Оплату за {debt_type} зареєстровано.")
 
     # Check if everyone paid within this group (by training_id)
     group_id = rec.get("training_id", training_id)
-    all_paid = all(p.get("paid") for p in payments.values() if p.get("training_id") == group_id)
+    all_paid = await is_fully_paid(group_id)
 
     if is_game:
         if all_paid:
-            games = load_data("games", {})
+            games = await aload_data("games", {})
             game_id = group_id[len("game_"):]  # strip "game_"
             if game_id in games:
                 games[game_id]["payment_status"] = "collected"
-                save_data(games, "games")
+                await asave_data(games, "games")
                 for admin in ADMIN_IDS:
                     try:
                         await context.bot.send_message(
@@ -271,8 +276,8 @@ async def handle_payment_confirmation(update: Update, context: ContextTypes.DEFA
                         print(f"❌ Не вдалося надіслати повідомлення адміну {admin}: {e}")
     else:
         if all_paid:
-            one_time_trainings = load_data("one_time_trainings", {})
-            constant_trainings = load_data("constant_trainings", {})
+            one_time_trainings = await aload_data("one_time_trainings", {})
+            constant_trainings = await aload_data("constant_trainings", {})
             for bucket in (one_time_trainings, constant_trainings):
                 for tid, tr in bucket.items():
                     tr_id = (
@@ -282,7 +287,7 @@ async def handle_payment_confirmation(update: Update, context: ContextTypes.DEFA
                     )
                     if tr_id == group_id:
                         tr["status"] = "collected"
-                        save_data(bucket, "one_time_trainings" if "date" in tr else "constant_trainings")
+                        await asave_data(bucket, "one_time_trainings" if "date" in tr else "constant_trainings")
                         for admin in ADMIN_IDS:
                             try:
                                 await context.bot.send_message(
@@ -307,10 +312,8 @@ async def cancel_charge(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
 async def pay_debt(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_id = str(update.message.from_user.id)
     log_command_usage(user_id, "/pay_debt")
-    payments = load_data("payments", {})
-
     # both trainings and games
-    user_debts = [p for p in payments.values() if p["user_id"] == user_id and not p.get("paid", False)]
+    user_debts = await get_unpaid_by_user(user_id)
 
     if not user_debts:
         await update.message.reply_text("🎉 У тебе немає неоплачених тренувань чи ігор!")
@@ -372,25 +375,19 @@ async def handle_pay_debt_confirmation(update: Update, context: ContextTypes.DEF
         await query.edit_message_text("⚠️ Помилка: тренування не знайдено.")
         return
 
-    payments = load_data("payments", {})
-    key = f"{selected['training_id']}_{selected['user_id']}"
-
-    if key not in payments:
+    if not await mark_paid(payment_key(selected['training_id'], selected['user_id'])):
         await query.edit_message_text("⚠️ Помилка: запис про платіж не знайдено.")
         return
 
-    payments[key]["paid"] = True
-    save_data(payments, "payments")
     await query.edit_message_text("✅ Дякуємо! Оплату зареєстровано.")
 
     # Optional: Check if all paid -> notify admins
     training_id = selected["training_id"]
-    all_paid = all(p["paid"] for p in payments.values() if p["training_id"] == training_id)
+    all_paid = await is_fully_paid(training_id)
     if all_paid:
         from validation import ADMIN_IDS
-        from trainings import load_data as load_trainings, save_data as save_trainings
-        one_time = load_trainings("one_time_trainings")
-        constant = load_trainings("constant_trainings")
+        one_time = await aload_data("one_time_trainings")
+        constant = await aload_data("constant_trainings")
         for t in (one_time, constant):
             for tid, tr in t.items():
                 tr_id = (
@@ -400,7 +397,7 @@ async def handle_pay_debt_confirmation(update: Update, context: ContextTypes.DEF
                 )
                 if tr_id == training_id:
                     tr["status"] = "collected"
-                    save_trainings(t, "one_time_trainings" if "date" in tr else "constant_trainings")
+                    await asave_data(t, "one_time_trainings" if "date" in tr else "constant_trainings")
                     for admin in ADMIN_IDS:
                         try:
                             await context.bot.send_message(
@@ -419,22 +416,10 @@ async def view_payments(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         await update.message.reply_text("⛔ У вас немає доступу до перегляду платежів.")
         return
 
-    payments = load_data("payments", {})
-    if not payments:
-        await update.message.reply_text("Немає записаних платежів.")
-        return
-
-    # build labels only for groups with at least one unpaid
-    by_tid = {}
-    for p in payments.values():
-        tid = p["training_id"]
-        if tid not in by_tid:
-            by_tid[tid] = {"any_unpaid": False, "label": f"{'[Гра]' if tid.startswith('game_') else '[Тренування]'} {p['training_datetime']}"}
-        if not p.get("paid"):
-            by_tid[tid]["any_unpaid"] = True
-
-    # filter out fully paid (collected)
-    filtered = [(tid, info["label"]) for tid, info in by_tid.items() if info["any_unpaid"]]
+    # only groups with at least one unpaid
+    groups = await get_outstanding_groups()
+    filtered = [(tid, f"{'[Гра]' if tid.startswith('game_') else '[Тренування]'} {training_datetime}")
+                for tid, training_datetime in groups.items()]
 
     if not filtered:
         await update.message.reply_text("🎉 Усі платежі зібрані — немає боржників.")
@@ -464,15 +449,16 @@ async def handle_view_payment_selection(update: Update, context: ContextTypes.DE
         return
 
     training_id = keys[idx]
-    payments = load_data("payments", {})
-    users = load_data("users", {})
+    payments = await get_payments_by_training(training_id)
+    if not payments:
+        await query.edit_message_text("⚠️ Помилка: не знайдено.")
+        return
+    users = await aload_data("users", {})
 
     paid = []
     unpaid = []
 
-    for p in payments.values():
-        if p["training_id"] != training_id:
-            continue
+    for p in payments:
         name = users.get(p["user_id"], {}).get("name", p["user_id"])
         if p.get("paid"):
             paid.append(name)
@@ -481,7 +467,7 @@ async def handle_view_payment_selection(update: Update, context: ContextTypes.DE
 
     debt_type = "гра" if training_id.startswith("game_") else "тренування"
 
-    message = f"💰 Платежі за {debt_type} {payments[next(k for k in payments if payments[k]['training_id'] == training_id)]['training_datetime']}:\n\n"
+    message = f"💰 Платежі за {debt_type} {payments[0]['training_datetime']}:\n\n"
     message += f"✅ Оплатили:\n{chr(10).join(paid) if paid else 'Ніхто'}\n\n"
     message += f"❌ Не оплатили:\n{chr(10).join(unpaid) if unpaid else 'Немає боржників'}"
 
@@ -511,6 +497,7 @@ def setup_payment_handlers(app):
     app.add_handler(CommandHandler("view_payments", view_payments))
 
     # Other
+    register_callback("paid", handle_paid)
     app.add_handler(CallbackQueryHandler(handle_payment_confirmation, pattern=r"^paid_yes_.*"))
     app.add_handler(CallbackQueryHandler(handle_pay_debt_selection, pattern=r"^paydebt_select_\d+$"))
     app.add_handler(CallbackQueryHandler(handle_pay_debt_confirmation, pattern=r"^paydebt_confirm_yes$"))
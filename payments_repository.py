@@ -0,0 +1,55 @@
+from typing import Dict, List, Optional
+
+from data import aload_data, aload_document, afind_and_update, asave_documents, acount_documents, ensure_index
+
+PAYMENTS_FILE = "payments"
+UNPAID = {"$ne": True}
+
+
+def ensure_payment_indexes():
+    ensure_index(PAYMENTS_FILE, [("user_id", 1), ("paid", 1)])
+    ensure_index(PAYMENTS_FILE, [("training_id", 1), ("paid", 1)])
+    ensure_index(PAYMENTS_FILE, [("paid", 1)])
+
+
+def payment_key(training_id: str, user_id: str) -> str:
+    return f"{training_id}_{user_id}"
+
+
+async def get_payment(key: str) -> Optional[Dict]:
+    return await aload_document(PAYMENTS_FILE, key)
+
+
+async def get_unpaid_by_user(user_id: str) -> List[Dict]:
+    payments = await aload_data(PAYMENTS_FILE, {}, query={"user_id": user_id, "paid": UNPAID})
+    return list(payments.values())
+
+
+async def get_unpaid() -> List[Dict]:
+    payments = await aload_data(PAYMENTS_FILE, {}, query={"paid": UNPAID})
+    return list(payments.values())
+
+
+async def get_payments_by_training(training_id: str) -> List[Dict]:
+    payments = await aload_data(PAYMENTS_FILE, {}, query={"training_id": training_id})
+    return list(payments.values())
+
+
+async def get_outstanding_groups() -> Dict[str, str]:
+    # training_id -> training_datetime для кожного нарахування, де ще є боржники
+    groups = {}
+    for p in await get_unpaid():
+        groups.setdefault(p["training_id"], p["training_datetime"])
+    return groups
+
+
+async def is_fully_paid(training_id: str) -> bool:
+    return await acount_documents(PAYMENTS_FILE, {"training_id": training_id, "paid": UNPAID}) == 0
+
+
+async def mark_paid(key: str) -> Optional[Dict]:
+    return await afind_and_update(PAYMENTS_FILE, {"_id": key}, {"$set": {"paid": True}})
+
+
+async def save_payments(payments: Dict[str, Dict]) -> None:
+    await asave_documents(PAYMENTS_FILE, payments)
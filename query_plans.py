@@ -0,0 +1,58 @@
+import datetime
+
+from data import db
+from indexes import ensure_indexes
+
+# Запускати проти локальної копії бази (MONGO_URI=mongodb://localhost:27017):
+# для кожного запиту бота друкує план виконання, щоб було видно, де ще COLLSCAN.
+SAMPLE_USER_ID = "786580423"
+SAMPLE_TRAINING_ID = "01.01.2025_19:00"
+SAMPLE_NOW = datetime.datetime(2025, 1, 1, 19, 0)
+
+QUERY_SHAPES = [
+    ("load_data users", "users", {}),
+    ("users by team", "users", {"team": "Male"}),
+    ("open one-time trainings", "one_time_trainings", {"voting_opened": True}),
+    ("open constant trainings", "constant_trainings", {"voting_opened": True}),
+    ("not charged trainings", "one_time_trainings", {"status": "not charged"}),
+    ("games by team", "games", {"team": "Male"}),
+    ("active general votes", "general", {"is_active": True}),
+    ("training votes", "votes", {"_id": SAMPLE_TRAINING_ID}),
+    ("game votes", "game_votes", {"_id": "game_1"}),
+    ("general vote responses", "general_votes", {"_id": "1"}),
+    ("unpaid by user", "payments", {"user_id": SAMPLE_USER_ID, "paid": {"$ne": True}}),
+    ("payments by training", "payments", {"training_id": SAMPLE_TRAINING_ID}),
+    ("unpaid in training", "payments", {"training_id": SAMPLE_TRAINING_ID, "paid": {"$ne": True}}),
+    ("all unpaid", "payments", {"paid": {"$ne": True}}),
+    ("training calendar range", "training_occurrences",
+     {"day": {"$gte": "2025-01-01", "$lte": "2025-01-08"}, "team": {"$in": ["Male", "Both"]}}),
+    ("archive by training", "training_votes_archive", {"training_id": SAMPLE_TRAINING_ID}),
+    ("command usage", "commands", {"_id": "/vote"}),
+    ("hourly command usage", "commands_hourly", {"command": "/vote"}),
+    ("due outbox messages", "outbox", {"status": "pending", "next_attempt_at": {"$lte": SAMPLE_NOW}}),
+]
+
+
+def plan_stages(plan):
+    stages = [plan.get("stage")]
+    if "inputStage" in plan:
+        stages += plan_stages(plan["inputStage"])
+    for stage in plan.get("inputStages", []):
+        stages += plan_stages(stage)
+    return stages
+
+
+def print_query_plans():
+    for label, collection_name, query in QUERY_SHAPES:
+        explain = db[collection_name].find(query).explain()
+        stages = plan_stages(explain["queryPlanner"]["winningPlan"])
+        stats = explain.get("executionStats", {})
+        marker = "⚠️" if "COLLSCAN" in stages else "✅"
+        print(f"{marker} {label}: {collection_name}.find({query})")
+        print(f"   plan: {' <- '.join(s for s in stages if s)}, "
+              f"examined {stats.get('totalDocsExamined', '?')} docs, returned {stats.get('nReturned', '?')}")
+
+
+if __name__ == "__main__":
+    ensure_indexes()
+    print_query_plans()
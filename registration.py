@@ -5,7 +5,9 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, MessageHandler, CallbackQueryHandler, \
     filters
 from dataclasses import dataclass
-from data import load_data, save_data, log_command_usage
+from data import aload_data, asave_data, log_command_usage
+from broadcast import mark_reachable
+from audience import audience_index
 
 
 class RegistrationState(Enum):
@@ -75,8 +77,8 @@ class RegistrationManager:
         self.registration_file = registration_file
         self.message_handler = MessageHandlers()
 
-    def load_user_profile(self, user_id: str) -> Optional[UserProfile]:
-        user_data = load_data(self.registration_file)
+    async def load_user_profile(self, user_id: str) -> Optional[UserProfile]:
+        user_data = await aload_data(self.registration_file)
         if user_id in user_data:
             data = user_data[user_id]
             team = Team(data.get("team")) if data.get("team") else None
@@ -95,15 +97,18 @@ class RegistrationManager:
             )
         return None
 
-    def save_user_profile(self, profile: UserProfile) -> None:
-        user_data = load_data(self.registration_file)
+    async def save_user_profile(self, profile: UserProfile) -> None:
+        user_data = await aload_data(self.registration_file)
         user_data[profile.telegram_id] = profile.to_dict()
-        save_data(user_data, self.registration_file)
+        await asave_data(user_data, self.registration_file)
+        audience_index.update_user(profile.telegram_id, user_data[profile.telegram_id])
 
     async def handle_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         user = update.message.from_user
         log_command_usage(str(user.id), "/start")
-        profile = self.load_user_profile(str(user.id))
+        # Користувач знову пише боту - повертаємо його в розсилки
+        await mark_reachable(user.id)
+        profile = await self.load_user_profile(str(user.id))
 
         if profile and profile.is_registered():
             await update.message.reply_text(
@@ -114,20 +119,20 @@ class RegistrationManager:
             telegram_id=str(user.id),
             telegram_username=user.username
         )
-        self.save_user_profile(profile)
+        await self.save_user_profile(profile)
 
         await update.message.reply_text(Messages.WELCOME)
         return RegistrationState.NAME.value
 
     async def handle_name(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         user_id = str(update.message.from_user.id)
-        profile = self.load_user_profile(user_id)
+        profile = await self.load_user_profile(user_id)
 
         if not profile:
             return ConversationHandler.END
 
         profile.name = update.message.text
-        self.save_user_profile(profile)
+        await self.save_user_profile(profile)
 
         await update.message.reply_text(
             Messages.TEAM_SELECTION,
@@ -140,13 +145,13 @@ class RegistrationManager:
         await query.answer()
 
         user_id = str(query.from_user.id)
-        profile = self.load_user_profile(user_id)
+        profile = await self.load_user_profile(user_id)
 
         if not profile:
             return ConversationHandler.END
 
         profile.team = Team.MALE if query.data == "team_male" else Team.FEMALE
-        self.save_user_profile(profile)
+        await self.save_user_profile(profile)
 
         await query.edit_message_text(Messages.REGISTRATION_COMPLETE)
         return ConversationHandler.END
@@ -0,0 +1,43 @@
+from data import db
+from vote_store import COUNT_FIELDS, count_votes
+
+VOTE_COLLECTIONS = ["votes", "game_votes", "general_votes"]
+TRAINING_VOTES_COLLECTION = "votes"
+LEGACY_DOC_ID = "votes"
+
+
+def split_votes(collection_name):
+    collection = db[collection_name]
+    legacy = collection.find_one({"_id": LEGACY_DOC_ID})
+    if legacy is None:
+        print(f"{collection_name}: nothing to migrate")
+        return
+
+    legacy.pop("_id")
+    for vote_id, votes in legacy.items():
+        existing = collection.find_one({"_id": vote_id}) or {}
+        existing_votes = existing.get("votes", {})
+
+        # Голоси, подані вже після переходу на нову схему, не перезаписуємо
+        missing = {f"votes.{uid}": vote for uid, vote in votes.items() if uid not in existing_votes}
+        if missing:
+            collection.update_one({"_id": vote_id}, {"$set": missing}, upsert=True)
+
+    collection.delete_one({"_id": LEGACY_DOC_ID})
+    print(f"{collection_name}: split {len(legacy)} votes into separate documents")
+
+
+def backfill_vote_counts():
+    collection = db[TRAINING_VOTES_COLLECTION]
+    missing = {"$or": [{field: {"$exists": False}} for field in COUNT_FIELDS]}
+    for doc in collection.find(missing):
+        # Обидва лічильники рахуються з тих самих голосів і пишуться одним оновленням
+        collection.update_one({"_id": doc["_id"], **missing},
+                              {"$set": count_votes(doc.get("votes", {}))})
+    print("yes_count and no_count added to all training votes")
+
+
+if __name__ == "__main__":
+    for name in VOTE_COLLECTIONS:
+        split_votes(name)
+    backfill_vote_counts()
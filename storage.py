@@ -0,0 +1,414 @@
+import copy
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import MongoClient, ReplaceOne, DeleteOne, UpdateOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+_MISSING = object()
+
+
+class Storage:
+    """Document store behind data.py. Queries and updates use the subset of the
+    Mongo syntax the bot needs, so every backend accepts the same arguments."""
+
+    def find(self, collection_name: str, query: Optional[Dict] = None, projection: Optional[Dict] = None,
+             sort: Optional[List[Tuple[str, int]]] = None, limit: Optional[int] = None) -> List[Dict]:
+        """sort is a list of (field, 1 | -1) like pymongo's; limit 0 or None means no limit."""
+        raise NotImplementedError
+
+    def find_one(self, collection_name: str, query: Dict) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def write(self, collection_name: str, upserts: Dict[str, Dict], deletes: Iterable[str] = ()) -> None:
+        """Replace (or insert) documents by _id and delete the given ids."""
+        raise NotImplementedError
+
+    def update_one(self, collection_name: str, query: Dict, update: Dict, upsert: bool = False) -> None:
+        raise NotImplementedError
+
+    def upsert_many(self, collection_name: str, updates: List[Tuple[Dict, Dict]]) -> None:
+        raise NotImplementedError
+
+    def find_one_and_update(self, collection_name: str, query: Dict, update: Dict,
+                            upsert: bool = False) -> Optional[Dict]:
+        """Return the document after the update, or None when nothing matched
+        (including an upsert that collided with an existing _id)."""
+        raise NotImplementedError
+
+    def delete_one(self, collection_name: str, query: Dict) -> None:
+        raise NotImplementedError
+
+    def count(self, collection_name: str, query: Dict) -> int:
+        raise NotImplementedError
+
+    def create_index(self, collection_name: str, keys, **kwargs) -> None:
+        raise NotImplementedError
+
+
+class MongoStorage(Storage):
+    def __init__(self, uri: Optional[str], db_name: str = "TelegramBot"):
+        self.client = MongoClient(uri)
+        self.db = self.client[db_name]
+
+    def find(self, collection_name, query=None, projection=None, sort=None, limit=None):
+        cursor = self.db[collection_name].find(query or {}, projection)
+        if sort:
+            cursor = cursor.sort(sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        return list(cursor)
+
+    def find_one(self, collection_name, query):
+        return self.db[collection_name].find_one(query)
+
+    def write(self, collection_name, upserts, deletes=()):
+        operations = [ReplaceOne({'_id': key}, {**document, '_id': key}, upsert=True)
+                      for key, document in upserts.items()]
+        operations += [DeleteOne({'_id': key}) for key in deletes]
+        if operations:
+            self.db[collection_name].bulk_write(operations, ordered=False)
+
+    def update_one(self, collection_name, query, update, upsert=False):
+        self.db[collection_name].update_one(query, update, upsert=upsert)
+
+    def upsert_many(self, collection_name, updates):
+        if updates:
+            self.db[collection_name].bulk_write(
+                [UpdateOne(query, update, upsert=True) for query, update in updates], ordered=False
+            )
+
+    def find_one_and_update(self, collection_name, query, update, upsert=False):
+        try:
+            return self.db[collection_name].find_one_and_update(
+                query, update, upsert=upsert, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # upsert hit an existing document that did not match the query
+            return None
+
+    def delete_one(self, collection_name, query):
+        self.db[collection_name].delete_one(query)
+
+    def count(self, collection_name, query):
+        return self.db[collection_name].count_documents(query)
+
+    def create_index(self, collection_name, keys, **kwargs):
+        self.db[collection_name].create_index(keys, **kwargs)
+
+
+class LocalStorage(Storage):
+    """Offline backend: evaluates queries in Python over a whole collection.
+    Subclasses only decide where documents live."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+
+    def _read(self, collection_name: str) -> Dict[str, Dict]:
+        raise NotImplementedError
+
+    def _write(self, collection_name: str, upserts: Dict[str, Dict], deletes: Iterable[str]) -> None:
+        raise NotImplementedError
+
+    def find(self, collection_name, query=None, projection=None, sort=None, limit=None):
+        with self._lock:
+            found = [doc for doc in self._read(collection_name).values() if matches(doc, query or {})]
+            found = sort_documents(found, sort, limit)
+            return [project(copy.deepcopy(doc), projection) for doc in found]
+
+    def find_one(self, collection_name, query):
+        found = self.find(collection_name, query)
+        return found[0] if found else None
+
+    def write(self, collection_name, upserts, deletes=()):
+        with self._lock:
+            self._write(collection_name, {key: {**copy.deepcopy(doc), '_id': key} for key, doc in upserts.items()},
+                        list(deletes))
+
+    def update_one(self, collection_name, query, update, upsert=False):
+        self.find_one_and_update(collection_name, query, update, upsert)
+
+    def upsert_many(self, collection_name, updates):
+        with self._lock:
+            for query, update in updates:
+                self.find_one_and_update(collection_name, query, update, upsert=True)
+
+    def find_one_and_update(self, collection_name, query, update, upsert=False):
+        with self._lock:
+            docs = self._read(collection_name)
+            for doc_id, doc in docs.items():
+                if matches(doc, query):
+                    updated = copy.deepcopy(doc)
+                    apply_update(updated, update)
+                    self._write(collection_name, {doc_id: updated}, [])
+                    return copy.deepcopy(updated)
+
+            if not upsert:
+                return None
+
+            seed = upsert_seed(query)
+            if "_id" in seed and seed["_id"] in docs:
+                return None
+            apply_update(seed, update, inserting=True)
+            seed.setdefault("_id", uuid.uuid4().hex)
+            self._write(collection_name, {seed["_id"]: seed}, [])
+            return copy.deepcopy(seed)
+
+    def delete_one(self, collection_name, query):
+        with self._lock:
+            for doc_id, doc in self._read(collection_name).items():
+                if matches(doc, query):
+                    self._write(collection_name, {}, [doc_id])
+                    return
+
+    def count(self, collection_name, query):
+        with self._lock:
+            return sum(1 for doc in self._read(collection_name).values() if matches(doc, query))
+
+    def create_index(self, collection_name, keys, **kwargs):
+        pass
+
+
+class MemoryStorage(LocalStorage):
+    def __init__(self):
+        super().__init__()
+        self._collections: Dict[str, Dict[str, Dict]] = {}
+
+    def _read(self, collection_name):
+        return self._collections.setdefault(collection_name, {})
+
+    def _write(self, collection_name, upserts, deletes):
+        docs = self._read(collection_name)
+        docs.update(upserts)
+        for key in deletes:
+            docs.pop(key, None)
+
+
+class SQLiteStorage(LocalStorage):
+    def __init__(self, path: str):
+        super().__init__()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._tables = set()
+
+    def _table(self, collection_name):
+        if collection_name not in self._tables:
+            self._conn.execute(f'CREATE TABLE IF NOT EXISTS "{collection_name}" (id TEXT PRIMARY KEY, doc TEXT)')
+            self._tables.add(collection_name)
+        return f'"{collection_name}"'
+
+    def _read(self, collection_name):
+        rows = self._conn.execute(f"SELECT id, doc FROM {self._table(collection_name)}").fetchall()
+        return {doc_id: _decode(doc) for doc_id, doc in rows}
+
+    def _write(self, collection_name, upserts, deletes):
+        table = self._table(collection_name)
+        with self._conn:
+            self._conn.executemany(f"INSERT OR REPLACE INTO {table} (id, doc) VALUES (?, ?)",
+                                   [(str(key), _encode(doc)) for key, doc in upserts.items()])
+            self._conn.executemany(f"DELETE FROM {table} WHERE id = ?", [(str(key),) for key in deletes])
+
+
+def create_storage() -> Storage:
+    backend = os.getenv("STORAGE_BACKEND", "mongo").lower()
+    if backend == "memory":
+        return MemoryStorage()
+    if backend == "sqlite":
+        return SQLiteStorage(os.getenv("SQLITE_PATH", "bot.sqlite3"))
+    return MongoStorage(os.getenv("MONGO_URI"))
+
+
+def _encode(doc: Dict) -> str:
+    def default(value):
+        if isinstance(value, datetime.datetime):
+            return {"$date": value.isoformat()}
+        if isinstance(value, (set, tuple)):
+            return list(value)
+        raise TypeError(f"Cannot store {type(value).__name__}")
+
+    return json.dumps(doc, default=default, ensure_ascii=False)
+
+
+def _decode(raw: str) -> Dict:
+    def object_hook(obj):
+        if len(obj) == 1 and "$date" in obj:
+            return datetime.datetime.fromisoformat(obj["$date"])
+        return obj
+
+    return json.loads(raw, object_hook=object_hook)
+
+
+# --- Mongo query/update subset for the offline backends ---
+
+def _get_path(doc: Any, path: str) -> Any:
+    for part in path.split("."):
+        if isinstance(doc, dict) and part in doc:
+            doc = doc[part]
+        elif isinstance(doc, list) and part.isdigit() and int(part) < len(doc):
+            doc = doc[int(part)]
+        else:
+            return _MISSING
+    return doc
+
+
+def _set_path(doc: Dict, path: str, value: Any) -> None:
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[last] = value
+
+
+def _unset_path(doc: Dict, path: str) -> None:
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(last, None)
+
+
+def _is_operator_dict(value: Any) -> bool:
+    return isinstance(value, dict) and bool(value) and all(key.startswith("$") for key in value)
+
+
+def _equals(value: Any, expected: Any) -> bool:
+    if value is _MISSING:
+        return expected is None
+    if isinstance(value, list) and not isinstance(expected, list):
+        return expected in value
+    return value == expected
+
+
+def _compare(value: Any, expected: Any, op) -> bool:
+    if value is _MISSING or value is None:
+        return False
+    try:
+        return op(value, expected)
+    except TypeError:
+        return False
+
+
+def _match_operators(value: Any, conditions: Dict) -> bool:
+    for op, expected in conditions.items():
+        if op == "$eq":
+            ok = _equals(value, expected)
+        elif op == "$ne":
+            ok = not _equals(value, expected)
+        elif op == "$gt":
+            ok = _compare(value, expected, lambda a, b: a > b)
+        elif op == "$gte":
+            ok = _compare(value, expected, lambda a, b: a >= b)
+        elif op == "$lt":
+            ok = _compare(value, expected, lambda a, b: a < b)
+        elif op == "$lte":
+            ok = _compare(value, expected, lambda a, b: a <= b)
+        elif op == "$in":
+            ok = any(_equals(value, item) for item in expected)
+        elif op == "$nin":
+            ok = not any(_equals(value, item) for item in expected)
+        elif op == "$exists":
+            ok = (value is not _MISSING) == bool(expected)
+        elif op == "$not":
+            ok = not _match_operators(value, expected)
+        else:
+            raise ValueError(f"Unsupported query operator {op}")
+        if not ok:
+            return False
+    return True
+
+
+def matches(doc: Dict, query: Dict) -> bool:
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, sub) for sub in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, sub) for sub in condition):
+                return False
+        elif _is_operator_dict(condition):
+            if not _match_operators(_get_path(doc, key), condition):
+                return False
+        elif not _equals(_get_path(doc, key), condition):
+            return False
+    return True
+
+
+def sort_documents(docs: List[Dict], sort: Optional[List[Tuple[str, int]]] = None,
+                   limit: Optional[int] = None) -> List[Dict]:
+    """Order docs the way Mongo's cursor.sort(sort).limit(limit) would; missing values sort first."""
+    docs = list(docs)
+    for field, direction in reversed(sort or []):
+        docs.sort(key=lambda doc: (_get_path(doc, field) not in (_MISSING, None),
+                                   _sort_value(_get_path(doc, field))),
+                  reverse=direction < 0)
+    return docs[:limit] if limit else docs
+
+
+def _sort_value(value: Any) -> Any:
+    return "" if value is _MISSING or value is None else value
+
+
+def project(doc: Dict, projection: Optional[Dict]) -> Dict:
+    if not projection:
+        return doc
+    fields = [field for field, include in projection.items() if include and field != "_id"]
+    result = {}
+    if projection.get("_id", 1):
+        result["_id"] = doc.get("_id")
+    for field in fields:
+        value = _get_path(doc, field)
+        if value is not _MISSING:
+            _set_path(result, field, value)
+    return result
+
+
+def upsert_seed(query: Dict) -> Dict:
+    seed = {}
+    for key, condition in query.items():
+        if key.startswith("$"):
+            continue
+        if _is_operator_dict(condition):
+            if "$eq" in condition:
+                _set_path(seed, key, copy.deepcopy(condition["$eq"]))
+        else:
+            _set_path(seed, key, copy.deepcopy(condition))
+    return seed
+
+
+def apply_update(doc: Dict, update: Dict, inserting: bool = False) -> None:
+    for op, fields in update.items():
+        if op == "$setOnInsert" and not inserting:
+            continue
+        for path, value in fields.items():
+            current = _get_path(doc, path)
+            if op in ("$set", "$setOnInsert"):
+                _set_path(doc, path, copy.deepcopy(value))
+            elif op == "$unset":
+                _unset_path(doc, path)
+            elif op == "$inc":
+                _set_path(doc, path, (0 if current is _MISSING else current) + value)
+            elif op in ("$push", "$addToSet"):
+                items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                array = [] if current is _MISSING else current
+                for item in items:
+                    if op == "$push" or item not in array:
+                        array.append(copy.deepcopy(item))
+                _set_path(doc, path, array)
+            elif op == "$pull":
+                if current is not _MISSING:
+                    if _is_operator_dict(value):
+                        kept = [item for item in current if not _match_operators(item, value)]
+                    elif isinstance(value, dict):
+                        kept = [item for item in current if not (isinstance(item, dict) and matches(item, value))]
+                    else:
+                        kept = [item for item in current if item != value]
+                    _set_path(doc, path, kept)
+            elif op == "$pop":
+                if current is not _MISSING and current:
+                    current.pop(0 if value == -1 else -1)
+            else:
+                raise ValueError(f"Unsupported update operator {op}")
@@ -0,0 +1,88 @@
+import asyncio
+import os
+from typing import Dict, Optional, Sequence
+
+from telegram.error import BadRequest
+
+from broadcast import limiter
+from data import aload_document, aupdate_document
+from vote_store import waiting_in_order
+from clock import local_now
+
+# Живий підсумок голосування за тренування в адмінському чаті: одне закріплене
+# повідомлення на тренування, яке редагується не частіше ніж раз на
+# TALLY_DEBOUNCE_SECONDS, скільки б голосів не надійшло за цей час.
+# Без TALLY_CHAT_ID функція вимкнена.
+TALLY_CHAT_ID = os.getenv("TALLY_CHAT_ID")
+TALLY_DEBOUNCE_SECONDS = float(os.getenv("TALLY_DEBOUNCE_SECONDS", "5"))
+TALLIES_FILE = "tallies"
+TRAINING_VOTES_FILE = "votes"
+
+_pending: Dict[str, asyncio.Task] = {}
+
+
+def render_tally(label: str, votes: Dict[str, Dict], limit: Optional[int] = None,
+                 waitlist: Sequence[str] = ()) -> str:
+    yes_list = [v.get("name", "?") for v in votes.values() if v.get("vote") == "yes"]
+    no_list = [v.get("name", "?") for v in votes.values() if v.get("vote") == "no"]
+    yes_count = f"{len(yes_list)}/{limit}" if limit else str(len(yes_list))
+
+    message = f"📅 Тренування: {label}\n\n"
+    message += f"✅ Буде ({yes_count}):\n" + ("\n".join(yes_list) if yes_list else "Ніхто") + "\n\n"
+    message += f"❌ Не буде ({len(no_list)}):\n" + ("\n".join(no_list) if no_list else "Ніхто") + "\n\n"
+    waiting = waiting_in_order(votes, waitlist)
+    if waiting:
+        message += f"⏳ У черзі ({len(waiting)}):\n" + "\n".join(v.get("name", "?") for v in waiting) + "\n\n"
+    message += f"🕒 Оновлено {local_now().strftime('%H:%M:%S')}"
+    return message
+
+
+async def _post_tally(bot, vote_id: str, text: str) -> None:
+    message = await bot.send_message(chat_id=int(TALLY_CHAT_ID), text=text)
+    try:
+        await bot.pin_chat_message(chat_id=int(TALLY_CHAT_ID), message_id=message.message_id,
+                                   disable_notification=True)
+    except Exception as e:
+        print(f"⚠️ TALLY: не вдалося закріпити підсумок {vote_id}: {e}")
+    await aupdate_document(TALLIES_FILE, vote_id, {
+        "$set": {"chat_id": str(TALLY_CHAT_ID), "message_id": message.message_id}
+    }, upsert=True)
+
+
+async def update_tally(bot, vote_id: str, label: str, limit: Optional[int] = None) -> None:
+    doc = await aload_document(TRAINING_VOTES_FILE, vote_id, {})
+    text = render_tally(label, doc.get("votes", {}), limit, doc.get("waitlist", []))
+    tally = await aload_document(TALLIES_FILE, vote_id)
+
+    await limiter.wait(str(TALLY_CHAT_ID))
+    if tally is None or tally.get("chat_id") != str(TALLY_CHAT_ID):
+        await _post_tally(bot, vote_id, text)
+        return
+
+    try:
+        await bot.edit_message_text(chat_id=int(TALLY_CHAT_ID), message_id=tally["message_id"], text=text)
+    except BadRequest as e:
+        if "not modified" in str(e).lower():
+            return
+        # Повідомлення видалили - публікуємо нове
+        await _post_tally(bot, vote_id, text)
+
+
+async def _update_later(bot, vote_id: str, label: str, limit: Optional[int]) -> None:
+    try:
+        await asyncio.sleep(TALLY_DEBOUNCE_SECONDS)
+    finally:
+        # Голоси, що прийдуть під час оновлення, заплановують наступне
+        _pending.pop(vote_id, None)
+    try:
+        await update_tally(bot, vote_id, label, limit)
+    except Exception as e:
+        print(f"❌ TALLY: помилка оновлення підсумку {vote_id}: {e}")
+
+
+def schedule_tally_update(bot, vote_id: str, label: str, limit: Optional[int] = None) -> None:
+    """Refresh the training's tally message once the debounce window passes;
+    calls made while an update is already waiting are folded into it."""
+    if not TALLY_CHAT_ID or vote_id in _pending:
+        return
+    _pending[vote_id] = asyncio.create_task(_update_later(bot, vote_id, label, limit))
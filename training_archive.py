@@ -1,7 +1,10 @@
 import datetime
 from typing import Dict, Any
-from data import load_data, save_data
+from data import aload_data, asave_data
+from vote_store import load_votes, delete_votes
 from validation import is_excluded_from_stats
+from occurrences import OCCURRENCE_HISTORY_DAYS, occurrences_between, occurrence_date
+from clock import local_now, local_today
 
 TRAINING_VOTES_ARCHIVE_FILE = "training_votes_archive"
 TRAINING_VOTES_FILE = "votes"
@@ -14,16 +17,16 @@ class TrainingVotesArchiver:
         self.votes_file = TRAINING_VOTES_FILE
         self.users_file = USERS_FILE
 
-    def archive_training_vote(self, training_id: str, training_data: Dict[str, Any],
+    async def archive_training_vote(self, training_id: str, training_data: Dict[str, Any],
                               force_archive: bool = False) -> bool:
         try:
-            votes_data = load_data(self.votes_file, {"votes": {}})
+            votes = await load_votes(self.votes_file, training_id)
 
-            if training_id not in votes_data["votes"]:
+            if not votes:
                 print(f"⚠️ No votes found for training {training_id}")
                 return False
 
-            actual_date = self._get_actual_training_date(training_id, training_data)
+            actual_date = await self._get_actual_training_date(training_id, training_data)
 
             if not force_archive and not self._should_archive_today(training_id, actual_date):
                 print(f"⚠️ Training {training_id} should not be archived today")
@@ -31,22 +34,21 @@ class TrainingVotesArchiver:
             archive_entry = self._create_archive_entry(
                 training_id,
                 training_data,
-                votes_data["votes"][training_id],
+                votes,
                 actual_date
             )
 
-            archive_data = load_data(self.archive_file, {})
+            archive_data = await aload_data(self.archive_file, {})
             archive_id = self._generate_archive_id(archive_data)
             archive_data[archive_id] = archive_entry
-            save_data(archive_data, self.archive_file)
+            await asave_data(archive_data, self.archive_file)
 
-            self._update_user_statistics(
-                votes_data["votes"][training_id],
+            await self._update_user_statistics(
+                votes,
                 training_data.get("team", "Both")
             )
 
-            del votes_data["votes"][training_id]
-            save_data(votes_data, self.votes_file)
+            await delete_votes(self.votes_file, training_id)
 
             print(f"✅ Archived training {training_id} with {len(archive_entry['votes'])} votes")
             return True
@@ -55,24 +57,17 @@ class TrainingVotesArchiver:
             print(f"❌ Error archiving training {training_id}: {e}")
             return False
 
-    def _get_actual_training_date(self, training_id: str, training_data: Dict[str, Any]) -> str:
+    async def _get_actual_training_date(self, training_id: str, training_data: Dict[str, Any]) -> str:
         if training_id.startswith("const_"):
-            today = datetime.datetime.now().date()
-            weekday = training_data.get("weekday")
-
-            if weekday is not None:
-                days_ago = (today.weekday() - weekday) % 7
-                if days_ago == 0:
-                    training_time = datetime.time(
-                        hour=training_data.get("end_hour", 21),
-                        minute=training_data.get("end_min", 0)
-                    )
-                    now = datetime.datetime.now().time()
-                    if now < training_time:
-                        days_ago = 7
-
-                training_date = today - datetime.timedelta(days=days_ago)
-                return training_date.strftime("%d.%m.%Y")
+            now = local_now()
+            today = now.date()
+            # Останнє заняття, яке вже закінчилося
+            past = [occurrence for occurrence in await occurrences_between(
+                        today - datetime.timedelta(days=OCCURRENCE_HISTORY_DAYS), today,
+                        training_type="constant", vote_id=training_id)
+                    if occurrence["ends_at"] <= now.strftime("%Y-%m-%d %H:%M")]
+            if past:
+                return occurrence_date(past[-1]).strftime("%d.%m.%Y")
 
             return today.strftime("%d.%m.%Y")
         else:
@@ -81,7 +76,7 @@ class TrainingVotesArchiver:
     def _should_archive_today(self, training_id: str, actual_date: str) -> bool:
         try:
             training_date = datetime.datetime.strptime(actual_date, "%d.%m.%Y").date()
-            today = datetime.datetime.now().date()
+            today = local_today()
             return training_date < today
         except:
             return False
@@ -105,8 +100,8 @@ class TrainingVotesArchiver:
             return "1"
         return str(max(int(k) for k in archive_data.keys()) + 1)
 
-    def _update_user_statistics(self, votes: Dict[str, Any], training_team: str) -> None:
-        users_data = load_data(self.users_file, {})
+    async def _update_user_statistics(self, votes: Dict[str, Any], training_team: str) -> None:
+        users_data = await aload_data(self.users_file, {})
 
         for user_id, user_data in users_data.items():
             if is_excluded_from_stats(user_id):
@@ -134,7 +129,7 @@ class TrainingVotesArchiver:
             if vote_info.get("vote") == "yes":
                 user_data["training_attendance"]["attended"] += 1
 
-        save_data(users_data, self.users_file)
+        await asave_data(users_data, self.users_file)
 
     def _should_update_user_stats(self, user_team: str, training_team: str) -> bool:
         if training_team == "Both":
@@ -142,13 +137,13 @@ class TrainingVotesArchiver:
         return user_team == training_team
 
 
-def archive_training_after_charge(training_id: str, training_type: str) -> bool:
+async def archive_training_after_charge(training_id: str, training_type: str) -> bool:
     archiver = TrainingVotesArchiver()
 
     if training_type == "one_time":
-        trainings = load_data("one_time_trainings", {})
+        trainings = await aload_data("one_time_trainings", {})
     else:
-        trainings = load_data("constant_trainings", {})
+        trainings = await aload_data("constant_trainings", {})
 
     training_data = None
     for tid, data in trainings.items():
@@ -165,16 +160,16 @@ def archive_training_after_charge(training_id: str, training_type: str) -> bool:
         print(f"❌ Training data not found for {training_id}")
         return False
 
-    return archiver.archive_training_vote(training_id, training_data, force_archive=True)
+    return await archiver.archive_training_vote(training_id, training_data, force_archive=True)
 
 
 async def enhanced_reset_today_constant_trainings_status():
-    now = datetime.datetime.now()
+    now = local_now()
     today = now.date()
 
     archiver = TrainingVotesArchiver()
-    one_time_trainings = load_data("one_time_trainings", {})
-    constant_trainings = load_data("constant_trainings", {})
+    one_time_trainings = await aload_data("one_time_trainings", {})
+    constant_trainings = await aload_data("constant_trainings", {})
     updated = False
 
     for tid, training in one_time_trainings.items():
@@ -186,7 +181,7 @@ async def enhanced_reset_today_constant_trainings_status():
             if training_date < today:
                 training_id = f"{training['date']}_{training['start_hour']:02d}:{training['start_min']:02d}"
 
-                archive_success = archiver.archive_training_vote(training_id, training, force_archive=True)
+                archive_success = await archiver.archive_training_vote(training_id, training, force_archive=True)
                 if archive_success:
                     print(f"✅ Archived one-time training {training_id}")
 
@@ -199,22 +194,19 @@ async def enhanced_reset_today_constant_trainings_status():
             print(f"❌ Error processing one-time training {tid}: {e}")
             continue
 
+    yesterday = today - datetime.timedelta(days=1)
+    held_yesterday = {occurrence["training_id"]
+                      for occurrence in await occurrences_between(yesterday, yesterday, training_type="constant")}
+
     for tid, training in constant_trainings.items():
         if training.get("status") != "not charged" or not training.get("with_coach"):
             continue
 
-        weekday = training.get("weekday")
-        if weekday is None:
-            continue
-
-        yesterday = today - datetime.timedelta(days=1)
-        days_ago = (yesterday.weekday() - weekday) % 7
-        training_date = yesterday - datetime.timedelta(days=days_ago)
-
-        if training_date == yesterday:
+        if tid in held_yesterday:
+            weekday = training["weekday"]
             training_id = f"const_{weekday}_{training['start_hour']:02d}:{training['start_min']:02d}"
 
-            archive_success = archiver.archive_training_vote(training_id, training, force_archive=True)
+            archive_success = await archiver.archive_training_vote(training_id, training, force_archive=True)
             if archive_success:
                 print(f"✅ Archived constant training {training_id}")
 
@@ -224,10 +216,7 @@ async def enhanced_reset_today_constant_trainings_status():
             print(f"✅ Auto-charged constant training {training_id} (no payment required)")
 
     if updated:
-        save_data(one_time_trainings, "one_time_trainings")
-        save_data(constant_trainings, "constant_trainings")
-
-        votes = load_data("votes", {"votes": {}})
-        save_data(votes, "votes")
+        await asave_data(one_time_trainings, "one_time_trainings")
+        await asave_data(constant_trainings, "constant_trainings")
 
         print("✅ Auto-charged all completed trainings with coach (no payments created)")
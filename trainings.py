@@ -5,8 +5,15 @@ from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, Call
     filters
 from training_archive import enhanced_reset_today_constant_trainings_status
 
-from data import load_data, save_data,log_command_usage
+from data import aload_data, asave_data, log_command_usage
+from audience import audience_index
+from vote_store import load_all_votes, delete_votes
 from validation import is_authorized
+from outbox import enqueue
+from callbacks import callback_data
+from jobs import schedule_training_jobs, cancel_training_jobs
+from occurrences import occurrences_between, occurrence_date, refresh_occurrences, with_trainings
+from clock import local_now, local_today
 
 DATA_FILE = "users"
 
@@ -271,7 +278,7 @@ async def save_training_data(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     is_onetime = context.user_data['training_type'] == TrainingType.ONE_TIME.value
     file_path = ONE_TIME_TRAININGS_FILE if is_onetime else CONSTANT_TRAININGS_FILE
-    trainings = load_data(file_path, {})
+    trainings = await aload_data(file_path, {})
 
     if is_onetime:
         training_data["date"] = context.user_data['training_date']
@@ -280,18 +287,18 @@ async def save_training_data(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     new_id = str(max(map(int, trainings.keys() or ['0'])) + 1)
     trainings[new_id] = training_data
-    save_data(trainings, file_path)
+    await asave_data(trainings, file_path)
 
     if is_onetime:
         try:
             start_voting_date = datetime.datetime.strptime(training_data['start_voting'], "%d.%m.%Y").date()
-            today = datetime.datetime.now().date()
+            today = local_today()
 
             if start_voting_date <= today:
                 await open_onetime_training_voting_immediately(context, training_data, new_id)
                 training_data["voting_opened"] = True
                 trainings[new_id] = training_data
-                save_data(trainings, file_path)
+                await asave_data(trainings, file_path)
         except:
             pass
     else:
@@ -300,13 +307,15 @@ async def save_training_data(update: Update, context: ContextTypes.DEFAULT_TYPE)
             await open_constant_training_voting_immediately(context, training_data, new_id)
             training_data["voting_opened"] = True
             trainings[new_id] = training_data
-            save_data(trainings, file_path)
+            await asave_data(trainings, file_path)
         except:
             pass
 
+    await refresh_occurrences()
+    await schedule_training_jobs("one-time" if is_onetime else "constant", new_id, training_data)
+
 
 async def open_onetime_training_voting_immediately(context, training, training_id):
-    users = load_data(DATA_FILE)
     vote_id = f"{training['date']}_{training['start_hour']:02d}:{training['start_min']:02d}"
 
     start_time = f"{training['start_hour']:02d}:{training['start_min']:02d}"
@@ -329,23 +338,14 @@ async def open_onetime_training_voting_immediately(context, training, training_i
 
     keyboard = InlineKeyboardMarkup([
         [
-            InlineKeyboardButton("✅ Так", callback_data=f"vote_yes_{vote_id}"),
-            InlineKeyboardButton("❌ Ні", callback_data=f"vote_no_{vote_id}")
+            InlineKeyboardButton("✅ Так", callback_data=await callback_data("vote", id=vote_id, vote="yes")),
+            InlineKeyboardButton("❌ Ні", callback_data=await callback_data("vote", id=vote_id, vote="no"))
         ]
     ])
 
-    for uid, info in users.items():
-        if training.get("team") in [info.get("team"), "Both"]:
-            try:
-                await context.bot.send_message(
-                    chat_id=int(uid),
-                    text=message,
-                    reply_markup=keyboard
-                )
-            except Exception as e:
-                print(f"❌ ONETIME: Помилка надсилання до {uid}: {e}")
+    recipients = await audience_index.resolve(training.get("team"))
+    await enqueue(f"vote_open:{vote_id}:{local_today()}", recipients, text=message, reply_markup=keyboard)
 async def open_constant_training_voting_immediately(context, training, training_id):
-    users = load_data("users")  # same as DATA_FILE for users
 
     # For constant trainings we generate vote_id differently
     vote_id = f"const_{training['weekday']}_{training['start_hour']:02d}:{training['start_min']:02d}"
@@ -377,21 +377,13 @@ async def open_constant_training_voting_immediately(context, training, training_
 
     keyboard = InlineKeyboardMarkup([
         [
-            InlineKeyboardButton("✅ Так", callback_data=f"vote_yes_{vote_id}"),
-            InlineKeyboardButton("❌ Ні", callback_data=f"vote_no_{vote_id}")
+            InlineKeyboardButton("✅ Так", callback_data=await callback_data("vote", id=vote_id, vote="yes")),
+            InlineKeyboardButton("❌ Ні", callback_data=await callback_data("vote", id=vote_id, vote="no"))
         ]
     ])
 
-    for uid, info in users.items():
-        if training.get("team") in [info.get("team"), "Both"]:
-            try:
-                await context.bot.send_message(
-                    chat_id=int(uid),
-                    text=message,
-                    reply_markup=keyboard
-                )
-            except Exception as e:
-                print(f"❌ CONSTANT: Помилка надсилання до {uid}: {e}")
+    recipients = await audience_index.resolve(training.get("team"))
+    await enqueue(f"vote_open:{vote_id}:{local_today()}", recipients, text=message, reply_markup=keyboard)
 
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -419,156 +411,64 @@ def create_training_add_handler():
     )
 
 
-def get_next_training(team=None):
-    one_time_trainings = load_data(ONE_TIME_TRAININGS_FILE, {})
-    constant_trainings = load_data(CONSTANT_TRAININGS_FILE, {})
-
-    now = datetime.datetime.now()
-    current_date = now.date()
-    current_time = now.time()
-    current_weekday = now.weekday()
-
-    all_trainings = []
-
-    for training in constant_trainings.values():
-        if not isinstance(training, dict) or training.get("team") not in [team, "Both", None]:
-            continue
-
-        training_weekday = training.get("weekday", -1)
-        training_time = datetime.time(hour=training.get("start_hour", 0), minute=training.get("start_min", 0))
-
-        if training_weekday == -1:
-            continue
-
-        days_until = (training_weekday - current_weekday) % 7
-        if days_until == 0 and training_time <= current_time:
-            days_until = 7
-
-        next_date = current_date + datetime.timedelta(days=days_until)
-
-        all_trainings.append({
-            "date": next_date,
-            "start_hour": training.get("start_hour", 0),
-            "start_min": training.get("start_min", 0),
-            "end_hour": training.get("end_hour", 0),
-            "end_min": training.get("end_min", 0),
-            "team": str(training.get("team", "Both")),
-            "with_coach": bool(training.get("with_coach", False)),
-            "location": training.get("location", ""),
-            "description": training.get("description"),
-            "type": "constant",
-            "days_until": days_until
-        })
-
-    for training in one_time_trainings.values():
-        if not isinstance(training, dict) or training.get("team") not in [team, "Both", None]:
-            continue
-
-        try:
-            training_date = datetime.datetime.strptime(training.get("date", ""), "%d.%m.%Y").date()
-        except (ValueError, TypeError):
-            continue
-
-        if training_date < current_date:
-            continue
-
-        days_until = (training_date - current_date).days
-        training_time = datetime.time(hour=training.get("start_hour", 0), minute=training.get("start_min", 0))
-        if training_date == current_date and training_time <= current_time:
-            continue
+def _training_info(occurrence, training):
+    return {
+        "date": occurrence_date(occurrence),
+        "weekday": training.get("weekday"),
+        "start_voting": training.get("start_voting"),
+        "start_hour": training.get("start_hour", 0),
+        "start_min": training.get("start_min", 0),
+        "end_hour": training.get("end_hour", 0),
+        "end_min": training.get("end_min", 0),
+        "team": str(training.get("team", "Both")),
+        "with_coach": bool(training.get("with_coach", False)),
+        "location": training.get("location", ""),
+        "description": training.get("description", ""),
+        "type": occurrence["training_type"]
+    }
 
-        all_trainings.append({
-            "date": training_date,
-            "start_hour": training.get("start_hour", 0),
-            "start_min": training.get("start_min", 0),
-            "end_hour": training.get("end_hour", 0),
-            "end_min": training.get("end_min", 0),
-            "team": str(training.get("team", "Both")),
-            "with_coach": bool(training.get("with_coach", False)),
-            "location": training.get("location", ""),
-            "description": training.get("description"),
-            "type": "one-time",
-            "days_until": days_until
-        })
 
-    all_trainings.sort(key=lambda x: (x["date"], x["start_hour"], x["start_min"]))
+async def get_next_training(team=None):
+    now = local_now()
+    current_date = now.date()
+    # Без верхньої межі: разове тренування може бути далі за вікно тижневих
+    upcoming = await occurrences_between(current_date, None)
 
-    return all_trainings[0] if all_trainings else None
+    upcoming = [occurrence for occurrence in upcoming if occurrence["starts_at"] > now.strftime("%Y-%m-%d %H:%M")]
 
+    for occurrence, training in await with_trainings(upcoming, team):
+        training_info = _training_info(occurrence, training)
+        training_info["days_until"] = (training_info["date"] - current_date).days
+        return training_info
 
-def get_next_week_trainings(team=None):
-    from datetime import datetime, timedelta
+    return None
 
-    one_time_trainings = load_data(ONE_TIME_TRAININGS_FILE, {})
-    constant_trainings = load_data(CONSTANT_TRAININGS_FILE, {})
 
-    now = datetime.now()
-    current_date = now.date()
-
-    end_date = current_date + timedelta(days=7)
+async def get_next_week_trainings(team=None):
+    current_date = local_today()
     trainings = []
 
-    for training in constant_trainings.values():
-        if training.get("team") not in [team, "Both", None]:
-            continue
-        training_weekday = training.get("weekday")
-        if training_weekday is None:
-            continue
-        for i in range(1, 8):  # next 7 days
-            training_date = current_date + timedelta(days=i)
-            if training_date.weekday() == training_weekday:
-                trainings.append({
-                    "weekday": training_weekday,
-                    "start_voting": training.get("start_voting"),
-                    "date": training_date,
-                    "start_hour": training["start_hour"],
-                    "start_min": training["start_min"],
-                    "end_hour": training["end_hour"],
-                    "end_min": training["end_min"],
-                    "team": training["team"],
-                    "with_coach": training["with_coach"],
-                    "location": training.get("location", ""),
-                    "description": training.get("description", ""),
-                    "type": "constant"
-                })
-
-    for training in one_time_trainings.values():
-        if training.get("team") not in [team, "Both", None]:
+    upcoming = await occurrences_between(current_date, current_date + datetime.timedelta(days=7))
+    for occurrence, training in await with_trainings(upcoming, team):
+        # Постійні тренування показуються з завтрашнього дня на тиждень уперед
+        if occurrence["training_type"] == "constant" and occurrence_date(occurrence) == current_date:
             continue
-        try:
-            training_date = datetime.strptime(training["date"], "%d.%m.%Y").date()
-        except Exception:
-            continue
-        if current_date <= training_date <= end_date:
-            trainings.append({
-                "start_voting": training.get("start_voting"),
-                "date": training_date,
-                "start_hour": training["start_hour"],
-                "start_min": training["start_min"],
-                "end_hour": training["end_hour"],
-                "end_min": training["end_min"],
-                "team": training["team"],
-                "with_coach": training["with_coach"],
-                "location": training.get("location", ""),
-                "description": training.get("description", ""),
-                "type": "one-time"
-            })
-
-    trainings.sort(key=lambda x: (x["date"], x["start_hour"], x["start_min"]))
+        trainings.append(_training_info(occurrence, training))
+
     return trainings
 
 
 async def week_trainings(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.message.from_user.id)
     log_command_usage(user_id, "/week_trainings")
-    user_data = load_data(DATA_FILE)
+    user_data = await aload_data(DATA_FILE)
 
     if user_id not in user_data or "team" not in user_data[user_id]:
         await update.message.reply_text("Будь ласка, завершіть реєстрацію.")
         return
 
     team = user_data[user_id]["team"]
-    trainings = get_next_week_trainings(team)
+    trainings = await get_next_week_trainings(team)
 
     if not trainings:
         await update.message.reply_text("Немає тренувань у найближчі 7 днів.")
@@ -605,14 +505,14 @@ async def week_trainings(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(message)
 
 
-def format_next_training_message(user_id: str) -> str:
-    user_data = load_data("users")
+async def format_next_training_message(user_id: str) -> str:
+    user_data = await aload_data("users")
 
     if user_id not in user_data or "team" not in user_data[user_id]:
         return "Будь ласка, завершіть реєстрацію, щоб отримувати інформацію про тренування."
 
     team = user_data[user_id]["team"]
-    training_info = get_next_training(team)
+    training_info = await get_next_training(team)
 
     if not training_info:
         return "Немає запланованих тренувань."
@@ -658,9 +558,9 @@ async def delete_training(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.message.from_user.id)
     log_command_usage(user_id, "/delete_training")
 
-    one_time = load_data("one_time_trainings", {})
-    constant = load_data("constant_trainings", {})
-    votes_map = load_data("votes", {"votes": {}}).get("votes", {})
+    one_time = await aload_data("one_time_trainings", {})
+    constant = await aload_data("constant_trainings", {})
+    votes_map = await load_all_votes("votes")
 
     buttons = []
 
@@ -707,7 +607,7 @@ async def handle_delete_training_selection(update: Update, context: ContextTypes
 
     _, _, col_tag, tid = parts
     collection = "one_time_trainings" if col_tag == "one" else "constant_trainings"
-    trainings = load_data(collection, {})
+    trainings = await aload_data(collection, {})
     t = trainings.get(tid)
     if not t:
         await query.edit_message_text("⚠️ Тренування не знайдено.")
@@ -745,7 +645,7 @@ async def handle_delete_training_confirm(update: Update, context: ContextTypes.D
         return
 
     collection = "one_time_trainings" if col_tag == "one" else "constant_trainings"
-    trainings = load_data(collection, {})
+    trainings = await aload_data(collection, {})
     t = trainings.get(tid)
     if not t:
         await query.edit_message_text("⚠️ Тренування не знайдено.")
@@ -759,7 +659,9 @@ async def handle_delete_training_confirm(update: Update, context: ContextTypes.D
         label = f"{weekdays[t['weekday']]} {t['start_hour']:02d}:{t['start_min']:02d}"
 
     trainings.pop(tid, None)
-    save_data(trainings, collection)
+    await asave_data(trainings, collection)
+    await refresh_occurrences()
+    await cancel_training_jobs("one-time" if col_tag == "one" else "constant", tid)
 
     # Визначаємо ключ голосів для цього тренування
     if col_tag == "one":
@@ -768,11 +670,8 @@ async def handle_delete_training_confirm(update: Update, context: ContextTypes.D
         vote_key = f"const_{t['weekday']}_{t['start_hour']:02d}:{t['start_min']:02d}"
 
     # Видаляємо голоси
-    votes = load_data("votes", {"votes": {}})
-    if vote_key in votes["votes"]:
-        del votes["votes"][vote_key]
-        save_data(votes, "votes")
-        print(f"✅ Видалено голосування за тренування {vote_key}")
+    await delete_votes("votes", vote_key)
+    print(f"✅ Видалено голосування за тренування {vote_key}")
 
 
     await query.edit_message_text(f"✅ Видалено: {label}")
@@ -780,7 +679,7 @@ async def handle_delete_training_confirm(update: Update, context: ContextTypes.D
 async def next_training(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.message.from_user.id)
     log_command_usage(user_id, "/next_training")
-    await update.message.reply_text(format_next_training_message(user_id))
+    await update.message.reply_text(await format_next_training_message(user_id))
 
 
 async def reset_today_constant_trainings_status():
@@ -0,0 +1,140 @@
+import asyncio
+import os
+import random
+import sys
+import tempfile
+
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+
+import data
+from storage import MemoryStorage, SQLiteStorage
+from vote_store import WAITLIST, cast_training_vote, count_votes, promote_waitlisted
+
+# Сотні одночасних натискань "✅ Так" / "❌ Ні" за одне тренування на memory- і
+# SQLite-сховищі. Після прогону лічильники мають збігатися з голосами, жоден
+# голос не загублений, а "так" ніколи не більше за LIMIT - ні в проміжних
+# результатах, ні в кінці.
+VOTES_FILE = "votes"
+VOTE_ID = "race_check"
+LIMIT = 30
+TAPS = 300
+# Кожен п'ятий натискає "❌ Ні"
+NO_EVERY = 5
+# Друга гонка: на повне тренування з чергою QUEUED гравців FLIPS учасників
+# передумують і віддають місця черзі, а NEWCOMERS нових гравців тим часом
+# тиснуть "✅ Так". Звільнені місця мають дістатися черзі строго по порядку,
+# а новенькі - стати за нею.
+QUEUED = 20
+FLIPS = 15
+NEWCOMERS = 40
+
+
+def _problems(doc, limit, voters):
+    problems = []
+    votes = doc.get("votes", {})
+    counts = count_votes(votes)
+    stored = {field: doc.get(field, 0) for field in counts}
+    if stored != counts:
+        problems.append(f"лічильники {stored}, за голосами {counts}")
+    if doc.get("yes_count", 0) > limit:
+        problems.append(f"yes_count {doc['yes_count']} більше за ліміт {limit}")
+    lost = set(voters) - set(votes)
+    if lost:
+        problems.append(f"загублено голоси {sorted(lost)[:5]}...")
+    waitlist = doc.get("waitlist", [])
+    waiting = {uid for uid, vote in votes.items() if vote.get("vote") == WAITLIST}
+    if len(waitlist) != len(set(waitlist)) or set(waitlist) != waiting:
+        problems.append(f"черга {waitlist} не збігається з голосами {sorted(waiting)}")
+    return problems
+
+
+async def _tap(user_id, value, peak):
+    await asyncio.sleep(random.random() / 100)
+    doc = await cast_training_vote(VOTES_FILE, VOTE_ID, user_id, {"name": user_id, "vote": value}, limit=LIMIT)
+    if doc is None:
+        return f"голос {user_id} не збережено"
+    peak.append(doc.get("yes_count", 0))
+    return None
+
+
+async def run_race(label):
+    peak = []
+    voters = [f"u{i}" for i in range(TAPS)]
+    taps = [_tap(uid, "no" if i % NO_EVERY == 0 else "yes", peak) for i, uid in enumerate(voters)]
+    failures = [failed for failed in await asyncio.gather(*taps) if failed]
+
+    doc = data.load_document(VOTES_FILE, VOTE_ID, {})
+    problems = failures + _problems(doc, LIMIT, voters)
+    if max(peak) > LIMIT:
+        problems.append(f"проміжний yes_count {max(peak)} більше за ліміт {LIMIT}")
+
+    print(f"{label}: так {doc.get('yes_count')}, ні {doc.get('no_count')}, у черзі {len(doc.get('waitlist', []))}")
+    for problem in problems:
+        print(f"❌ {label}: {problem}")
+    return not problems
+
+
+async def _flip(user_id, peak):
+    await asyncio.sleep(random.random() / 100)
+    doc = await cast_training_vote(VOTES_FILE, VOTE_ID, user_id, {"name": user_id, "vote": "no"}, limit=LIMIT)
+    if doc is None:
+        return f"голос {user_id} не збережено"
+    # Як fill_from_waitlist після кожного голосу
+    await promote_waitlisted(VOTES_FILE, VOTE_ID, LIMIT)
+    peak.append(data.load_document(VOTES_FILE, VOTE_ID, {}).get("yes_count", 0))
+    return None
+
+
+async def run_flip_race(label):
+    peak = []
+    players = [f"p{i}" for i in range(LIMIT)]
+    queued = [f"q{i}" for i in range(QUEUED)]
+    newcomers = [f"n{i}" for i in range(NEWCOMERS)]
+    for uid in players + queued:
+        await cast_training_vote(VOTES_FILE, VOTE_ID, uid, {"name": uid, "vote": "yes"}, limit=LIMIT)
+
+    taps = [_flip(uid, peak) for uid in players[:FLIPS]] + [_tap(uid, "yes", peak) for uid in newcomers]
+    random.shuffle(taps)
+    failures = [failed for failed in await asyncio.gather(*taps) if failed]
+    # Наступний голос добирає місця, якщо якесь просування поступилося в гонці
+    await promote_waitlisted(VOTES_FILE, VOTE_ID, LIMIT)
+
+    doc = data.load_document(VOTES_FILE, VOTE_ID, {})
+    problems = failures + _problems(doc, LIMIT, players + queued + newcomers)
+    if max(peak) > LIMIT:
+        problems.append(f"проміжний yes_count {max(peak)} більше за ліміт {LIMIT}")
+    if doc.get("yes_count", 0) != LIMIT:
+        problems.append(f"yes_count {doc.get('yes_count')} при непорожній черзі, а не {LIMIT}")
+
+    votes = doc.get("votes", {})
+    promoted = [uid for uid in queued if votes[uid]["vote"] == "yes"]
+    if promoted != queued[:len(promoted)]:
+        problems.append(f"черга просунулася не по порядку: {promoted}")
+    jumped = [uid for uid in newcomers if votes[uid]["vote"] != WAITLIST]
+    if jumped:
+        problems.append(f"новенькі {jumped[:5]} обійшли чергу")
+    waitlist = doc.get("waitlist", [])
+    if waitlist[:QUEUED - len(promoted)] != queued[len(promoted):]:
+        problems.append(f"новенькі стали в черзі перед тими, хто вже чекав: {waitlist[:5]}...")
+
+    print(f"{label}, передумали {FLIPS}: просунуто {len(promoted)}, у черзі {len(waitlist)}")
+    for problem in problems:
+        print(f"❌ {label}: {problem}")
+    return not problems
+
+
+def run_check() -> bool:
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, backend in (("memory", MemoryStorage()), ("sqlite", SQLiteStorage(os.path.join(tmp, "race.db")))):
+            data.storage = backend
+            ok = asyncio.run(run_race(label)) and ok
+            data.storage.write(VOTES_FILE, {}, [VOTE_ID])
+            ok = asyncio.run(run_flip_race(label)) and ok
+    return ok
+
+
+if __name__ == "__main__":
+    ok = run_check()
+    print("✅ Ліміт тримається, голоси не губляться, черга йде по порядку" if ok else "❌ Перевірка не пройдена")
+    sys.exit(0 if ok else 1)
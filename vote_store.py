@@ -0,0 +1,159 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from data import aload_data, aload_document, aupdate_document, adelete_document, afind_and_update
+
+# Кожне голосування зберігається окремим документом:
+# {"_id": vote_id, "votes": {user_id: {...}}}
+# тому голос одного користувача оновлює лише документ свого голосування.
+# Голосування за тренування додатково тримають лічильники "yes_count" і "no_count",
+# тож кількість голосів читається без перебору самих голосів.
+# Хто голосує "так" за заповнене тренування, отримує голос "waitlist" і стає в
+# кінець списку "waitlist" того ж документа; звільнене місце забирає перший у списку.
+
+CAST_ATTEMPTS = 5
+COUNT_FIELDS = ["yes_count", "no_count"]
+WAITLIST = "waitlist"
+
+
+async def load_votes(collection_name: str, vote_id: str) -> Dict[str, Dict[str, Any]]:
+    doc = await aload_document(collection_name, vote_id, {})
+    return doc.get("votes", {})
+
+
+async def load_all_votes(collection_name: str) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    docs = await aload_data(collection_name, {})
+    return {vote_id: doc.get("votes", {}) for vote_id, doc in docs.items()}
+
+
+async def save_user_vote(collection_name: str, vote_id: str, user_id: str, vote: Dict[str, Any]) -> None:
+    await aupdate_document(collection_name, vote_id, {"$set": {f"votes.{user_id}": vote}}, upsert=True)
+
+
+async def delete_votes(collection_name: str, vote_id: str) -> None:
+    await adelete_document(collection_name, vote_id)
+
+
+async def load_vote_counts(collection_name: str,
+                           vote_ids: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, int]]:
+    """{vote_id: {"yes": n, "no": n}} read from the counters, without the votes
+    themselves; every vote of the collection when vote_ids is None."""
+    vote_ids = None if vote_ids is None else list(vote_ids)
+    query = None if vote_ids is None else {"_id": {"$in": vote_ids}}
+    docs = await aload_data(collection_name, {}, query=query, fields=COUNT_FIELDS)
+    if vote_ids is not None:
+        docs = {vote_id: docs.get(vote_id, {}) for vote_id in vote_ids}
+    return {vote_id: {"yes": doc.get("yes_count", 0), "no": doc.get("no_count", 0)}
+            for vote_id, doc in docs.items()}
+
+
+def count_votes(votes: Dict[str, Dict[str, Any]]) -> Dict[str, int]:
+    """Counters recomputed from the raw votes, for the consistency check."""
+    return {
+        "yes_count": sum(1 for v in votes.values() if v.get("vote") == "yes"),
+        "no_count": sum(1 for v in votes.values() if v.get("vote") == "no"),
+    }
+
+
+def waiting_in_order(votes: Dict[str, Dict[str, Any]], waitlist: Iterable[str] = ()) -> List[Dict[str, Any]]:
+    """Waitlisted votes in queue order: as in the waitlist array, then by
+    timestamp anyone missing from it."""
+    waiting = {uid: vote for uid, vote in votes.items() if vote.get("vote") == WAITLIST}
+    ordered = [waiting.pop(uid) for uid in waitlist if uid in waiting]
+    return ordered + sorted(waiting.values(), key=lambda vote: vote.get("timestamp", ""))
+
+
+def _transition(user_id: str, entry: Dict[str, Any], stored: Dict[str, Any],
+                limit: Optional[int]) -> Tuple[Dict, Dict]:
+    """(query, update) that moves a user's vote from the one in stored to entry["vote"].
+    The query pins the previous vote and whether a place was free (under the
+    limit with nobody waiting), so it matches nothing if another click or a
+    promotion changed either meanwhile."""
+    previous = stored.get("votes", {}).get(user_id, {}).get("vote")
+    new = entry["vote"]
+    query = {f"votes.{user_id}.vote": previous if previous else {"$exists": False}}
+
+    # Повторний голос нічого не змінює
+    if previous == new:
+        return query, {"$set": {f"votes.{user_id}": entry}}
+    # "Так" з черги чекає на автоматичне просування, зберігаючи час постановки в чергу
+    if previous == WAITLIST and new == "yes" and limit is not None:
+        return query, {"$set": {f"votes.{user_id}.name": entry.get("name")}}
+
+    counts = {f"{new}_count": 1}
+    if previous in ("yes", "no"):
+        counts[f"{previous}_count"] = -1
+    update = {"$set": {f"votes.{user_id}": entry}, "$inc": counts}
+    if previous == WAITLIST:
+        update["$pull"] = {"waitlist": user_id}
+
+    if new != "yes" or limit is None:
+        return query, update
+    # Вільне місце дістається новому "так", лише коли ніхто не чекає в черзі
+    if stored.get("yes_count", 0) < limit and not stored.get("waitlist"):
+        return {**query, "yes_count": {"$not": {"$gte": limit}}, "waitlist.0": {"$exists": False}}, update
+
+    # Місць немає або черга вже є - стаємо в її кінець
+    queue = {"$set": {f"votes.{user_id}": {**entry, "vote": WAITLIST}}, "$push": {"waitlist": user_id}}
+    if previous == "no":
+        queue["$inc"] = {"no_count": -1}
+    return {**query, "$or": [{"yes_count": {"$gte": limit}}, {"waitlist.0": {"$exists": True}}]}, queue
+
+
+async def cast_training_vote(collection_name: str, vote_id: str, user_id: str, vote: Dict[str, Any],
+                             limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """Store a user's training vote and keep yes_count / no_count and the waitlist
+    in step with it.
+
+    Reads the user's current vote, the counter and the waitlist, then applies one
+    conditional update that only matches if none of them changed meanwhile; a
+    lost race re-reads and tries again. So the counters, the limit and the
+    waitlist order hold however many users vote at once. A "yes" beyond limit,
+    or while others are already waiting, puts the user at the end of the
+    waitlist instead. Returns the vote document after the cast, or None if the
+    vote could not be stored.
+    """
+    fields = [f"votes.{user_id}.vote", "yes_count", "waitlist"]
+    for _ in range(CAST_ATTEMPTS):
+        stored = (await aload_data(collection_name, {}, query={"_id": vote_id}, fields=fields)).get(vote_id)
+        query, update = _transition(user_id, vote, stored or {}, limit)
+        # Документ голосування створюється першим голосом
+        doc = await afind_and_update(collection_name, {"_id": vote_id, **query}, update, upsert=stored is None)
+        if doc:
+            return doc
+
+    print(f"❌ Не вдалося зберегти голос {user_id} за {vote_id}")
+    return None
+
+
+async def promote_waitlisted(collection_name: str, vote_id: str, limit: int) -> List[Tuple[str, Dict[str, Any]]]:
+    """Move users from the head of the waitlist to "yes" while there are free places.
+
+    Each promotion only applies if the same user is still first in line and the
+    place is still free, so concurrent callers never promote anyone twice or
+    overfill the training. Returns (user_id, vote) for everyone promoted here.
+    """
+    promoted = []
+    conflicts = 0
+    while conflicts < CAST_ATTEMPTS:
+        doc = await aload_document(collection_name, vote_id, {})
+        waitlist = doc.get("waitlist", [])
+        if not waitlist or doc.get("yes_count", 0) >= limit:
+            break
+
+        head = waitlist[0]
+        doc = await afind_and_update(collection_name, {
+            "_id": vote_id,
+            "waitlist.0": head,
+            f"votes.{head}.vote": WAITLIST,
+            "yes_count": {"$lt": limit},
+        }, {
+            "$pop": {"waitlist": -1},
+            "$set": {f"votes.{head}.vote": "yes"},
+            "$inc": {"yes_count": 1},
+        })
+        if doc:
+            promoted.append((head, doc["votes"][head]))
+        else:
+            conflicts += 1
+
+    return promoted
@@ -1,11 +1,23 @@
+import asyncio
 import datetime
+import os
+import time
 import uuid
+from typing import Dict, List, Optional
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler, MessageHandler, \
     filters, ConversationHandler
 
-from data import load_data, save_data,log_command_usage
+from data import aload_data, aload_document, asave_data, cache, log_command_usage
+from audience import audience_index
+from tally import schedule_tally_update
+from vote_store import WAITLIST, load_votes, load_all_votes, load_vote_counts, save_user_vote, cast_training_vote, \
+    promote_waitlisted, waiting_in_order
+from payments_repository import get_unpaid_by_user, payment_key, save_payments
 from validation import is_authorized
+from outbox import enqueue, enqueue_many
+from callbacks import callback_data, register_callback
+from clock import local_now
 
 VOTE_TYPE, VOTE_QUESTION, VOTE_OPTIONS, VOTE_TEAM = range(200, 204)
 VOTE_OTHER_NAME, VOTE_OTHER_SELECT = range(2)
@@ -17,10 +29,13 @@ GENERAL_FILE = "general"
 GENERAL_VOTES_FILE = "general_votes"
 GAMES_FILE = "games"
 GAME_VOTES_FILE = "game_votes"
-DEFAULT_VOTES_STRUCTURE = {"votes": {}}
 VOTES_LIMIT = 30
 ONE_TIME_TRAININGS_FILE = "one_time_trainings"
 CONSTANT_TRAININGS_FILE = "constant_trainings"
+OPEN_VOTES_SOURCES = (ONE_TIME_TRAININGS_FILE, CONSTANT_TRAININGS_FILE, GAMES_FILE, GENERAL_FILE)
+OPEN_VOTES_REBUILD_SECONDS = int(os.getenv("OPEN_VOTES_REBUILD_SECONDS", "60"))
+# Games of these types are offered only to users with the flag
+GAME_LEAGUE_FLAGS = {"stolichka": "stolichna"}
 
 
 class VoteType:
@@ -69,27 +84,57 @@ class UnifiedVoteManager:
             "game": "🏆 Гра",
             "general": "📊 Загальне голосування"
         }
-
-    def get_all_available_votes(self, user_id: str, user_team: str):
+        # Індекс відкритих голосувань для /vote по командах: збирається один раз
+        # і перебудовується, коли в цьому процесі змінилися тренування, ігри чи
+        # загальні голосування, тренування заповнилося або звільнилося місце,
+        # і не рідше ніж раз на OPEN_VOTES_REBUILD_SECONDS (зміни з інших реплік).
+        self._open_votes: Dict[str, List[Dict]] = {}
+        self._built_at: Optional[float] = None
+        self._generations: Optional[tuple] = None
+        self._lock = asyncio.Lock()
+
+    def invalidate(self) -> None:
+        self._built_at = None
+
+    def _source_generations(self) -> tuple:
+        return tuple(cache.generation(name) for name in OPEN_VOTES_SOURCES)
+
+    def _is_stale(self) -> bool:
+        return (self._built_at is None or self._generations != self._source_generations()
+                or time.monotonic() - self._built_at > OPEN_VOTES_REBUILD_SECONDS)
+
+    async def _team_votes(self, user_team: str) -> List[Dict]:
+        async with self._lock:
+            if self._is_stale():
+                self._open_votes = {}
+                self._generations = self._source_generations()
+                self._built_at = time.monotonic()
+            if user_team not in self._open_votes:
+                self._open_votes[user_team] = (await self._get_training_votes("", user_team)
+                                               + await self._get_game_votes(user_team)
+                                               + await self._get_general_votes("", user_team))
+            return self._open_votes[user_team]
+
+    async def get_all_available_votes(self, user_id: str, user_team: str, user_info: Optional[Dict] = None):
+        now = local_now()
+        user_info = user_info or {}
         all_votes = []
 
-        training_votes = self._get_training_votes(user_id, user_team)
-        all_votes.extend(training_votes)
-
-        game_votes = self._get_game_votes(user_id, user_team)
-        all_votes.extend(game_votes)
-
-        general_votes = self._get_general_votes(user_id, user_team)
-        all_votes.extend(general_votes)
+        for vote in await self._team_votes(user_team):
+            # Ігри, що вже почалися, і ліги, до яких користувач не належить
+            if vote.get("closes_at") and vote["closes_at"] <= now:
+                continue
+            if vote.get("requires") and not user_info.get(vote["requires"], False):
+                continue
+            all_votes.append({key: vote[key] for key in ("type", "id", "label", "data")})
 
         return all_votes
 
-    def _get_training_votes(self, user_id: str, user_team: str):
-        one_time_trainings = load_data(ONE_TIME_TRAININGS_FILE, {})
-        constant_trainings = load_data(CONSTANT_TRAININGS_FILE, {})
+    async def _get_training_votes(self, user_id: str, user_team: str):
+        one_time_trainings = await aload_data(ONE_TIME_TRAININGS_FILE, {})
+        constant_trainings = await aload_data(CONSTANT_TRAININGS_FILE, {})
 
-        training_votes = []
-        votes_data = load_data(TRAINING_VOTES_FILE, DEFAULT_VOTES_STRUCTURE)
+        open_trainings = []
 
         for training_id, training in one_time_trainings.items():
             if training.get("team") not in [user_team, "Both"]:
@@ -99,19 +144,7 @@ class UnifiedVoteManager:
                 continue
 
             vote_id = f"{training['date']}_{training['start_hour']:02d}:{training['start_min']:02d}"
-
-            yes_votes = 0
-            if vote_id in votes_data["votes"]:
-                yes_votes = sum(1 for v in votes_data["votes"][vote_id].values() if v["vote"] == "yes")
-
-            if yes_votes < VOTES_LIMIT:
-                label = self._format_training_label(training, vote_id)
-                training_votes.append({
-                    "type": "training",
-                    "id": vote_id,
-                    "label": label,
-                    "data": training
-                })
+            open_trainings.append((vote_id, training))
 
         for training_id, training in constant_trainings.items():
             if training.get("team") not in [user_team, "Both"]:
@@ -121,35 +154,33 @@ class UnifiedVoteManager:
                 continue
 
             vote_id = f"const_{training['weekday']}_{training['start_hour']:02d}:{training['start_min']:02d}"
+            open_trainings.append((vote_id, training))
 
-            yes_votes = 0
-            if vote_id in votes_data["votes"]:
-                yes_votes = sum(1 for v in votes_data["votes"][vote_id].values() if v["vote"] == "yes")
+        # Лічильники лише відкритих голосувань, а не всієї колекції
+        vote_counts = await load_vote_counts(TRAINING_VOTES_FILE, [vote_id for vote_id, _ in open_trainings])
 
-            if yes_votes < VOTES_LIMIT:
-                label = self._format_training_label(training, vote_id)
-                training_votes.append({
-                    "type": "training",
-                    "id": vote_id,
-                    "label": label,
-                    "data": training
-                })
+        training_votes = []
+        for vote_id, training in open_trainings:
+            label = self._format_training_label(training, vote_id)
+            if vote_counts[vote_id]["yes"] >= VOTES_LIMIT:
+                label += " (черга)"
+            training_votes.append({
+                "type": "training",
+                "id": vote_id,
+                "label": label,
+                "data": training
+            })
 
         return training_votes
 
-    def _get_game_votes(self, user_id: str, user_team: str):
-        games = load_data(GAMES_FILE, {})
-        now = datetime.datetime.now()
+    async def _get_game_votes(self, user_team: str):
+        games = await aload_data(GAMES_FILE, {})
+        now = local_now()
         game_votes = []
 
-        users = load_data("users", {})
-        user_info = users.get(user_id, {})
-
         for game in games.values():
             if game.get("team") not in [user_team, "Both"]:
                 continue
-            if game.get("type") == "stolichka" and not user_info.get("stolichna", False):
-                continue
 
             try:
                 game_datetime = datetime.datetime.strptime(f"{game['date']} {game['time']}", "%d.%m.%Y %H:%M")
@@ -160,15 +191,17 @@ class UnifiedVoteManager:
                         "type": "game",
                         "id": game_id,
                         "label": label,
-                        "data": game
+                        "data": game,
+                        "closes_at": game_datetime,
+                        "requires": GAME_LEAGUE_FLAGS.get(game.get("type"))
                     })
             except ValueError:
                 continue
 
         return game_votes
 
-    def _get_general_votes(self, user_id: str, user_team: str):
-        votes = load_data(GENERAL_FILE, {})
+    async def _get_general_votes(self, user_id: str, user_team: str):
+        votes = await aload_data(GENERAL_FILE, {})
         general_votes = []
 
         for vote_id, vote_data in votes.items():
@@ -240,14 +273,13 @@ unified_vote_manager = UnifiedVoteManager()
 async def unified_vote_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.message.from_user.id)
     log_command_usage(user_id, "/vote")
-    user_data = load_data(REGISTRATION_FILE)
+    user_data = await aload_data(REGISTRATION_FILE)
 
     if user_id not in user_data or "team" not in user_data[user_id]:
         await update.message.reply_text("Будь ласка, завершіть реєстрацію перед голосуванням.")
         return
 
-    payments = load_data("payments", {})
-    unpaid = [p for p in payments.values() if p["user_id"] == user_id and not p.get("paid", False)]
+    unpaid = await get_unpaid_by_user(user_id)
 
     if len(unpaid) >= 2:
         await update.message.reply_text(
@@ -258,7 +290,7 @@ async def unified_vote_command(update: Update, context: ContextTypes.DEFAULT_TYP
             "⚠️ У тебе є неоплачене тренування. Будь ласка, погаси борг через /pay_debt якнайшвидше.")
 
     user_team = user_data[user_id]["team"]
-    all_votes = unified_vote_manager.get_all_available_votes(user_id, user_team)
+    all_votes = await unified_vote_manager.get_all_available_votes(user_id, user_team, user_data[user_id])
 
     if not all_votes:
         await update.message.reply_text("Наразі немає доступних голосувань.")
@@ -303,29 +335,30 @@ async def handle_unified_vote_selection(update: Update, context: ContextTypes.DE
 async def handle_training_vote_interaction(query, context, training_id, training_data):
     user_id = str(query.from_user.id)
 
-    votes = load_data(TRAINING_VOTES_FILE, DEFAULT_VOTES_STRUCTURE)
-    if training_id in votes["votes"]:
-        yes_votes = sum(1 for v in votes["votes"][training_id].values() if v["vote"] == "yes")
-        if yes_votes >= VOTES_LIMIT:
-            await query.edit_message_text("⚠️ Досягнуто максимум голосів 'так'. Голосування закрито.")
-            return
+    vote_doc = await aload_document(TRAINING_VOTES_FILE, training_id, {})
+    votes = vote_doc.get("votes", {})
+    yes_votes = vote_doc.get("yes_count", 0)
 
     keyboard = [
         [
-            InlineKeyboardButton("✅ Так", callback_data=f"vote_yes_{training_id}"),
-            InlineKeyboardButton("❌ Ні", callback_data=f"vote_no_{training_id}")
+            InlineKeyboardButton("✅ Так", callback_data=await callback_data("vote", id=training_id, vote="yes")),
+            InlineKeyboardButton("❌ Ні", callback_data=await callback_data("vote", id=training_id, vote="no"))
         ]
     ]
 
     training_info = format_training_id(training_id)
 
     current_vote = None
-    if training_id in votes["votes"] and user_id in votes["votes"][training_id]:
-        current_vote = votes["votes"][training_id][user_id]["vote"]
+    if user_id in votes:
+        current_vote = votes[user_id]["vote"]
+
+    vote_labels = {"yes": "БУДУ", "no": "НЕ БУДУ", WAITLIST: "У ЧЕРЗІ"}
 
     message = f"🏐 Тренування: {training_info}\n"
     if current_vote:
-        message += f"Ваш поточний голос: {'БУДУ' if current_vote == 'yes' else 'НЕ БУДУ'}\n"
+        message += f"Ваш поточний голос: {vote_labels.get(current_vote, current_vote)}\n"
+    if yes_votes >= VOTES_LIMIT and current_vote not in ("yes", WAITLIST):
+        message += "⚠️ Усі місця зайняті: з відповіддю 'Так' ви станете в чергу.\n"
     message += "Чи будете на тренуванні?"
 
     await query.edit_message_text(message, reply_markup=InlineKeyboardMarkup(keyboard))
@@ -336,8 +369,8 @@ async def handle_game_vote_interaction(query, context, game_id, game_data):
 
     keyboard = [
         [
-            InlineKeyboardButton("✅ Буду", callback_data=f"game_vote_yes_{game_id}"),
-            InlineKeyboardButton("❌ Не буду", callback_data=f"game_vote_no_{game_id}")
+            InlineKeyboardButton("✅ Буду", callback_data=await callback_data("game_vote", id=game_id, vote="yes")),
+            InlineKeyboardButton("❌ Не буду", callback_data=await callback_data("game_vote", id=game_id, vote="no"))
         ]
     ]
 
@@ -355,9 +388,9 @@ async def handle_game_vote_interaction(query, context, game_id, game_data):
     message += f"🏆 Проти: {game_data['opponent']}\n"
     message += f"📍 Місце: {game_data['location']}\n\n"
 
-    game_votes = load_data(GAME_VOTES_FILE, {"votes": {}})  # Add default structure
-    if game_id in game_votes["votes"] and user_id in game_votes["votes"][game_id]:  # Add ["votes"]
-        current_vote = game_votes["votes"][game_id][user_id]["vote"]  # Add ["votes"]
+    game_votes = await load_votes(GAME_VOTES_FILE, game_id)
+    if user_id in game_votes:
+        current_vote = game_votes[user_id]["vote"]
         message += f"Ваш поточний голос: {'БУДУ' if current_vote == 'yes' else 'НЕ БУДУ'}\n"
 
     message += "Чи будете брати участь у цій грі?"
@@ -371,8 +404,8 @@ async def handle_general_vote_interaction(query, context, vote_id, vote_data):
     if vote_data["type"] == "yes_no":
         keyboard = InlineKeyboardMarkup([
             [
-                InlineKeyboardButton("✅ Так", callback_data=f"general_vote_{vote_id}_yes"),
-                InlineKeyboardButton("❌ Ні", callback_data=f"general_vote_{vote_id}_no")
+                InlineKeyboardButton("✅ Так", callback_data=await callback_data("general_vote", id=vote_id, response="yes")),
+                InlineKeyboardButton("❌ Ні", callback_data=await callback_data("general_vote", id=vote_id, response="no"))
             ]
         ])
     elif vote_data["type"] in ["multiple_choice_single", "multiple_choice_multi"]:
@@ -380,17 +413,17 @@ async def handle_general_vote_interaction(query, context, vote_id, vote_data):
         for i, option in enumerate(vote_data["options"]):
             buttons.append([InlineKeyboardButton(
                 f"{i + 1}. {option}",
-                callback_data=f"general_vote_{vote_id}_option_{i}"
+                callback_data=await callback_data("general_vote", id=vote_id, response="option", option=i)
             )])
 
         if vote_data["type"] == "multiple_choice_multi":
             buttons.append(
-                [InlineKeyboardButton("✅ Підтвердити вибір", callback_data=f"general_vote_{vote_id}_confirm")])
+                [InlineKeyboardButton("✅ Підтвердити вибір", callback_data=await callback_data("general_vote", id=vote_id, response="confirm"))])
 
         keyboard = InlineKeyboardMarkup(buttons)
     else:
         keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("📝 Відповісти", callback_data=f"general_vote_{vote_id}_text")]
+            [InlineKeyboardButton("📝 Відповісти", callback_data=await callback_data("general_vote", id=vote_id, response="text"))]
         ])
 
     message = f"📊 {vote_data['question']}\n\n"
@@ -402,9 +435,9 @@ async def handle_general_vote_interaction(query, context, vote_id, vote_data):
     else:
         message += "Оберіть ваш варіант:"
 
-    responses = load_data(GENERAL_VOTES_FILE, {"votes": {}})
-    if vote_id in responses["votes"] and user_id in responses["votes"][vote_id]:
-        current_response = responses["votes"][vote_id][user_id]["response"]
+    responses = await load_votes(GENERAL_VOTES_FILE, vote_id)
+    if user_id in responses:
+        current_response = responses[user_id]["response"]
         message += f"\n\nВаша поточна відповідь: {current_response}"
 
     await query.edit_message_text(message, reply_markup=keyboard)
@@ -506,7 +539,7 @@ async def handle_vote_team(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 
     team = query.data.replace("general_vote_team_", "")
 
-    votes = load_data(GENERAL_FILE, {})
+    votes = await aload_data(GENERAL_FILE, {})
     if votes:
         vote_id = str(max(int(k) for k in votes.keys()) + 1)
     else:
@@ -523,7 +556,7 @@ async def handle_vote_team(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     }
 
     votes[vote_id] = vote_data
-    save_data(votes, GENERAL_FILE)
+    await asave_data(votes, GENERAL_FILE)
 
     await send_vote_to_users(context, vote_data, vote_id)
 
@@ -540,13 +573,11 @@ async def handle_vote_team(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 
 
 async def send_vote_to_users(context: ContextTypes.DEFAULT_TYPE, vote_data: dict, vote_id: str):
-    users = load_data("users", {})
-
     if vote_data["type"] == VoteType.YES_NO:
         keyboard = InlineKeyboardMarkup([
             [
-                InlineKeyboardButton("✅ Так", callback_data=f"general_vote_{vote_id}_yes"),
-                InlineKeyboardButton("❌ Ні", callback_data=f"general_vote_{vote_id}_no")
+                InlineKeyboardButton("✅ Так", callback_data=await callback_data("general_vote", id=vote_id, response="yes")),
+                InlineKeyboardButton("❌ Ні", callback_data=await callback_data("general_vote", id=vote_id, response="no"))
             ]
         ])
     elif vote_data["type"] in [VoteType.MULTIPLE_CHOICE_SINGLE, VoteType.MULTIPLE_CHOICE_MULTI]:
@@ -554,17 +585,17 @@ async def send_vote_to_users(context: ContextTypes.DEFAULT_TYPE, vote_data: dict
         for i, option in enumerate(vote_data["options"]):
             buttons.append([InlineKeyboardButton(
                 f"{i + 1}. {option}",
-                callback_data=f"general_vote_{vote_id}_option_{i}"
+                callback_data=await callback_data("general_vote", id=vote_id, response="option", option=i)
             )])
 
         if vote_data["type"] == VoteType.MULTIPLE_CHOICE_MULTI:
             buttons.append(
-                [InlineKeyboardButton("✅ Підтвердити вибір", callback_data=f"general_vote_{vote_id}_confirm")])
+                [InlineKeyboardButton("✅ Підтвердити вибір", callback_data=await callback_data("general_vote", id=vote_id, response="confirm"))])
 
         keyboard = InlineKeyboardMarkup(buttons)
     else:
         keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("📝 Відповісти", callback_data=f"general_vote_{vote_id}_text")]
+            [InlineKeyboardButton("📝 Відповісти", callback_data=await callback_data("general_vote", id=vote_id, response="text"))]
         ])
 
     message = f"📊 Нове голосування!\n\n"
@@ -577,35 +608,31 @@ async def send_vote_to_users(context: ContextTypes.DEFAULT_TYPE, vote_data: dict
     else:
         message += "Оберіть ваш варіант:"
 
-    count = 0
-    for uid, user_info in users.items():
-        if vote_data["team"] in [user_info.get("team"), "Both"]:
-            try:
-                await context.bot.send_message(
-                    chat_id=int(uid),
-                    text=message,
-                    reply_markup=keyboard
-                )
-                count += 1
-            except Exception as e:
-                print(f"❌ Помилка надсилання голосування до {uid}: {e}")
-
-    return count
+    recipients = await audience_index.resolve(vote_data["team"])
+    return await enqueue(f"general_vote:{vote_id}", recipients, text=message, reply_markup=keyboard)
 
 
 async def handle_general_vote_response(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Legacy general_vote_<id>_<response>[_<option>] buttons sent before callback tokens."""
+    data_parts = update.callback_query.data.split("_")
+    payload = {"id": data_parts[2], "response": data_parts[3]}
+    if payload["response"] == "option":
+        payload["option"] = int(data_parts[4])
+    await handle_general_vote(update, context, payload)
+
+
+async def handle_general_vote(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
     query = update.callback_query
     await query.answer()
 
-    data_parts = query.data.split("_")
-    vote_id = data_parts[2]
-    response_type = data_parts[3]
+    vote_id = payload["id"]
+    response_type = payload["response"]
 
     user_id = str(query.from_user.id)
-    users = load_data("users", {})
+    users = await aload_data("users", {})
     user_name = users.get(user_id, {}).get("name", "Невідомий")
 
-    votes = load_data(GENERAL_FILE, {})
+    votes = await aload_data(GENERAL_FILE, {})
     if vote_id not in votes:
         await query.edit_message_text("⚠️ Голосування не знайдено.")
         return
@@ -616,10 +643,6 @@ async def handle_general_vote_response(update: Update, context: ContextTypes.DEF
         await query.edit_message_text("⚠️ Це голосування вже закрито.")
         return
 
-    responses = load_data(GENERAL_VOTES_FILE, {"votes": {}})
-    if vote_id not in responses["votes"]:
-        responses["votes"][vote_id] = {}
-
     if response_type == "text":
         context.user_data[f"text_vote_{vote_id}"] = True
         await query.edit_message_text(
@@ -630,24 +653,22 @@ async def handle_general_vote_response(update: Update, context: ContextTypes.DEF
     elif response_type in ["yes", "no"]:
         response_value = "Так" if response_type == "yes" else "Ні"
 
-        responses["votes"][vote_id][user_id] = {
+        await save_user_vote(GENERAL_VOTES_FILE, vote_id, user_id, {
             "name": user_name,
             "response": response_value,
-        }
-        save_data(responses, GENERAL_VOTES_FILE)
+        })
 
         await query.edit_message_text(f"✅ Ваш голос '{response_value}' збережено!")
 
     elif response_type == "option":
-        option_index = int(data_parts[4])
+        option_index = payload["option"]
         option_value = vote_data["options"][option_index]
 
         if vote_data["type"] == VoteType.MULTIPLE_CHOICE_SINGLE:
-            responses["votes"][vote_id][user_id] = {
+            await save_user_vote(GENERAL_VOTES_FILE, vote_id, user_id, {
                 "name": user_name,
                 "response": option_value,
-            }
-            save_data(responses, GENERAL_VOTES_FILE)
+            })
             await query.edit_message_text(f"✅ Ваш вибір '{option_value}' збережено!")
 
         elif vote_data["type"] == VoteType.MULTIPLE_CHOICE_MULTI:
@@ -664,11 +685,11 @@ async def handle_general_vote_response(update: Update, context: ContextTypes.DEF
                 prefix = "☑️" if option in selected else "☐"
                 buttons.append([InlineKeyboardButton(
                     f"{prefix} {i + 1}. {option}",
-                    callback_data=f"general_vote_{vote_id}_option_{i}"
+                    callback_data=await callback_data("general_vote", id=vote_id, response="option", option=i)
                 )])
 
             buttons.append(
-                [InlineKeyboardButton("✅ Підтвердити вибір", callback_data=f"general_vote_{vote_id}_confirm")])
+                [InlineKeyboardButton("✅ Підтвердити вибір", callback_data=await callback_data("general_vote", id=vote_id, response="confirm"))])
 
             await query.edit_message_text(
                 f"{vote_data['question']}\n\n"
@@ -682,11 +703,10 @@ async def handle_general_vote_response(update: Update, context: ContextTypes.DEF
             if selected:
                 response_value = ", ".join(selected)
 
-                responses["votes"][vote_id][user_id] = {
+                await save_user_vote(GENERAL_VOTES_FILE, vote_id, user_id, {
                     "name": user_name,
                     "response": response_value,
-                }
-                save_data(responses, GENERAL_VOTES_FILE)
+                })
 
                 del context.user_data[f"multi_vote_{vote_id}"]
 
@@ -710,25 +730,20 @@ async def handle_text_vote_input(update: Update, context: ContextTypes.DEFAULT_T
     if not active_vote:
         return
 
-    users = load_data("users", {})
+    users = await aload_data("users", {})
     user_name = users.get(user_id, {}).get("name", "Невідомий")
 
-    votes = load_data(GENERAL_FILE, {})
+    votes = await aload_data(GENERAL_FILE, {})
     vote_data = votes.get(active_vote)
 
     if not vote_data:
         await update.message.reply_text("⚠️ Голосування не знайдено.")
         return
 
-    responses = load_data(GENERAL_VOTES_FILE, {"votes": {}})
-    if active_vote not in responses["votes"]:
-        responses["votes"][active_vote] = {}
-
-    responses["votes"][active_vote][user_id] = {
+    await save_user_vote(GENERAL_VOTES_FILE, active_vote, user_id, {
         "name": user_name,
         "response": update.message.text,
-    }
-    save_data(responses, GENERAL_VOTES_FILE)
+    })
 
     await update.message.reply_text("✅ Вашу відповідь збережено!")
 
@@ -740,7 +755,7 @@ async def close_vote(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("⛔ У вас немає прав для закриття голосувань.")
         return
 
-    general_votes = load_data(GENERAL_FILE, {})
+    general_votes = await aload_data(GENERAL_FILE, {})
 
     active_votes = []
     for vote_id, vote_data in general_votes.items():
@@ -831,14 +846,14 @@ async def handle_close_vote_confirmation(update: Update, context: ContextTypes.D
         )
         return
 
-    general_votes = load_data(GENERAL_FILE, {})
+    general_votes = await aload_data(GENERAL_FILE, {})
 
     if vote_id not in general_votes:
         await query.edit_message_text("⚠️ Голосування не знайдено.")
         return
 
     general_votes[vote_id]["is_active"] = False
-    save_data(general_votes, GENERAL_FILE)
+    await asave_data(general_votes, GENERAL_FILE)
 
     await query.edit_message_text(f"✅ Голосування закрито:\n\n📊 {vote_data['question']}")
 
@@ -859,10 +874,10 @@ async def handle_close_vote_amount_input(update: Update, context: ContextTypes.D
     vote_id = context.user_data["closing_vote_id"]
     vote_data = context.user_data["closing_vote_data"]
 
-    general_votes = load_data(GENERAL_FILE, {})
+    general_votes = await aload_data(GENERAL_FILE, {})
     if vote_id in general_votes:
         general_votes[vote_id]["is_active"] = False
-        save_data(general_votes, GENERAL_FILE)
+        await asave_data(general_votes, GENERAL_FILE)
 
     if amount > 0:
         await process_general_vote_payments(update, context, vote_id, vote_data, amount)
@@ -882,8 +897,7 @@ async def handle_close_vote_amount_input(update: Update, context: ContextTypes.D
 async def process_general_vote_payments(update, context, vote_id, vote_data, amount):
     from payments import CARD_NUMBER
 
-    responses = load_data(GENERAL_VOTES_FILE, {"votes": {}})
-    vote_responses = responses.get("votes", {}).get(vote_id, {})
+    vote_responses = await load_votes(GENERAL_VOTES_FILE, vote_id)
 
     yes_voters = [uid for uid, response in vote_responses.items() if response.get("response") == "Так"]
 
@@ -891,11 +905,11 @@ async def process_general_vote_payments(update, context, vote_id, vote_data, amo
         print(f"⚠️ Немає учасників для оплати голосування {vote_id}")
         return
 
-    payments = load_data("payments", {})
+    payments = {}
+    messages = []
 
     for uid in yes_voters:
-        payment_key = f"general_vote_{vote_id}_{uid}"
-        payments[payment_key] = {
+        payments[payment_key(f"general_vote_{vote_id}", uid)] = {
             "user_id": uid,
             "training_id": f"general_vote_{vote_id}",
             "general_vote_id": vote_id,
@@ -906,24 +920,21 @@ async def process_general_vote_payments(update, context, vote_id, vote_data, amo
             "paid": False
         }
 
-        keyboard = [[InlineKeyboardButton("✅ Я оплатив(ла)",
-                                          callback_data=f"paid_yes_general_vote_{vote_id}_{uid}")]]
+        paid = await callback_data("paid", training_id=f"general_vote_{vote_id}", user_id=uid)
+        keyboard = [[InlineKeyboardButton("✅ Я оплатив(ла)", callback_data=paid)]]
 
-        try:
-            await context.bot.send_message(
-                chat_id=int(uid),
-                text=(f"💳 Ти проголосував(ла) 'ТАК' у голосуванні:\n\n"
-                      f"📊 {vote_data['question']}\n\n"
-                      f"💰 Сума до сплати: {amount} грн\n"
-                      f"💳 Карта для оплати: `{CARD_NUMBER}`\n\n"
-                      f"Натисни кнопку нижче, коли оплатиш:"),
-                reply_markup=InlineKeyboardMarkup(keyboard),
-                parse_mode='Markdown'
-            )
-        except Exception as e:
-            print(f"❌ Помилка надсилання платежу {uid}: {e}")
+        messages.append((uid, {
+            "text": (f"💳 Ти проголосував(ла) 'ТАК' у голосуванні:\n\n"
+                     f"📊 {vote_data['question']}\n\n"
+                     f"💰 Сума до сплати: {amount} грн\n"
+                     f"💳 Карта для оплати: `{CARD_NUMBER}`\n\n"
+                     f"Натисни кнопку нижче, коли оплатиш:"),
+            "reply_markup": InlineKeyboardMarkup(keyboard),
+            "parse_mode": 'Markdown'
+        }))
 
-    save_data(payments, "payments")
+    await save_payments(payments)
+    await enqueue_many(f"payment:general_vote_{vote_id}", messages)
 
 
 async def cancel_vote_creation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -938,7 +949,7 @@ async def vote_for(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("У вас немає прав для цієї команди.")
         return ConversationHandler.END
 
-    user_data = load_data("users")
+    user_data = await aload_data("users")
     admin_id = str(update.message.from_user.id)
     admin_team = user_data.get(admin_id, {}).get("team", "Both")
     context.user_data["admin_team"] = admin_team
@@ -957,7 +968,7 @@ async def vote_other_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     all_votes = []
 
     unified_manager = UnifiedVoteManager()
-    training_votes = unified_manager._get_training_votes("", admin_team)
+    training_votes = await unified_manager._get_training_votes("", admin_team)
 
     for training_vote in training_votes:
         training_id = training_vote["id"]
@@ -965,8 +976,8 @@ async def vote_other_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
         training_data = training_vote["data"]
         all_votes.append(("training", training_id, label, training_data))
 
-    games = load_data(GAMES_FILE, {})
-    now = datetime.datetime.now()
+    games = await aload_data(GAMES_FILE, {})
+    now = local_now()
 
     for game in games.values():
         if game.get("team") not in [admin_team, "Both"]:
@@ -987,7 +998,7 @@ async def vote_other_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
         except ValueError:
             continue
 
-    general_votes = load_data(GENERAL_FILE, {})
+    general_votes = await aload_data(GENERAL_FILE, {})
     for vote_id, vote_data in general_votes.items():
         if not vote_data.get("is_active", True):
             continue
@@ -1088,32 +1099,27 @@ async def handle_vote_other_selection(update: Update, context: ContextTypes.DEFA
 
 async def handle_vote_other_cast(update: Update, context: ContextTypes.DEFAULT_TYPE):
     async def save_general_response(vote_id: str, user_id: str, name: str, response: str):
-        responses = load_data(GENERAL_VOTES_FILE, {"votes": {}})
-        if vote_id not in responses["votes"]:
-            responses["votes"][vote_id] = {}
-        responses["votes"][vote_id][user_id] = {
+        await save_user_vote(GENERAL_VOTES_FILE, vote_id, user_id, {
             "name": name,
             "response": response,
-        }
-        save_data(responses, GENERAL_VOTES_FILE)
+        })
 
     async def save_training_vote(vote_id: str, user_id: str, name: str, vote: str):
-        votes = load_data(TRAINING_VOTES_FILE, DEFAULT_VOTES_STRUCTURE)
-        if vote_id not in votes["votes"]:
-            votes["votes"][vote_id] = {}
-        votes["votes"][vote_id][user_id] = {"name": name, "vote": vote,
-                                            "timestamp": datetime.datetime.now().isoformat()}
-        save_data(votes, TRAINING_VOTES_FILE)
+        doc = await cast_training_vote(TRAINING_VOTES_FILE, vote_id, user_id, {
+            "name": name,
+            "vote": vote,
+            "timestamp": local_now().isoformat()
+        })
+        schedule_tally_update(context.bot, vote_id, format_training_id(vote_id), VOTES_LIMIT)
+        if doc is not None:
+            note_yes_count(doc.get("yes_count", 0))
+            await fill_from_waitlist(vote_id, doc)
 
     async def save_game_vote(vote_id: str, user_id: str, name: str, vote: str):
-        game_votes = load_data(GAME_VOTES_FILE, {"votes": {}})
-        if vote_id not in game_votes["votes"]:
-            game_votes["votes"][vote_id] = {}
-        game_votes["votes"][vote_id][user_id] = {
+        await save_user_vote(GAME_VOTES_FILE, vote_id, user_id, {
             "name": name,
             "vote": vote,
-        }
-        save_data(game_votes, GAME_VOTES_FILE)
+        })
 
     if hasattr(update, 'message') and update.message:
         name = context.user_data["vote_other_name"]
@@ -1217,46 +1223,75 @@ def generate_training_id(training):
 
 
 async def handle_vote(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Legacy vote_<yes|no>_<training_id> buttons sent before callback tokens."""
+    data = update.callback_query.data.split("_")
+    await handle_training_vote(update, context, {"vote": data[1], "id": "_".join(data[2:])})
+
+
+async def handle_training_vote(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
     query = update.callback_query
     await query.answer()
 
-    data = query.data.split("_")
-    vote = data[1]
-    training_id = "_".join(data[2:])
+    message = await record_training_vote(context, str(query.from_user.id), payload["id"], payload["vote"])
+    await query.edit_message_text(message)
 
-    user_id = str(query.from_user.id)
-    user_data = load_data(REGISTRATION_FILE)
-    user_name = user_data.get(user_id, {}).get("name", "Невідомий користувач")
 
-    votes = load_data('votes', DEFAULT_VOTES_STRUCTURE)
+def note_yes_count(yes_votes: int) -> None:
+    # Тренування щойно заповнилося або в ньому звільнилося місце
+    if yes_votes in (VOTES_LIMIT, VOTES_LIMIT - 1):
+        unified_vote_manager.invalidate()
 
-    if training_id not in votes["votes"]:
-        votes["votes"][training_id] = {}
-    current_yes_votes = sum(1 for v in votes["votes"][training_id].values() if v["vote"] == "yes")
 
-    changing_to_yes = (
-            vote == "yes" and
-            user_id in votes["votes"][training_id] and
-            votes["votes"][training_id][user_id]["vote"] == "no"
-    )
+async def fill_from_waitlist(training_id: str, doc: Dict) -> List[str]:
+    """Hand places freed by the last vote to the waitlist and tell only the promoted
+    users; returns their ids."""
+    if not doc.get("waitlist") or doc.get("yes_count", 0) >= VOTES_LIMIT:
+        return []
 
-    if vote == "yes" and current_yes_votes >= VOTES_LIMIT and (
-            user_id not in votes["votes"][training_id] or changing_to_yes):
-        await query.edit_message_text("⚠️ Досягнуто максимум голосів 'так'. Ви не можете проголосувати.")
-        return
+    promoted = await promote_waitlisted(TRAINING_VOTES_FILE, training_id, VOTES_LIMIT)
+    label = format_training_id(training_id)
+    for user_id, vote in promoted:
+        # Час постановки в чергу відрізняє повторні просування того самого гравця
+        await enqueue(f"waitlist_promoted:{training_id}:{vote.get('timestamp')}", [user_id],
+                      text=f"🎉 Звільнилося місце! Ви більше не в черзі й БУДЕТЕ на тренуванні {label}.")
+    if promoted:
+        note_yes_count(VOTES_LIMIT)
+    return [user_id for user_id, _ in promoted]
+
+
+async def record_training_vote(context, user_id: str, training_id: str, vote: str) -> str:
+    """Cast a user's yes/no for a training and return the reply for them."""
+    user_data = await aload_data(REGISTRATION_FILE)
+    user_name = user_data.get(user_id, {}).get("name", "Невідомий користувач")
 
-    votes["votes"][training_id][user_id] = {"name": user_name, "vote": vote,
-                                            "timestamp": datetime.datetime.now().isoformat()}
-    save_data(votes, 'votes')
+    doc = await cast_training_vote(TRAINING_VOTES_FILE, training_id, user_id, {
+        "name": user_name,
+        "vote": vote,
+        "timestamp": local_now().isoformat()
+    }, limit=VOTES_LIMIT)
+
+    if doc is None:
+        return "⚠️ Не вдалося зберегти голос. Спробуйте ще раз."
+
+    schedule_tally_update(context.bot, training_id, format_training_id(training_id), VOTES_LIMIT)
+    updated_yes_votes = doc.get("yes_count", 0)
+    note_yes_count(updated_yes_votes)
+    promoted = await fill_from_waitlist(training_id, doc)
+    # Місце могло звільнитися одразу після того, як голос став у чергу
+    updated_yes_votes += len(promoted)
+    current_vote = "yes" if user_id in promoted else doc["votes"][user_id]["vote"]
 
-    updated_yes_votes = sum(1 for v in votes["votes"][training_id].values() if v["vote"] == "yes")
+    if current_vote == WAITLIST:
+        position = doc["waitlist"].index(user_id) + 1 - len(promoted)
+        return (f"⏳ Місць немає, ви {position}-і в черзі. "
+                f"Щойно хтось відмовиться, місце перейде до вас автоматично.")
 
-    message = f"Ваш голос: {'БУДУ' if vote == 'yes' else 'НЕ БУДУ'} записано!"
+    message = f"Ваш голос: {'БУДУ' if current_vote == 'yes' else 'НЕ БУДУ'} записано!"
 
     if updated_yes_votes == VOTES_LIMIT:
         message += "\n⚠️ Досягнуто максимум учасників."
 
-    await query.edit_message_text(message)
+    return message
 
 
 def is_vote_active(vote_id, today):
@@ -1281,17 +1316,20 @@ async def handle_view_votes_selection(update: Update, context: ContextTypes.DEFA
         return
 
     training_id = vote_keys[idx]
-    votes = load_data('votes', {"votes": {}})
-    voters = votes["votes"].get(training_id, {})
+    vote_doc = await aload_document(TRAINING_VOTES_FILE, training_id, {})
+    voters = vote_doc.get("votes", {})
 
     yes_list = [v["name"] for v in voters.values() if v["vote"] == "yes"]
     no_list = [v["name"] for v in voters.values() if v["vote"] == "no"]
+    waiting = [v["name"] for v in waiting_in_order(voters, vote_doc.get("waitlist", []))]
 
     label = format_training_id(training_id)
 
     message = f"📅 Тренування: {label}\n\n"
     message += f"✅ Буде ({len(yes_list)}):\n" + ("\n".join(yes_list) if yes_list else "Ніхто") + "\n\n"
     message += f"❌ Не буде ({len(no_list)}):\n" + ("\n".join(no_list) if no_list else "Ніхто")
+    if waiting:
+        message += f"\n\n⏳ У черзі ({len(waiting)}):\n" + "\n".join(waiting)
 
     await query.edit_message_text(message)
 
@@ -1303,8 +1341,8 @@ async def unlock_training(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("У вас немає прав для цієї команди.")
         return
 
-    one_time = load_data("one_time_trainings", {})
-    constant = load_data("constant_trainings", {})
+    one_time = await aload_data("one_time_trainings", {})
+    constant = await aload_data("constant_trainings", {})
 
     options = []
 
@@ -1348,7 +1386,7 @@ async def handle_unlock_selection(update: Update, context: ContextTypes.DEFAULT_
         return
 
     tid, ttype, _ = options[idx]
-    trainings = load_data("one_time_trainings" if ttype == "one_time" else "constant_trainings", {})
+    trainings = await aload_data("one_time_trainings" if ttype == "one_time" else "constant_trainings", {})
 
     if tid not in trainings:
         await query.edit_message_text("⚠️ Тренування не знайдено.")
@@ -1357,7 +1395,7 @@ async def handle_unlock_selection(update: Update, context: ContextTypes.DEFAULT_
     old_team = trainings[tid]["team"]
 
     trainings[tid]["team"] = "Both"
-    save_data(trainings, "one_time_trainings" if ttype == "one_time" else "constant_trainings")
+    await asave_data(trainings, "one_time_trainings" if ttype == "one_time" else "constant_trainings")
 
     await notify_team_about_unlock(context, trainings[tid], tid, ttype, old_team)
 
@@ -1365,8 +1403,6 @@ async def handle_unlock_selection(update: Update, context: ContextTypes.DEFAULT_
 
 
 async def notify_team_about_unlock(context, training, training_id, training_type, old_team):
-    users = load_data("users", {})
-
     target_team = "Female" if old_team == "Male" else "Male"
 
     if training_type == "one_time":
@@ -1401,46 +1437,37 @@ async def notify_team_about_unlock(context, training, training_id, training_type
 
     keyboard = InlineKeyboardMarkup([
         [
-            InlineKeyboardButton("✅ Так", callback_data=f"vote_yes_{vote_id}"),
-            InlineKeyboardButton("❌ Ні", callback_data=f"vote_no_{vote_id}")
+            InlineKeyboardButton("✅ Так", callback_data=await callback_data("vote", id=vote_id, vote="yes")),
+            InlineKeyboardButton("❌ Ні", callback_data=await callback_data("vote", id=vote_id, vote="no"))
         ]
     ])
 
-    count = 0
-    for uid, user_info in users.items():
-        if user_info.get("team") == target_team:
-            try:
-                await context.bot.send_message(
-                    chat_id=int(uid),
-                    text=message,
-                    reply_markup=keyboard
-                )
-                count += 1
-            except Exception as e:
-                print(f"❌ UNLOCK NOTIFY: Помилка надсилання до {uid}: {e}")
+    recipients = await audience_index.resolve(target_team)
+    await enqueue(f"unlock:{vote_id}", recipients, text=message, reply_markup=keyboard)
 
 
 class UnifiedViewManager:
-    def get_all_active_votes(self):
+    async def get_all_active_votes(self):
         all_votes = []
 
-        training_votes = self._get_active_training_votes()
+        training_votes = await self._get_active_training_votes()
         all_votes.extend(training_votes)
 
-        game_votes = self._get_active_game_votes()
+        game_votes = await self._get_active_game_votes()
         all_votes.extend(game_votes)
 
-        general_votes = self._get_active_general_votes()
+        general_votes = await self._get_active_general_votes()
         all_votes.extend(general_votes)
 
         return all_votes
 
-    def _get_active_training_votes(self):
-        one_time_trainings = load_data(ONE_TIME_TRAININGS_FILE, {})
-        constant_trainings = load_data(CONSTANT_TRAININGS_FILE, {})
+    async def _get_active_training_votes(self):
+        one_time_trainings = await aload_data(ONE_TIME_TRAININGS_FILE, {})
+        constant_trainings = await aload_data(CONSTANT_TRAININGS_FILE, {})
 
         training_votes = []
-        votes_data = load_data(TRAINING_VOTES_FILE, DEFAULT_VOTES_STRUCTURE)
+        vote_docs = await aload_data(TRAINING_VOTES_FILE, {})
+        votes_data = {vote_id: doc.get("votes", {}) for vote_id, doc in vote_docs.items()}
 
         for training_id, training in one_time_trainings.items():
             if not training.get("voting_opened", False):
@@ -1448,14 +1475,15 @@ class UnifiedViewManager:
 
             vote_id = f"{training['date']}_{training['start_hour']:02d}:{training['start_min']:02d}"
 
-            if vote_id in votes_data["votes"] and votes_data["votes"][vote_id]:
+            if votes_data.get(vote_id):
                 label = self._format_training_label(training, vote_id)
                 training_votes.append({
                     "type": "training",
                     "id": vote_id,
                     "label": label,
                     "data": training,
-                    "votes": votes_data["votes"][vote_id]
+                    "votes": votes_data[vote_id],
+                    "waitlist": vote_docs[vote_id].get("waitlist", [])
                 })
 
         for training_id, training in constant_trainings.items():
@@ -1464,51 +1492,52 @@ class UnifiedViewManager:
 
             vote_id = f"const_{training['weekday']}_{training['start_hour']:02d}:{training['start_min']:02d}"
 
-            if vote_id in votes_data["votes"] and votes_data["votes"][vote_id]:
+            if votes_data.get(vote_id):
                 label = self._format_training_label(training, vote_id)
                 training_votes.append({
                     "type": "training",
                     "id": vote_id,
                     "label": label,
                     "data": training,
-                    "votes": votes_data["votes"][vote_id]
+                    "votes": votes_data[vote_id],
+                    "waitlist": vote_docs[vote_id].get("waitlist", [])
                 })
 
         return training_votes
 
-    def _get_active_game_votes(self):
-        games = load_data(GAMES_FILE, {})
-        game_votes_data = load_data(GAME_VOTES_FILE, {"votes": {}})
-        now = datetime.datetime.now()
+    async def _get_active_game_votes(self):
+        games = await aload_data(GAMES_FILE, {})
+        game_votes_data = await load_all_votes(GAME_VOTES_FILE)
+        now = local_now()
         game_votes = []
 
         for game in games.values():
             try:
                 game_datetime = datetime.datetime.strptime(f"{game['date']} {game['time']}", "%d.%m.%Y %H:%M")
-                if game_datetime > now and game['id'] in game_votes_data["votes"]:
+                if game_datetime > now and game['id'] in game_votes_data:
                     label = self._format_game_label(game)
                     game_votes.append({
                         "type": "game",
                         "id": game['id'],
                         "label": label,
                         "data": game,
-                        "votes": game_votes_data["votes"][game['id']]
+                        "votes": game_votes_data[game['id']]
                     })
             except ValueError:
                 continue
 
         return game_votes
 
-    def _get_active_general_votes(self):
-        votes = load_data(GENERAL_FILE, {})
-        responses = load_data(GENERAL_VOTES_FILE, {"votes": {}})
+    async def _get_active_general_votes(self):
+        votes = await aload_data(GENERAL_FILE, {})
+        responses = await load_all_votes(GENERAL_VOTES_FILE)
         general_votes = []
 
         for vote_id, vote_data in votes.items():
             if not vote_data.get("is_active", True):
                 continue
 
-            if vote_id in responses.get("votes", {}) and responses["votes"][vote_id]:
+            if responses.get(vote_id):
                 label = f"📊 {vote_data['question'][:50]}{'...' if len(vote_data['question']) > 50 else ''}"
 
                 team = vote_data.get("team", "Both")
@@ -1524,7 +1553,7 @@ class UnifiedViewManager:
                     "id": vote_id,
                     "label": label,
                     "data": vote_data,
-                    "votes": responses["votes"][vote_id]
+                    "votes": responses[vote_id]
                 })
 
         return general_votes
@@ -1611,6 +1640,10 @@ class UnifiedViewManager:
             message += f"\n\n❌ Не будуть ({len(no_list)}):\n"
             message += "\n".join(no_list) if no_list else "Ніхто"
 
+            waiting = [v["name"] for v in waiting_in_order(votes_data, vote_item.get("waitlist", []))]
+            if waiting:
+                message += f"\n\n⏳ У черзі ({len(waiting)}):\n" + "\n".join(waiting)
+
         elif vote_type == "general":
             vote_data = vote_item["data"]
             message = f"{label}\n\n"
@@ -1661,13 +1694,13 @@ unified_view_manager = UnifiedViewManager()
 async def unified_view_votes(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.message.from_user.id)
     log_command_usage(user_id, "/view_votes")
-    user_data = load_data("users")
+    user_data = await aload_data("users")
 
     if user_id not in user_data or "team" not in user_data[user_id]:
         await update.message.reply_text("Будь ласка, завершіть реєстрацію.")
         return
 
-    all_votes = unified_view_manager.get_all_active_votes()
+    all_votes = await unified_view_manager.get_all_active_votes()
 
     if not all_votes:
         await update.message.reply_text("Наразі немає активних голосувань з результатами.")
@@ -1716,8 +1749,7 @@ async def vote_notify(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("⛔ У вас немає прав для надсилання нагадувань.")
         return
 
-    general_votes = load_data(GENERAL_FILE, {})
-    general_responses = load_data(GENERAL_VOTES_FILE, {"votes": {}})
+    general_votes = await aload_data(GENERAL_FILE, {})
 
     active_votes = []
     for vote_id, vote_data in general_votes.items():
@@ -1761,12 +1793,7 @@ async def handle_vote_notify_selection(update: Update, context: ContextTypes.DEF
 
     vote_id, vote_data = vote_options[idx]
 
-    users = load_data("users", {})
-    general_responses = load_data(GENERAL_VOTES_FILE, {"votes": {}})
-
-    voted_users = set()
-    if vote_id in general_responses["votes"]:
-        voted_users = set(general_responses["votes"][vote_id].keys())
+    voted_users = set((await load_votes(GENERAL_VOTES_FILE, vote_id)).keys())
 
     message = f"📢 Нагадування про голосування!\n\n"
     message += f"❓ {vote_data['question']}\n\n"
@@ -1774,14 +1801,14 @@ async def handle_vote_notify_selection(update: Update, context: ContextTypes.DEF
     if vote_data["type"] == VoteType.TEXT_RESPONSE:
         message += "Натисніть кнопку нижче, щоб залишити відповідь."
         keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("📝 Відповісти", callback_data=f"general_vote_{vote_id}_text")]
+            [InlineKeyboardButton("📝 Відповісти", callback_data=await callback_data("general_vote", id=vote_id, response="text"))]
         ])
     elif vote_data["type"] == VoteType.YES_NO:
         message += "Оберіть ваш варіант:"
         keyboard = InlineKeyboardMarkup([
             [
-                InlineKeyboardButton("✅ Так", callback_data=f"general_vote_{vote_id}_yes"),
-                InlineKeyboardButton("❌ Ні", callback_data=f"general_vote_{vote_id}_no")
+                InlineKeyboardButton("✅ Так", callback_data=await callback_data("general_vote", id=vote_id, response="yes")),
+                InlineKeyboardButton("❌ Ні", callback_data=await callback_data("general_vote", id=vote_id, response="no"))
             ]
         ])
     else:
@@ -1790,35 +1817,21 @@ async def handle_vote_notify_selection(update: Update, context: ContextTypes.DEF
         for i, option in enumerate(vote_data["options"]):
             buttons.append([InlineKeyboardButton(
                 f"{i + 1}. {option}",
-                callback_data=f"general_vote_{vote_id}_option_{i}"
+                callback_data=await callback_data("general_vote", id=vote_id, response="option", option=i)
             )])
 
         if vote_data["type"] == VoteType.MULTIPLE_CHOICE_MULTI:
             buttons.append(
-                [InlineKeyboardButton("✅ Підтвердити вибір", callback_data=f"general_vote_{vote_id}_confirm")])
+                [InlineKeyboardButton("✅ Підтвердити вибір", callback_data=await callback_data("general_vote", id=vote_id, response="confirm"))])
 
         keyboard = InlineKeyboardMarkup(buttons)
 
-    count = 0
-    for uid, user_info in users.items():
-        if vote_data.get("team") not in [user_info.get("team"), "Both"]:
-            continue
-
-        if uid in voted_users:
-            continue
-
-        try:
-            await context.bot.send_message(
-                chat_id=int(uid),
-                text=message,
-                reply_markup=keyboard
-            )
-            count += 1
-        except Exception as e:
-            print(f"❌ Помилка надсилання нагадування до {uid}: {e}")
+    recipients = await audience_index.resolve(vote_data.get("team"), exclude=voted_users)
+    queued = await enqueue(f"general_vote_reminder:{vote_id}:{update.update_id}", recipients,
+                           text=message, reply_markup=keyboard)
 
     await query.edit_message_text(
-        f"✅ Нагадування надіслано {count} користувачам\n"
+        f"✅ Нагадування поставлено в чергу для {queued} користувачів\n"
         f"📊 Голосування: {vote_data['question']}"
     )
 
@@ -1830,7 +1843,7 @@ async def vote_times(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("⛔ У вас немає прав для перегляду часу голосувань.")
         return
 
-    all_votes = unified_view_manager.get_all_active_votes()
+    all_votes = await unified_view_manager.get_all_active_votes()
 
     if not all_votes:
         await update.message.reply_text("Наразі немає активних голосувань.")
@@ -1866,9 +1879,14 @@ async def handle_vote_times_selection(update: Update, context: ContextTypes.DEFA
 
     message = f"⏰ Час голосувань для:\n{selected_vote['label']}\n\n"
 
+    # Черга показується окремо, у порядку черги
+    waiting = waiting_in_order(votes_data, selected_vote.get("waitlist", []))
+
     # Sort votes by timestamp
     sorted_votes = []
     for user_id, vote_info in votes_data.items():
+        if vote_info.get("vote") == WAITLIST:
+            continue
         timestamp_str = vote_info.get("timestamp")
         if timestamp_str:
             try:
@@ -1895,6 +1913,15 @@ async def handle_vote_times_selection(update: Update, context: ContextTypes.DEFA
 
         message += f"• {name}: {vote_display}\n  📅 {time_str}\n\n"
 
+    if waiting:
+        message += f"⏳ У черзі ({len(waiting)}):\n\n"
+    for position, vote_info in enumerate(waiting, 1):
+        try:
+            time_str = datetime.datetime.fromisoformat(vote_info["timestamp"]).strftime("%d.%m.%Y %H:%M:%S")
+        except (KeyError, TypeError, ValueError):
+            time_str = "Час невідомий"
+        message += f"{position}. {vote_info['name']}\n  📅 {time_str}\n\n"
+
     if len(message) > 4000:
         parts = [message[i:i + 4000] for i in range(0, len(message), 4000)]
         for part in parts:
@@ -1947,6 +1974,9 @@ def setup_voting_handlers(app):
     # Admin: /vote_notify
     app.add_handler(CommandHandler("vote_notify", vote_notify))
 
+    register_callback("vote", handle_training_vote)
+    register_callback("general_vote", handle_general_vote)
+
     # Other
     # app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text_vote_input)) # WITH THIS UNCOMMENTED SEND MESSAGE DOESN'T WORK
     app.add_handler(CallbackQueryHandler(handle_unified_vote_selection, pattern=r"^unified_vote_\d+$"))